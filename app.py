@@ -7,8 +7,8 @@
 import os
 import sys
 import json
-import datetime
 import logging
+from contextlib import asynccontextmanager
 from logging.handlers import RotatingFileHandler
 from fastapi import FastAPI, HTTPException, Body
 from fastapi.middleware.cors import CORSMiddleware
@@ -50,16 +50,39 @@ DEBUG_MODE = True  # 设置为True启用调试模式
 TEST_MODE = False  # 强制使用测试模式进行演示
 
 try:
-    from app.core.dashscope_client import DashscopeClient
-    from app.core.llm_config import DEFAULT_TOOLS
+    from app.core.async_dashscope_client import get_client
+    from app.core.connection_pool import startup_pool, shutdown_pool
+    from app.core.errors import DashscopeError
+    from app.core.resilience import get_breaker
+    from app.api.errors import to_http_exception
+    from app.api.routes import batch, chat_stream, sessions, tokens, tools_stream
+    from app.api.routes.chat import load_session_messages, record_session_turn
+    from app.services.history_compactor import compact_history
+    from app.services.tool_executor import get_tool_executor
+    from app.services.function_call_service import FunctionCallEngine, run_function_call, complete_function_call as complete_function_call_flow
+    from app.utils.tools import DEFAULT_TOOLS
 except ImportError:
-    from dashscope_demo import DashscopeClient, DEFAULT_TOOLS, mock_response, mock_function_call, mock_tool_response
+    from dashscope_demo import get_client, startup_pool, shutdown_pool, DEFAULT_TOOLS, mock_response, mock_function_call, mock_tool_response
+
+# langchain为可选依赖，未安装时不提供/api/agent路由
+try:
+    from app.api.routes import agent
+except ImportError:
+    agent = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时预热共享连接池，关闭时释放"""
+    await startup_pool()
+    yield
+    await shutdown_pool()
 
 # 创建FastAPI应用
 app = FastAPI(
     title="千问API服务",
     description="阿里云千问大模型API封装服务",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # 添加CORS中间件
@@ -71,50 +94,37 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 工具函数处理器
-def get_current_time():
-    """获取当前时间"""
-    current_time = datetime.datetime.now()
-    return {
-        "datetime": current_time.strftime("%Y-%m-%d %H:%M:%S"),
-        "date": current_time.strftime("%Y-%m-%d"),
-        "time": current_time.strftime("%H:%M:%S"),
-        "weekday": current_time.strftime("%A")
-    }
+# 流式聊天路由（SSE）
+app.include_router(chat_stream.router, prefix="/api", tags=["chat"])
+# 批量请求路由
+app.include_router(batch.router, prefix="/api", tags=["batch"])
+# 流式函数调用路由（SSE）
+app.include_router(tools_stream.router, prefix="/api", tags=["tools"])
+# 会话路由（服务端保存多轮对话历史）
+app.include_router(sessions.router, prefix="/api", tags=["sessions"])
+# token估算路由
+app.include_router(tokens.router, prefix="/api", tags=["tokens"])
+# LangChain代理路由（需配置共享代理）
+if agent is not None:
+    app.include_router(agent.router, prefix="/api", tags=["agent"])
 
-def get_current_weather(location):
-    """获取指定位置的天气
-    
-    这里使用的是模拟数据，真实场景应该调用天气API
-    """
-    # 在实际应用中，这里应该调用天气API获取实时数据
-    weather_data = {
-        "北京": {"temp": "22°C", "condition": "晴", "humidity": "40%", "wind": "东北风 3级"},
-        "上海": {"temp": "25°C", "condition": "多云", "humidity": "65%", "wind": "东风 2级"},
-        "广州": {"temp": "28°C", "condition": "小雨", "humidity": "80%", "wind": "南风 2级"},
-        "深圳": {"temp": "27°C", "condition": "阴", "humidity": "75%", "wind": "东南风 3级"},
-        "杭州": {"temp": "24°C", "condition": "晴", "humidity": "50%", "wind": "西北风 1级"},
-    }
-    
-    # 默认返回数据
-    default_weather = {"temp": "20°C", "condition": "晴", "humidity": "60%", "wind": "微风"}
-    
-    return weather_data.get(location, default_weather)
+# 工具执行器（并发执行、单独超时），工具函数来自共享注册表（app.utils.tools）
+tool_executor = get_tool_executor()
 
-# 工具函数映射表
-TOOL_HANDLERS = {
-    "get_current_time": get_current_time,
-    "get_current_weather": get_current_weather
-}
+# 多步工具调用引擎（模型->工具->模型循环）
+function_call_engine = FunctionCallEngine(executor=tool_executor)
 
 # 数据模型
 class ChatRequest(BaseModel):
     prompt: str
     system_message: Optional[str] = "你是一个建筑工地智能助手，会简洁明了地回答问题。"
+    use_cache: bool = True
 
 class FunctionCallRequest(BaseModel):
     query: str
     tools: Optional[List[Dict[str, Any]]] = None
+    use_cache: bool = True
+    fast_path: bool = True
 
 class MessageItem(BaseModel):
     role: str
@@ -124,6 +134,8 @@ class ChatHistoryRequest(BaseModel):
     prompt: str
     system_message: Optional[str] = "你是一个建筑工地智能助手，会简洁明了地回答问题。"
     history: List[MessageItem] = []
+    use_cache: bool = True
+    session_id: Optional[str] = None
 
 # API端点
 @app.get("/")
@@ -133,11 +145,13 @@ async def read_root():
 @app.get("/api/debug")
 async def debug_status():
     """获取或设置调试状态"""
+    breaker = get_breaker()
     return {
         "debug_mode": DEBUG_MODE,
         "test_mode": TEST_MODE,
         "log_level": logging.getLevelName(logger.level),
-        "api_status": "running"
+        "api_status": "running",
+        "circuit_breaker": breaker.stats() if breaker else None
     }
 
 @app.post("/api/debug")
@@ -184,18 +198,21 @@ async def chat(request: ChatRequest):
             response = mock_response(request.prompt)
         else:
             # 正常调用API
-            client = DashscopeClient()
+            client = get_client()
             messages = client.format_messages(
                 prompt=request.prompt,
                 system_message=request.system_message
             )
-            response = client.chat(messages)
+            response = await client.chat(messages, use_cache=request.use_cache)
         
         return {
             "status_code": response['status_code'],
             "request_id": response['request_id'],
             "answer": response['choices'][0]['message']['content']
         }
+    except DashscopeError as e:
+        logger.error(f"聊天请求失败: {str(e)}")
+        raise to_http_exception(e, "聊天请求失败")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"聊天请求失败: {str(e)}")
 
@@ -204,213 +221,31 @@ async def function_call(request: FunctionCallRequest):
     """函数调用API"""
     try:
         if DEBUG_MODE:
-            logger.debug(f"接收到函数调用请求: {request.dict()}")
-        
-        # 如果传入的tools为空列表或包含空对象，则使用默认工具
-        if not request.tools or (len(request.tools) == 1 and not request.tools[0]):
-            tools = DEFAULT_TOOLS
-            if DEBUG_MODE:
-                logger.debug(f"使用默认工具: {tools}")
-        else:
-            tools = request.tools
-            if DEBUG_MODE:
-                logger.debug(f"使用自定义工具: {tools}")
-        
-        # 验证每个工具都有必要的字段
-        for i, tool in enumerate(tools):
-            # 跳过空对象
-            if not tool:
-                tools[i] = {
-                    'type': 'function',
-                    'function': {
-                        'name': f'default_tool_{i}',
-                        'description': '默认工具'
-                    }
-                }
-                if DEBUG_MODE:
-                    logger.debug(f"替换空工具为默认工具: {tools[i]}")
-                continue
-                
-            if 'type' not in tool:
-                tool['type'] = 'function'  # 添加默认type字段
-                if DEBUG_MODE:
-                    logger.debug(f"为工具添加默认type字段: {tool}")
-            
-            if 'function' not in tool and isinstance(tool, dict):
-                # 如果工具是没有function字段的字典，假设整个工具就是function定义
-                function_def = {k: v for k, v in tool.items() if k != 'type'}
-                if 'name' not in function_def:
-                    function_def['name'] = f"tool_{i}"  # 添加默认name
-                    if DEBUG_MODE:
-                        logger.debug(f"为工具添加默认name字段: {function_def}")
-                
-                tools[i] = {
-                    'type': 'function',
-                    'function': function_def
-                }
-                if DEBUG_MODE:
-                    logger.debug(f"重构工具格式: {tools[i]}")
-            elif 'function' in tool and isinstance(tool['function'], dict):
-                # 确保function对象有name属性
-                if 'name' not in tool['function']:
-                    tool['function']['name'] = f"tool_{i}"  # 添加默认name
-                    if DEBUG_MODE:
-                        logger.debug(f"为function对象添加默认name: {tool}")
+            logger.debug(f"接收到函数调用请求: {request.model_dump()}")
         
-        if TEST_MODE:
-            # 测试模式
-            if DEBUG_MODE:
-                logger.debug("使用测试模式处理请求")
-            response = mock_function_call(request.query, tools)
-        else:
-            # 正常调用API
-            if DEBUG_MODE:
-                logger.debug(f"调用DashscopeClient处理请求，query: {request.query}")
-            client = DashscopeClient()
-            messages = [{"role": "user", "content": request.query}]
-            response = client.function_call(messages, tools)
+        # 模型->工具->模型循环，直到给出最终回答或超出预算
+        result = await run_function_call(
+            query=request.query,
+            tools=request.tools,
+            use_cache=request.use_cache,
+            engine=function_call_engine,
+            fast_path=request.fast_path
+        )
         
         if DEBUG_MODE:
-            logger.debug(f"API响应: {response}")
-            
-        message = response['choices'][0]['message']
-        result = {
-            "status_code": response['status_code'],
-            "request_id": response['request_id'],
-            "message": message
-        }
+            logger.debug(f"工具调用步骤: {json.dumps(result['steps'], ensure_ascii=False)}")
+            logger.debug(f"执行结果: {json.dumps(result['executed_tools'], ensure_ascii=False, default=str)}")
         
-        # 如果没有工具调用，直接返回
-        if 'tool_calls' not in message:
+        # 如果没有工具调用，直接返回模型消息
+        if not result["used_tools"]:
             if DEBUG_MODE:
                 logger.debug("响应中没有工具调用")
-            return message
-        
-        # 添加工具调用信息和执行结果
-        tool_calls_info = []
-        executed_results = []
-        tool_results = []  # 用于将结果返回给模型的格式
+            return result["message"]
         
-        for tool_call in message['tool_calls']:
-            if tool_call['type'] == 'function':
-                function_name = tool_call['function']['name']
-                arguments_str = tool_call['function']['arguments']
-                arguments = json.loads(arguments_str) if arguments_str else {}
-                
-                tool_call_info = {
-                    "id": tool_call['id'],
-                    "function_name": function_name,
-                    "arguments": arguments
-                }
-                tool_calls_info.append(tool_call_info)
-                
-                if DEBUG_MODE:
-                    logger.debug(f"工具调用信息: {tool_call_info}")
-                
-                # 执行工具调用
-                if function_name in TOOL_HANDLERS:
-                    handler = TOOL_HANDLERS[function_name]
-                    try:
-                        if DEBUG_MODE:
-                            logger.debug(f"执行函数: {function_name}, 参数: {arguments}")
-                        
-                        if arguments:
-                            result_value = handler(**arguments)
-                        else:
-                            result_value = handler()
-                        
-                        if DEBUG_MODE:
-                            logger.debug(f"函数执行结果: {result_value}")
-                        
-                        executed_result = {
-                            "id": tool_call['id'],
-                            "function_name": function_name,
-                            "success": True,
-                            "result": result_value
-                        }
-                        
-                        # 准备用于返回给模型的格式
-                        tool_results.append({
-                            "tool_call_id": tool_call['id'],
-                            "role": "tool",
-                            "content": json.dumps(result_value)
-                        })
-                    except Exception as e:
-                        error_message = f"函数执行错误: {str(e)}"
-                        logger.error(error_message)
-                        
-                        executed_result = {
-                            "id": tool_call['id'],
-                            "function_name": function_name,
-                            "success": False,
-                            "error": error_message
-                        }
-                        
-                        # 准备用于返回给模型的格式（包含错误信息）
-                        tool_results.append({
-                            "tool_call_id": tool_call['id'],
-                            "role": "tool",
-                            "content": json.dumps({"error": error_message})
-                        })
-                else:
-                    error_message = f"未找到处理函数: {function_name}"
-                    logger.warning(error_message)
-                    
-                    executed_result = {
-                        "id": tool_call['id'],
-                        "function_name": function_name,
-                        "success": False,
-                        "error": error_message
-                    }
-                    
-                    # 准备用于返回给模型的格式（包含错误信息）
-                    tool_results.append({
-                        "tool_call_id": tool_call['id'],
-                        "role": "tool",
-                        "content": json.dumps({"error": error_message})
-                    })
-                
-                executed_results.append(executed_result)
-        
-        result["tool_calls"] = tool_calls_info
-        result["executed_results"] = executed_results
-        
-        # 将函数调用结果返回给模型处理
-        if DEBUG_MODE:
-            logger.debug("将函数调用结果返回给模型处理")
-            
-        # 构建新的消息列表
-        new_messages = [
-            {"role": "user", "content": request.query},
-            message,  # 模型的工具调用消息
-        ]
-        
-        # 添加工具调用结果
-        new_messages.extend(tool_results)
-        
-        if DEBUG_MODE:
-            logger.debug(f"发送给模型的完整消息: {json.dumps(new_messages, ensure_ascii=False)}")
-        
-        # 调用模型处理工具结果
-        if TEST_MODE:
-            # 测试模式
-            final_response = mock_tool_response(new_messages)
-        else:
-            # 正常调用API
-            client = DashscopeClient()
-            final_response = client.chat(new_messages)
-        
-        if DEBUG_MODE:
-            logger.debug(f"模型最终响应: {final_response}")
-        
-        # 添加模型最终回答到结果中
-        final_content = final_response['choices'][0]['message']['content']
-        result["final_answer"] = final_content
-        
-        if DEBUG_MODE:
-            logger.debug(f"最终返回结果: {result}")
-            
-        return final_content
+        return result["answer"]
+    except DashscopeError as e:
+        logger.error(f"函数调用请求失败: {str(e)}")
+        raise to_http_exception(e, "函数调用请求失败")
     except Exception as e:
         # 记录详细错误信息
         error_detail = f"函数调用请求失败: {str(e)}"
@@ -423,158 +258,29 @@ async def function_call(request: FunctionCallRequest):
 async def complete_function_call(request: FunctionCallRequest):
     """完整的函数调用流程API"""
     try:
-        # 如果传入的tools为空列表或包含空对象，则使用默认工具
-        if not request.tools or (len(request.tools) == 1 and not request.tools[0]):
-            tools = DEFAULT_TOOLS
-        else:
-            tools = request.tools
-        
-        # 验证每个工具都有必要的字段
-        for i, tool in enumerate(tools):
-            # 跳过空对象
-            if not tool:
-                tools[i] = {
-                    'type': 'function',
-                    'function': {
-                        'name': f'default_tool_{i}',
-                        'description': '默认工具'
-                    }
-                }
-                continue
-                
-            if 'type' not in tool:
-                tool['type'] = 'function'  # 添加默认type字段
-            
-            if 'function' not in tool and isinstance(tool, dict):
-                # 如果工具是没有function字段的字典，假设整个工具就是function定义
-                function_def = {k: v for k, v in tool.items() if k != 'type'}
-                if 'name' not in function_def:
-                    function_def['name'] = f"tool_{i}"  # 添加默认name
-                
-                tools[i] = {
-                    'type': 'function',
-                    'function': function_def
-                }
-            elif 'function' in tool and isinstance(tool['function'], dict):
-                # 确保function对象有name属性
-                if 'name' not in tool['function']:
-                    tool['function']['name'] = f"tool_{i}"  # 添加默认name
-        
-        # 步骤1：发送用户问题，模型决定调用工具
-        if TEST_MODE:
-            # 测试模式
-            response = mock_function_call(request.query, tools)
-        else:
-            # 正常调用API
-            client = DashscopeClient()
-            messages = [{"role": "user", "content": request.query}]
-            response = client.function_call(messages, tools)
-        
-        message = response['choices'][0]['message']
-        
-        # 没有工具调用，直接返回
-        if 'tool_calls' not in message:
-            return {
-                "status": "completed",
-                "answer": message.get('content', '无内容'),
-                "used_tools": False
-            }
-        
-        # 步骤2：执行工具调用
-        tool_results = []
-        executed_tools = []
-        
-        for tool_call in message['tool_calls']:
-            if tool_call['type'] == 'function':
-                function_name = tool_call['function']['name']
-                arguments_str = tool_call['function']['arguments']
-                arguments = json.loads(arguments_str) if arguments_str else {}
-                
-                executed_tool = {
-                    "function_name": function_name,
-                    "arguments": arguments
-                }
-                
-                # 执行函数
-                if function_name in TOOL_HANDLERS:
-                    handler = TOOL_HANDLERS[function_name]
-                    try:
-                        if arguments:
-                            result = handler(**arguments)
-                        else:
-                            result = handler()
-                        
-                        executed_tool["result"] = result
-                        executed_tool["success"] = True
-                        
-                        # 记录工具调用结果
-                        tool_results.append({
-                            "tool_call_id": tool_call['id'],
-                            "role": "tool",
-                            "content": json.dumps(result)
-                        })
-                    except Exception as e:
-                        error_message = f"函数执行错误: {str(e)}"
-                        executed_tool["error"] = error_message
-                        executed_tool["success"] = False
-                        
-                        tool_results.append({
-                            "tool_call_id": tool_call['id'],
-                            "role": "tool",
-                            "content": json.dumps({"error": error_message})
-                        })
-                else:
-                    error_message = f"未找到处理函数 '{function_name}'"
-                    executed_tool["error"] = error_message
-                    executed_tool["success"] = False
-                    
-                    tool_results.append({
-                        "tool_call_id": tool_call['id'],
-                        "role": "tool",
-                        "content": json.dumps({"error": error_message})
-                    })
-                
-                executed_tools.append(executed_tool)
-        
-        # 步骤3：将工具调用结果返回给模型
-        # 构建新的消息列表，包含原始问题、模型的工具调用和工具结果
-        new_messages = [
-            {"role": "user", "content": request.query},
-            message,  # 模型的工具调用消息
-        ]
-        
-        # 添加工具调用结果
-        new_messages.extend(tool_results)
-        
-        # 调用模型处理工具结果
-        if TEST_MODE:
-            # 测试模式
-            final_response = mock_tool_response(new_messages)
-        else:
-            # 正常调用API
-            client = DashscopeClient()
-            final_response = client.chat(new_messages)
-        
-        # 步骤4：输出最终结果
-        final_content = final_response['choices'][0]['message']['content']
-        
-        return {
-            "status": "completed",
-            "answer": final_content,
-            "used_tools": True,
-            "executed_tools": executed_tools
-        }
+        return await complete_function_call_flow(
+            query=request.query,
+            tools=request.tools,
+            use_cache=request.use_cache,
+            engine=function_call_engine,
+            fast_path=request.fast_path
+        )
+    except DashscopeError as e:
+        logger.error(f"完整函数调用请求失败: {str(e)}")
+        raise to_http_exception(e, "完整函数调用请求失败")
     except Exception as e:
         # 记录详细错误信息
         error_detail = f"完整函数调用请求失败: {str(e)}"
-        print(f"ERROR: {error_detail}")
+        logger.error(error_detail)
         import traceback
-        print(traceback.format_exc())
+        logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=error_detail)
 
 @app.post("/api/multi_turn_chat")
 async def multi_turn_chat(request: ChatHistoryRequest):
-    """多轮对话API"""
+    """多轮对话API，指定session_id时使用服务端会话中的历史"""
+    if request.session_id:
+        messages = await load_session_messages(request.session_id, request.prompt)
     try:
         if TEST_MODE:
             # 测试模式 - 简化处理
@@ -582,27 +288,35 @@ async def multi_turn_chat(request: ChatHistoryRequest):
             assistant_message = response['choices'][0]['message']['content']
         else:
             # 正常调用API
-            client = DashscopeClient()
-            
-            # 转换历史记录格式
-            history = []
-            for item in request.history:
-                history.append({"role": item.role, "content": item.content})
-            
-            messages = client.format_messages(
-                prompt=request.prompt,
-                system_message=request.system_message,
-                history=history
-            )
+            client = get_client()
+            if not request.session_id:
+                # 转换历史记录格式
+                history = []
+                for item in request.history:
+                    history.append({"role": item.role, "content": item.content})
+                
+                # 历史超出token预算时丢弃或摘要较早的轮次
+                messages = compact_history(client.format_messages(
+                    prompt=request.prompt,
+                    system_message=request.system_message,
+                    history=history
+                ))
             
-            response = client.chat(messages)
+            response = await client.chat(messages, use_cache=request.use_cache)
             assistant_message = response['choices'][0]['message']['content']
         
-        return {
+        result = {
             "status_code": response['status_code'],
             "request_id": response['request_id'],
             "answer": assistant_message
         }
+        if request.session_id:
+            await record_session_turn(request.session_id, request.prompt, assistant_message)
+            result["session_id"] = request.session_id
+        return result
+    except DashscopeError as e:
+        logger.error(f"多轮对话请求失败: {str(e)}")
+        raise to_http_exception(e, "多轮对话请求失败")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"多轮对话请求失败: {str(e)}")
 
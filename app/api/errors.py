@@ -0,0 +1,25 @@
+"""
+API异常转换
+"""
+import math
+from fastapi import HTTPException
+from app.core.errors import DashscopeError
+
+def to_http_exception(error: DashscopeError, prefix: str) -> HTTPException:
+    """将DashScope调用异常转换为对应状态码的HTTPException
+
+    Args:
+        error: DashScope调用异常
+        prefix: 错误信息前缀
+
+    Returns:
+        HTTPException，上游给出等待时间时带Retry-After响应头
+    """
+    headers = None
+    if error.retry_after:
+        headers = {"Retry-After": str(math.ceil(error.retry_after))}
+    return HTTPException(
+        status_code=error.http_status,
+        detail=f"{prefix}: {str(error)}",
+        headers=headers
+    )
@@ -1,4 +1,4 @@
 """
 路由模块初始化文件
 """
-from . import chat, debug, tools 
\ No newline at end of file
+from . import batch, chat, chat_stream, debug, sessions, tokens, tools, tools_stream 
\ No newline at end of file
@@ -0,0 +1,83 @@
+"""
+LangChain代理相关路由
+"""
+from typing import AsyncIterator, List
+from fastapi import APIRouter, HTTPException
+from fastapi.encoders import jsonable_encoder
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from app.models.schemas import AgentRequest, MessageItem
+from app.core.errors import DashscopeError
+from app.api.errors import to_http_exception
+from app.core.langchain_agent import LangChainFunctionAgent, get_shared_agent
+from app.core.logging import setup_logging
+from app.utils.sse import format_sse, sse_response
+
+logger = setup_logging()
+router = APIRouter()
+
+def to_chat_history(history: List[MessageItem]) -> List[BaseMessage]:
+    """将请求中的历史消息转换为LangChain消息"""
+    return [
+        HumanMessage(content=item.content) if item.role == "user" else AIMessage(content=item.content)
+        for item in history
+        if item.role in ("user", "assistant")
+    ]
+
+@router.post("/agent/run")
+async def agent_run(request: AgentRequest):
+    """运行LangChain代理，返回最终回答和中间步骤"""
+    agent = get_shared_agent()
+    try:
+        result = await agent.arun(
+            request.query,
+            to_chat_history(request.history),
+            max_steps=request.max_steps,
+            max_seconds=request.max_seconds
+        )
+        return {
+            "answer": result["output"],
+            "stop_reason": result["stop_reason"],
+            "steps": [
+                {"name": action.tool, "arguments": action.tool_input, "result": jsonable_encoder(observation)}
+                for action, observation in result.get("intermediate_steps", [])
+            ]
+        }
+    except DashscopeError as e:
+        logger.error(f"代理运行失败: {str(e)}")
+        raise to_http_exception(e, "代理运行失败")
+    except Exception as e:
+        logger.error(f"代理运行失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"代理运行失败: {str(e)}")
+
+async def agent_events(agent: LangChainFunctionAgent, request: AgentRequest) -> AsyncIterator[str]:
+    """运行代理并转换为SSE事件
+
+    事件类型：
+        tool_call: 模型选定工具 {"step", "name", "arguments"}
+        tool_result: 工具执行完成 {"step", "name", "result"}
+        delta: 增量文本 {"content": "..."}
+        done: 结束事件 {"answer", "steps", "stop_reason", "elapsed_ms"}
+        error: 错误事件 {"detail": "...", "status": ...}
+    """
+    try:
+        async for event in agent.astream(
+            request.query,
+            to_chat_history(request.history),
+            max_steps=request.max_steps,
+            max_seconds=request.max_seconds
+        ):
+            kind = event.pop("event")
+            if kind == "done":
+                event = {"answer": event.pop("output"), **event}
+            yield format_sse(jsonable_encoder(event), event=kind)
+    except DashscopeError as e:
+        logger.error(f"流式代理运行失败: {str(e)}")
+        yield format_sse({"detail": f"流式代理运行失败: {str(e)}", "status": e.http_status}, event="error")
+    except Exception as e:
+        logger.error(f"流式代理运行失败: {str(e)}")
+        yield format_sse({"detail": f"流式代理运行失败: {str(e)}", "status": 500}, event="error")
+
+@router.post("/agent/stream")
+async def agent_stream(request: AgentRequest):
+    """流式运行LangChain代理（SSE），工具调用、工具结果和回答文本随发生随返回"""
+    return sse_response(agent_events(get_shared_agent(), request))
@@ -0,0 +1,54 @@
+"""
+批量请求相关路由
+"""
+import json
+from typing import Any, AsyncIterator, Dict
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from app.models.schemas import BatchChatRequest
+from app.core.config import BATCH_MAX_ITEMS
+from app.core.logging import setup_logging
+from app.services.batch_service import resolve_concurrency, run_chat_batch
+
+logger = setup_logging()
+router = APIRouter()
+
+def check_batch_size(request: BatchChatRequest) -> None:
+    """检查批量请求条数"""
+    if not request.requests:
+        raise HTTPException(status_code=400, detail="批量请求不能为空")
+    if len(request.requests) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"批量请求最多{BATCH_MAX_ITEMS}条")
+
+@router.post("/chat/batch")
+async def chat_batch(request: BatchChatRequest):
+    """批量聊天API，全部完成后按序号返回结果"""
+    check_batch_size(request)
+    logger.info(f"批量聊天: {len(request.requests)}条, 并发数={resolve_concurrency(request.concurrency)}")
+
+    results = [item async for item in run_chat_batch(request.requests, request.concurrency)]
+    results.sort(key=lambda item: item["index"])
+    failed = sum(1 for item in results if "error" in item)
+    return {
+        "total": len(results),
+        "succeeded": len(results) - failed,
+        "failed": failed,
+        "results": results
+    }
+
+async def ndjson_lines(items: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[str]:
+    """将结果逐条序列化为NDJSON行"""
+    async for item in items:
+        yield json.dumps(item, ensure_ascii=False) + "\n"
+
+@router.post("/chat/batch/stream")
+async def chat_batch_stream(request: BatchChatRequest):
+    """批量聊天API（NDJSON），每条完成后立即返回一行，顺序不定"""
+    check_batch_size(request)
+    logger.info(f"流式批量聊天: {len(request.requests)}条, 并发数={resolve_concurrency(request.concurrency)}")
+
+    return StreamingResponse(
+        ndjson_lines(run_chat_batch(request.requests, request.concurrency)),
+        media_type="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no"}
+    )
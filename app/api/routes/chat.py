@@ -1,11 +1,16 @@
 """
 聊天相关路由
 """
+from typing import Dict, List
 from fastapi import APIRouter, HTTPException
 from app.models.schemas import ChatRequest, ChatHistoryRequest
-from app.core.dashscope_client import DashscopeClient
+from app.core.async_dashscope_client import get_client
+from app.core.errors import DashscopeError
+from app.api.errors import to_http_exception
 from app.core.config import TEST_MODE
 from app.core.logging import setup_logging
+from app.services.history_compactor import compact_history
+from app.services.session_store import SessionNotFoundError, get_session_store
 
 logger = setup_logging()
 router = APIRouter()
@@ -19,44 +24,78 @@ async def chat(request: ChatRequest):
             response = mock_response(request.prompt)
         else:
             # 正常调用API
-            client = DashscopeClient()
+            client = get_client()
             messages = client.format_messages(
                 prompt=request.prompt,
                 system_message=request.system_message
             )
-            response = client.chat(messages)
+            response = await client.chat(messages, use_cache=request.use_cache)
         
         return {
             "status_code": response['status_code'],
             "request_id": response['request_id'],
             "answer": response['choices'][0]['message']['content']
         }
+    except DashscopeError as e:
+        logger.error(f"聊天请求失败: {str(e)}")
+        raise to_http_exception(e, "聊天请求失败")
     except Exception as e:
         logger.error(f"聊天请求失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"聊天请求失败: {str(e)}")
 
+async def load_session_messages(session_id: str, prompt: str) -> List[Dict[str, str]]:
+    """使用服务端会话中的历史组装消息，历史超出token预算时压缩
+
+    Raises:
+        HTTPException: 会话不存在或已过期（404）
+    """
+    session = await get_session_store().aget(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"会话不存在或已过期: {session_id}")
+    return compact_history(session.build_messages(prompt))
+
+async def record_session_turn(session_id: str, prompt: str, answer: str) -> None:
+    """把本轮问答写入会话历史，会话在回答期间过期时只记录警告"""
+    try:
+        await get_session_store().arecord_turn(session_id, prompt, answer)
+    except SessionNotFoundError:
+        logger.warning(f"会话{session_id}已过期，本轮问答未写入历史")
+
+def history_messages(request: ChatHistoryRequest) -> List[Dict[str, str]]:
+    """使用请求中的历史组装消息，历史超出token预算时压缩"""
+    return compact_history(get_client().format_messages(
+        prompt=request.prompt,
+        system_message=request.system_message,
+        history=[item.model_dump() for item in request.history]
+    ))
+
 @router.post("/multi_turn_chat")
 async def multi_turn_chat(request: ChatHistoryRequest):
-    """多轮对话API"""
+    """多轮对话API，指定session_id时只需发送新问题"""
+    if request.session_id:
+        messages = await load_session_messages(request.session_id, request.prompt)
     try:
         if TEST_MODE:
             # 测试模式
             response = mock_response(request.prompt)
         else:
             # 正常调用API
-            client = DashscopeClient()
-            messages = client.format_messages(
-                prompt=request.prompt,
-                system_message=request.system_message,
-                history=request.history
-            )
-            response = client.chat(messages)
+            if not request.session_id:
+                messages = history_messages(request)
+            response = await get_client().chat(messages, use_cache=request.use_cache)
         
-        return {
+        result = {
             "status_code": response['status_code'],
             "request_id": response['request_id'],
             "answer": response['choices'][0]['message']['content']
         }
+        if request.session_id:
+            await record_session_turn(request.session_id, request.prompt, result["answer"])
+            result["session_id"] = request.session_id
+        return result
+    except DashscopeError as e:
+        logger.error(f"多轮对话请求失败: {str(e)}")
+        raise to_http_exception(e, "多轮对话请求失败")
     except Exception as e:
         logger.error(f"多轮对话请求失败: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"多轮对话请求失败: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"多轮对话请求失败: {str(e)}") 
@@ -0,0 +1,81 @@
+"""
+流式聊天相关路由（SSE）
+"""
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from fastapi import APIRouter
+from app.models.schemas import ChatRequest, ChatHistoryRequest
+from app.core.async_dashscope_client import get_client
+from app.core.errors import DashscopeError
+from app.core.logging import setup_logging
+from app.api.routes.chat import history_messages, load_session_messages, record_session_turn
+from app.utils.sse import format_sse, sse_response
+
+logger = setup_logging()
+router = APIRouter()
+
+async def stream_chat_events(
+    messages: List[Dict[str, Any]],
+    error_prefix: str,
+    on_complete: Optional[Callable[[str], Awaitable[Any]]] = None
+) -> AsyncIterator[str]:
+    """调用流式接口并转换为SSE事件
+
+    Args:
+        messages: 消息列表
+        error_prefix: 错误信息前缀
+        on_complete: 流正常结束时以完整回答调用（如写入会话历史）
+
+    事件类型：
+        delta: 增量文本 {"content": "..."}
+        done: 结束事件 {"request_id": "...", "finish_reason": "...", "usage": {...}}
+        error: 错误事件 {"detail": "..."}
+    """
+    request_id = None
+    finish_reason = None
+    usage = {}
+    parts = []
+    try:
+        async for chunk in get_client().stream_chat(messages):
+            request_id = chunk['request_id'] or request_id
+            finish_reason = chunk['finish_reason'] or finish_reason
+            usage = chunk['usage'] or usage
+            if chunk['content']:
+                parts.append(chunk['content'])
+                yield format_sse({"content": chunk['content']}, event="delta")
+        
+        if on_complete is not None:
+            await on_complete("".join(parts))
+        
+        yield format_sse({
+            "request_id": request_id,
+            "finish_reason": finish_reason,
+            "usage": usage
+        }, event="done")
+    except DashscopeError as e:
+        logger.error(f"{error_prefix}: {str(e)}")
+        yield format_sse({"detail": f"{error_prefix}: {str(e)}", "status": e.http_status}, event="error")
+    except Exception as e:
+        logger.error(f"{error_prefix}: {str(e)}")
+        yield format_sse({"detail": f"{error_prefix}: {str(e)}", "status": 500}, event="error")
+
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """流式聊天API（SSE）"""
+    messages = get_client().format_messages(
+        prompt=request.prompt,
+        system_message=request.system_message
+    )
+    return sse_response(stream_chat_events(messages, "流式聊天请求失败"))
+
+@router.post("/multi_turn_chat/stream")
+async def multi_turn_chat_stream(request: ChatHistoryRequest):
+    """流式多轮对话API（SSE），指定session_id时回答结束后写入会话历史"""
+    if not request.session_id:
+        return sse_response(stream_chat_events(history_messages(request), "流式多轮对话请求失败"))
+
+    messages = await load_session_messages(request.session_id, request.prompt)
+
+    async def record(answer: str):
+        await record_session_turn(request.session_id, request.prompt, answer)
+
+    return sse_response(stream_chat_events(messages, "流式多轮对话请求失败", on_complete=record))
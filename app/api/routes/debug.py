@@ -2,9 +2,22 @@
 调试相关路由
 """
 import logging
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 from app.core.config import DEBUG_MODE, TEST_MODE
 from app.core.logging import setup_logging
+from app.core.connection_pool import get_pool
+from app.core.response_cache import get_response_cache
+from app.core.singleflight import get_singleflight
+from app.core.rate_limiter import get_scheduler
+from app.core.resilience import get_breaker
+from app.core.hedging import get_hedge_policy
+from app.utils.tool_cache import get_tool_cache
+from app.services.tool_selector import get_tool_selector
+from app.services.intent_router import get_intent_router
+from app.services.tool_prefetch import get_tool_prefetcher
+from app.services.stage_cache import get_stage_cache, invalidate_tool_data
+from app.services.session_store import get_session_store
+from app.services.history_compactor import get_history_compactor
 
 logger = setup_logging()
 router = APIRouter()
@@ -12,11 +25,13 @@ router = APIRouter()
 @router.get("/debug")
 async def debug_status():
     """获取调试状态"""
+    breaker = get_breaker()
     return {
         "debug_mode": DEBUG_MODE,
         "test_mode": TEST_MODE,
         "log_level": logging.getLevelName(logger.level),
-        "api_status": "running"
+        "api_status": "running",
+        "circuit_breaker": breaker.stats() if breaker else None
     }
 
 @router.post("/debug")
@@ -54,6 +69,128 @@ async def set_debug(
     
     return result
 
+@router.get("/debug/pool")
+async def pool_status():
+    """获取DashScope连接池状态"""
+    return get_pool().stats()
+
+@router.get("/debug/cache")
+async def cache_status():
+    """获取响应缓存命中统计"""
+    cache = get_response_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+@router.delete("/debug/cache")
+async def clear_cache():
+    """清空响应缓存"""
+    cache = get_response_cache()
+    if cache is None:
+        return {"enabled": False, "cleared": False}
+    cache.clear()
+    return {"enabled": True, "cleared": True}
+
+@router.get("/debug/singleflight")
+async def singleflight_status():
+    """获取相同请求合并统计"""
+    return get_singleflight().stats()
+
+@router.get("/debug/scheduler")
+async def scheduler_status():
+    """获取上游调度器状态（队列深度、等待时间、额度）"""
+    scheduler = get_scheduler()
+    if scheduler is None:
+        return {"enabled": False}
+    return {"enabled": True, **scheduler.stats()}
+
+@router.get("/debug/hedging")
+async def hedging_status():
+    """获取对冲请求统计（对冲次数、对冲胜出率、当前等待时间）"""
+    hedging = get_hedge_policy()
+    if hedging is None:
+        return {"enabled": False}
+    return {"enabled": True, **hedging.stats()}
+
+@router.get("/debug/tool_cache")
+async def tool_cache_status():
+    """获取各工具的结果缓存统计"""
+    cache = get_tool_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, "tools": cache.stats()}
+
+@router.delete("/debug/tool_cache")
+async def clear_tool_cache(tool: str = None):
+    """清空全部或指定工具的结果缓存"""
+    cache = get_tool_cache()
+    if cache is None:
+        return {"enabled": False, "cleared": False}
+    cache.clear(tool)
+    return {"enabled": True, "cleared": True}
+
+@router.get("/debug/tool_selection")
+async def tool_selection_status():
+    """获取工具预选统计（裁剪次数、退回全部工具次数、节省的token）"""
+    selector = get_tool_selector()
+    if selector is None:
+        return {"enabled": False}
+    return {"enabled": True, **selector.stats()}
+
+@router.get("/debug/intents")
+async def intent_status():
+    """获取意图快速通道统计（直接回答的比例、各意图命中次数）"""
+    intent_router = get_intent_router()
+    if intent_router is None:
+        return {"enabled": False}
+    return {"enabled": True, **intent_router.stats()}
+
+@router.get("/debug/prefetch")
+async def prefetch_status():
+    """获取工具预取统计（预取次数、命中率、丢弃次数）"""
+    prefetcher = get_tool_prefetcher()
+    if prefetcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **prefetcher.stats()}
+
+@router.get("/debug/stage_cache")
+async def stage_cache_status():
+    """获取工具执行后回答的阶段缓存统计"""
+    cache = get_stage_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+@router.delete("/debug/stage_cache")
+async def clear_stage_cache():
+    """清空阶段缓存"""
+    cache = get_stage_cache()
+    if cache is None:
+        return {"enabled": False, "cleared": False}
+    cache.clear()
+    return {"enabled": True, "cleared": True}
+
+@router.get("/debug/sessions")
+async def session_status():
+    """获取会话存储统计（会话数、内存占用、淘汰和过期次数）"""
+    return get_session_store().stats()
+
+@router.get("/debug/history")
+async def history_status():
+    """获取多轮对话历史压缩统计（压缩次数、丢弃轮数、节省的token、摘要命中）"""
+    compactor = get_history_compactor()
+    if compactor is None:
+        return {"enabled": False}
+    return {"enabled": True, **compactor.stats()}
+
+@router.post("/debug/tool_data/{tool}")
+async def bump_tool_data(tool: str):
+    """标记工具背后的数据已变化：递增数据版本号并清空该工具的结果缓存"""
+    try:
+        return {"tool": tool, "data_version": invalidate_tool_data(tool)}
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"未注册的工具: {tool}")
+
 @router.get("/logs")
 async def get_logs(lines: int = 100):
     """获取最近的日志"""
@@ -0,0 +1,31 @@
+"""
+会话相关路由
+"""
+from fastapi import APIRouter, HTTPException
+from app.models.schemas import SessionCreateRequest
+from app.core.logging import setup_logging
+from app.services.session_store import get_session_store
+
+logger = setup_logging()
+router = APIRouter()
+
+@router.post("/sessions")
+async def create_session(request: SessionCreateRequest):
+    """创建会话，之后的多轮对话请求只需携带session_id和新问题"""
+    session = await get_session_store().acreate(request.system_message)
+    return {"session_id": session.session_id, "created_at": session.created_at}
+
+@router.get("/sessions/{session_id}")
+async def get_session(session_id: str):
+    """获取会话的消息记录"""
+    session = await get_session_store().aget(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"会话不存在或已过期: {session_id}")
+    return session.to_dict()
+
+@router.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    """删除会话"""
+    if not await get_session_store().adelete(session_id):
+        raise HTTPException(status_code=404, detail=f"会话不存在或已过期: {session_id}")
+    return {"session_id": session_id, "deleted": True}
@@ -0,0 +1,36 @@
+"""
+token估算相关路由
+"""
+from fastapi import APIRouter, HTTPException
+from app.models.schemas import TokenEstimateRequest
+from app.core.logging import setup_logging
+from app.core.token_estimator import get_token_estimator
+from app.utils.tools import tool_registry
+
+logger = setup_logging()
+router = APIRouter()
+
+@router.post("/tokens/estimate")
+async def estimate_tokens(request: TokenEstimateRequest):
+    """本地估算token数，不调用千问API"""
+    if request.text is None and not request.messages:
+        raise HTTPException(status_code=400, detail="text和messages至少提供一个")
+
+    estimator = get_token_estimator()
+    result = {}
+    if request.text is not None:
+        result["text_tokens"] = estimator.text_tokens(request.text)
+    if request.messages:
+        tools = tool_registry.normalize(request.tools) if request.tools else None
+        prompt_tokens = estimator.prompt_tokens(request.messages, tools)
+        result.update({
+            "message_tokens": [estimator.message_tokens(message) for message in request.messages],
+            "prompt_tokens": prompt_tokens,
+            "request_tokens": prompt_tokens + request.max_tokens
+        })
+    return result
+
+@router.get("/tokens/calibration")
+async def token_calibration():
+    """校准报告：本地估算与千问返回的usage.input_tokens的偏差"""
+    return get_token_estimator().calibration()
@@ -0,0 +1,99 @@
+"""
+流式函数调用相关路由（SSE）
+"""
+from typing import Any, AsyncIterator, Callable, Dict
+from fastapi import APIRouter
+from app.models.schemas import FunctionCallRequest
+from app.core.errors import DashscopeError
+from app.core.logging import setup_logging
+from app.services.function_call_service import stream_function_call
+from app.utils.sse import format_sse, sse_response
+
+logger = setup_logging()
+router = APIRouter()
+
+# 工具执行记录中转发给前端的字段
+TOOL_RESULT_FIELDS = ("step", "id", "success", "result", "error", "arguments", "elapsed_ms", "at_ms", "cache", "prefetched")
+
+def function_call_done(event: Dict[str, Any]) -> Dict[str, Any]:
+    """/api/function_call/stream的done事件数据"""
+    return {
+        "request_id": event["request_id"],
+        "answer": event["answer"],
+        "stop_reason": event["stop_reason"],
+        "tool_calls": event["executed_tools"],
+        "steps": event["steps"],
+        "usage": event["usage"],
+        "elapsed_ms": event.get("elapsed_ms")
+    }
+
+def complete_function_call_done(event: Dict[str, Any]) -> Dict[str, Any]:
+    """/api/complete_function_call/stream的done事件数据，与/api/complete_function_call的响应结构相同"""
+    done = {
+        "status": "completed",
+        "answer": event["answer"],
+        "used_tools": event["used_tools"],
+        "stop_reason": event["stop_reason"],
+        "steps": event["steps"],
+        "usage": event["usage"],
+        "elapsed_ms": event.get("elapsed_ms")
+    }
+    if event["used_tools"]:
+        done["executed_tools"] = event["executed_tools"]
+    return done
+
+async def function_call_events(
+    request: FunctionCallRequest,
+    error_prefix: str,
+    done_payload: Callable[[Dict[str, Any]], Dict[str, Any]] = function_call_done
+) -> AsyncIterator[str]:
+    """执行流式函数调用并转换为SSE事件
+
+    工具在模型输出参数完整后立即执行，执行进度和最终回答随发生随返回
+
+    事件类型：
+        step: 开始第几轮模型调用 {"step"}
+        tool_call: 模型选定工具 {"step", "id", "name", "arguments"}
+        tool_start: 工具开始执行 {"step", "id", "name", "at_ms"}
+        tool_result: 工具执行完成 {"step", "id", "name", "success", "result"/"error", "elapsed_ms", "at_ms"}
+        delta: 增量文本 {"content": "..."}
+        done: 结束事件，数据由done_payload生成
+        error: 错误事件 {"detail": "...", "status": ...}
+
+    at_ms为距请求开始的毫秒数，tool_result中的elapsed_ms为工具执行耗时
+    """
+    try:
+        async for event in stream_function_call(
+            query=request.query,
+            tools=request.tools,
+            fast_path=request.fast_path
+        ):
+            kind = event["event"]
+            if kind == "delta":
+                yield format_sse({"content": event["content"]}, event="delta")
+            elif kind == "step":
+                yield format_sse({"step": event["step"]}, event="step")
+            elif kind in ("tool_call", "tool_start"):
+                yield format_sse({key: value for key, value in event.items() if key != "event"}, event=kind)
+            elif kind == "tool_result":
+                data = {key: event[key] for key in TOOL_RESULT_FIELDS if key in event}
+                data["name"] = event["function_name"]
+                yield format_sse(data, event="tool_result")
+            elif kind == "done":
+                yield format_sse(done_payload(event), event="done")
+    except DashscopeError as e:
+        logger.error(f"{error_prefix}: {str(e)}")
+        yield format_sse({"detail": f"{error_prefix}: {str(e)}", "status": e.http_status}, event="error")
+    except Exception as e:
+        logger.error(f"{error_prefix}: {str(e)}")
+        yield format_sse({"detail": f"{error_prefix}: {str(e)}", "status": 500}, event="error")
+
+@router.post("/function_call/stream")
+async def function_call_stream(request: FunctionCallRequest):
+    """流式函数调用API（SSE）"""
+    return sse_response(function_call_events(request, "流式函数调用失败"))
+
+@router.post("/complete_function_call/stream")
+async def complete_function_call_stream(request: FunctionCallRequest):
+    """流式完成函数调用API（SSE）"""
+    return sse_response(function_call_events(request, "流式完成函数调用失败", complete_function_call_done))
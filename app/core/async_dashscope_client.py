@@ -0,0 +1,772 @@
+"""
+阿里云千问API异步客户端
+
+基于httpx直接调用DashScope HTTP接口，请求期间不会阻塞事件循环
+"""
+
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, List, Any, Optional, AsyncIterator
+
+import httpx
+
+from app.core.connection_pool import DashscopePool, get_pool
+from app.core.dashscope_client import DashscopeClient
+from app.core.errors import (
+    CircuitOpenError,
+    DashscopeConnectionError,
+    DashscopeError,
+    DashscopeTimeoutError,
+    classify_error,
+    parse_retry_after
+)
+from app.core.hedging import HedgePolicy, get_hedge_policy
+from app.core.resilience import CircuitBreaker, RetryPolicy, get_breaker
+from app.core.response_cache import ResponseCache, get_response_cache, make_cache_key
+from app.core.singleflight import SingleFlight, get_singleflight
+from app.core.token_estimator import get_token_estimator
+from app.core.rate_limiter import (
+    PRIORITY_INTERACTIVE,
+    Ticket,
+    UpstreamScheduler,
+    estimate_request_tokens,
+    get_scheduler,
+    usage_total_tokens
+)
+from app.core.llm_config import (
+    DASHSCOPE_API_KEY,
+    DEFAULT_MODEL,
+    DEFAULT_TEMPERATURE,
+    DEFAULT_MAX_TOKENS,
+    SINGLEFLIGHT_ENABLED
+)
+from app.utils.tools import tool_registry
+
+# 获取logger
+logger = logging.getLogger("gongdi-api.dashscope")
+
+# 文本生成接口路径
+GENERATION_PATH = "/services/aigc/text-generation/generation"
+
+
+def build_response(data: Dict[str, Any], status_code: int = 200, full_message: bool = False) -> Dict:
+    """将DashScope HTTP响应转换为与DashscopeClient一致的结构
+
+    Args:
+        data: 接口返回的JSON数据
+        status_code: HTTP状态码
+        full_message: 是否返回完整的message（工具调用时需要）
+
+    Returns:
+        响应结果
+    """
+    output = data.get('output') or {}
+    message = output['choices'][0]['message']
+    if not full_message and 'tool_calls' not in message:
+        message = {
+            'content': message.get('content', ''),
+            'role': message.get('role', 'assistant')
+        }
+    return {
+        'status_code': status_code,
+        'request_id': data.get('request_id'),
+        'choices': [{
+            'message': message
+        }],
+        'usage': data.get('usage') or output.get('usage', {})
+    }
+
+
+def build_stream_chunk(data: Dict[str, Any]) -> Dict:
+    """将流式响应中的一个事件转换为增量片段
+
+    Args:
+        data: 单个SSE事件的JSON数据
+
+    Returns:
+        增量片段，包含content、finish_reason、usage等字段
+    """
+    output = data.get('output') or {}
+    choice = (output.get('choices') or [{}])[0]
+    message = choice.get('message') or {}
+    finish_reason = choice.get('finish_reason')
+    return {
+        'request_id': data.get('request_id'),
+        'content': message.get('content') or '',
+        'message': message,
+        'finish_reason': None if finish_reason in (None, 'null') else finish_reason,
+        'usage': data.get('usage') or {}
+    }
+
+
+class _Progress:
+    """单次上游调用的进度，用于判断是否需要对冲"""
+
+    def __init__(self):
+        self.sent = asyncio.Event()  # 已获得调度额度和连接，请求已发出
+        self.first_byte = asyncio.Event()  # 已收到响应头
+
+
+def _consume_exception(task: asyncio.Task) -> None:
+    """取出任务异常，避免被取消的对冲任务产生未处理异常警告"""
+    if not task.cancelled():
+        task.exception()
+
+
+class AsyncDashscopeClient:
+    """阿里云千问API异步客户端
+
+    接口与DashscopeClient保持一致，方法均为协程
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        pool: Optional[DashscopePool] = None,
+        cache: Optional[ResponseCache] = None,
+        singleflight: Optional[SingleFlight] = None,
+        scheduler: Optional[UpstreamScheduler] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        hedging: Optional[HedgePolicy] = None,
+    ):
+        """初始化阿里云千问API异步客户端
+
+        Args:
+            api_key: API密钥，默认从环境变量获取
+            model: 模型名称
+            temperature: 温度参数
+            max_tokens: 最大生成token数量
+            pool: 连接池，默认使用进程内共享连接池
+            cache: 响应缓存，默认使用进程内共享缓存
+            singleflight: 请求合并器，默认使用进程内共享合并器
+            scheduler: 上游调度器，默认使用进程内共享调度器
+            breaker: 熔断器，默认使用进程内共享熔断器
+            retry_policy: 重试策略
+            hedging: 对冲策略，默认使用进程内共享策略
+        """
+        self.api_key = api_key or DASHSCOPE_API_KEY
+        self.model = model or DEFAULT_MODEL
+        self.temperature = temperature if temperature is not None else DEFAULT_TEMPERATURE
+        self.max_tokens = max_tokens or DEFAULT_MAX_TOKENS
+        self._pool = pool
+        self._cache = cache
+        self._singleflight = singleflight
+        self._scheduler = scheduler
+        self._breaker = breaker
+        self.retry_policy = retry_policy or RetryPolicy()
+        self._hedging = hedging
+
+        # 记录初始化信息
+        logger.debug(f"AsyncDashscopeClient初始化: model={self.model}, temperature={self.temperature}, max_tokens={self.max_tokens}")
+
+    @property
+    def pool(self) -> DashscopePool:
+        """获取连接池"""
+        return self._pool or get_pool()
+
+    @property
+    def cache(self) -> Optional[ResponseCache]:
+        """获取响应缓存，未启用时为None"""
+        return self._cache or get_response_cache()
+
+    @property
+    def singleflight(self) -> SingleFlight:
+        """获取请求合并器"""
+        return self._singleflight or get_singleflight()
+
+    @property
+    def scheduler(self) -> Optional[UpstreamScheduler]:
+        """获取上游调度器，未启用限流时为None"""
+        return self._scheduler or get_scheduler()
+
+    @property
+    def breaker(self) -> Optional[CircuitBreaker]:
+        """获取熔断器，未启用时为None"""
+        return self._breaker or get_breaker()
+
+    @property
+    def hedging(self) -> Optional[HedgePolicy]:
+        """获取对冲策略，未启用时为None"""
+        return self._hedging or get_hedge_policy()
+
+    async def _acquire(self, payload: Dict[str, Any], priority: int) -> Optional[Ticket]:
+        """按预估token数申请上游调用额度"""
+        scheduler = self.scheduler
+        if scheduler is None:
+            return None
+        parameters = payload['parameters']
+        estimated = estimate_request_tokens(
+            payload['input']['messages'],
+            parameters.get('tools'),
+            parameters['max_tokens']
+        )
+        return await scheduler.acquire(estimated, priority)
+
+    def _reconcile(self, ticket: Optional[Ticket], usage: Optional[Dict[str, Any]]) -> None:
+        """按实际usage校正额度，调用失败时归还全部预估额度"""
+        if ticket is not None:
+            self.scheduler.reconcile(ticket, usage_total_tokens(usage) or 0)
+
+    @staticmethod
+    def _observe_usage(payload: Dict[str, Any], usage: Optional[Dict[str, Any]]) -> None:
+        """记录本地估算的提示token数与实际usage，用于校准报告"""
+        if usage:
+            get_token_estimator().observe(payload['input']['messages'], payload['parameters'].get('tools'), usage)
+
+    def _headers(self) -> Dict[str, str]:
+        """构建请求头"""
+        return {
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json'
+        }
+
+    def _build_payload(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict]] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        stream: bool = False,
+        stop: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """构建请求体
+
+        Args:
+            messages: 聊天消息列表
+            tools: 工具列表
+            temperature: 温度参数
+            max_tokens: 最大生成token数量
+            stream: 是否使用增量输出
+            stop: 停止序列
+
+        Returns:
+            DashScope接口请求体
+        """
+        parameters = {
+            'temperature': temperature if temperature is not None else self.temperature,
+            'max_tokens': max_tokens or self.max_tokens,
+            'result_format': 'message'
+        }
+
+        if stream:
+            parameters['incremental_output'] = True
+
+        if stop:
+            parameters['stop'] = list(stop)
+
+        # 如果有工具，添加到参数中
+        if tools:
+            parameters['tools'] = tools
+
+        return {
+            'model': self.model,
+            'input': {'messages': messages},
+            'parameters': parameters
+        }
+
+    def _raise_for_status(self, status_code: int, data: Dict[str, Any], headers: httpx.Headers) -> None:
+        """非200响应转换为分类异常"""
+        if status_code != 200:
+            raise classify_error(
+                status_code,
+                data.get('code'),
+                data.get('message'),
+                data.get('request_id'),
+                parse_retry_after(headers.get('Retry-After'))
+            )
+
+    def _before_call(self) -> None:
+        """调用前检查熔断器"""
+        breaker = self.breaker
+        if breaker is not None:
+            breaker.before_call()
+
+    def _record(self, error: Optional[BaseException]) -> None:
+        """向熔断器记录调用结果，只有上游故障计入失败"""
+        breaker = self.breaker
+        if breaker is None:
+            return
+        if error is None:
+            breaker.record_success()
+        elif isinstance(error, DashscopeError) and error.breaker_failure:
+            breaker.record_failure()
+        else:
+            breaker.release()
+
+    async def _post_once(
+        self,
+        payload: Dict[str, Any],
+        priority: int,
+        progress: Optional[_Progress] = None,
+    ) -> Dict[str, Any]:
+        """调用一次文本生成接口
+
+        Args:
+            payload: 请求体
+            priority: 调度优先级
+            progress: 调用进度，对冲时用于判断首字节是否已到达
+
+        Returns:
+            接口返回的JSON数据
+        """
+        ticket = await self._acquire(payload, priority)
+        usage = None
+        try:
+            try:
+                async with self.pool.slot() as http_client:
+                    if progress is not None:
+                        progress.sent.set()
+                    started = time.monotonic()
+                    async with http_client.stream('POST', GENERATION_PATH, json=payload, headers=self._headers()) as response:
+                        hedging = self.hedging
+                        if hedging is not None and response.status_code == 200:
+                            hedging.observe(time.monotonic() - started)
+                        if progress is not None:
+                            progress.first_byte.set()
+                        await response.aread()
+            except httpx.TimeoutException as e:
+                raise DashscopeTimeoutError(f"API调用超时: {str(e)}") from e
+            except httpx.TransportError as e:
+                raise DashscopeConnectionError(f"API连接失败: {str(e)}") from e
+
+            try:
+                data = response.json()
+            except ValueError:
+                data = {'code': response.status_code, 'message': response.text}
+
+            self._raise_for_status(response.status_code, data, response.headers)
+            usage = data.get('usage')
+            self._observe_usage(payload, usage)
+            return data
+        finally:
+            self._reconcile(ticket, usage)
+
+    def _cache_key(self, payload: Dict[str, Any]) -> Optional[str]:
+        """计算缓存键，只有temperature为0的确定性请求才可缓存和合并"""
+        parameters = payload['parameters']
+        if parameters['temperature'] != 0:
+            return None
+        return make_cache_key(
+            payload['model'],
+            payload['input']['messages'],
+            parameters.get('tools'),
+            parameters['temperature'],
+            parameters['max_tokens'],
+            parameters.get('stop')
+        )
+
+    async def _post(self, payload: Dict[str, Any], priority: int = PRIORITY_INTERACTIVE) -> Dict[str, Any]:
+        """调用文本生成接口，可重试的错误按指数退避重试
+
+        Args:
+            payload: 请求体
+            priority: 调度优先级
+
+        Returns:
+            接口返回的JSON数据
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            self._before_call()
+            try:
+                data = await self._post_hedged(payload, priority)
+            except DashscopeError as e:
+                self._record(e)
+                delay = self.retry_policy.backoff(attempt, e.retry_after) if e.retryable else None
+                if delay is None:
+                    raise
+                logger.warning(f"DashScope调用失败，{delay:.2f}秒后重试（第{attempt}次失败）: {str(e)}")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException as e:
+                self._record(e)
+                raise
+            self._record(None)
+            return data
+
+    async def _post_hedged(self, payload: Dict[str, Any], priority: int) -> Dict[str, Any]:
+        """调用一次文本生成接口，首字节在对冲等待时间内未到达时发起重复请求
+
+        只对交互式请求对冲，取先成功的结果并取消另一个
+
+        Args:
+            payload: 请求体
+            priority: 调度优先级
+
+        Returns:
+            接口返回的JSON数据
+        """
+        hedging = self.hedging
+        if hedging is None or priority != PRIORITY_INTERACTIVE:
+            return await self._post_once(payload, priority)
+
+        hedging.record_request()
+        delay = hedging.delay()
+        if delay is None:
+            return await self._post_once(payload, priority)
+
+        progress = _Progress()
+        primary = asyncio.ensure_future(self._post_once(payload, priority, progress))
+        primary.add_done_callback(_consume_exception)
+        try:
+            # 排队时间不计入对冲等待，从请求实际发出开始计时
+            await self._wait_event(primary, progress.sent, None)
+            if not primary.done():
+                await self._wait_event(primary, progress.first_byte, delay)
+            if primary.done() or progress.first_byte.is_set() or not hedging.try_hedge():
+                return await primary
+
+            logger.info(f"{delay:.2f}秒内未收到响应头，发起对冲请求")
+            hedge = asyncio.ensure_future(self._post_once(payload, priority))
+            hedge.add_done_callback(_consume_exception)
+            try:
+                return await self._race(primary, hedge, hedging)
+            finally:
+                hedge.cancel()
+        finally:
+            primary.cancel()
+
+    @staticmethod
+    async def _wait_event(task: asyncio.Task, event: asyncio.Event, timeout: Optional[float]) -> None:
+        """等待事件发生、任务结束或超时，以先到者为准"""
+        waiter = asyncio.ensure_future(event.wait())
+        try:
+            await asyncio.wait({task, waiter}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            waiter.cancel()
+
+    @staticmethod
+    async def _race(primary: asyncio.Task, hedge: asyncio.Task, hedging: HedgePolicy) -> Dict[str, Any]:
+        """等待原请求和对冲请求中先成功的一个，都失败时抛出先发生的错误"""
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winner = None
+            for task in done:
+                if task.exception() is None:
+                    winner = winner or task
+                elif error is None:
+                    error = task.exception()
+            if winner is not None:
+                hedging.record_win(winner is hedge)
+                return winner.result()
+        raise error
+
+    async def _generate(
+        self,
+        payload: Dict[str, Any],
+        full_message: bool = False,
+        use_cache: bool = True,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> Dict:
+        """先查缓存，未命中时调用接口（合并相同的并发请求）并写入缓存
+
+        Args:
+            payload: 请求体
+            full_message: 是否返回完整的message
+            use_cache: 是否使用缓存
+            priority: 调度优先级
+
+        Returns:
+            响应结果
+        """
+        key = self._cache_key(payload)
+        cache = self.cache if use_cache and key is not None else None
+        if cache is not None:
+            cached = await cache.aget(key)
+            if cached is not None:
+                logger.debug(f"响应缓存命中: key={key[:16]}")
+                return cached
+
+        try:
+            # 确定性请求合并并发的相同调用
+            if key is not None and SINGLEFLIGHT_ENABLED:
+                return await self.singleflight.do(
+                    key, lambda: self._fetch(payload, full_message, cache, key, priority)
+                )
+            return await self._fetch(payload, full_message, cache, key, priority)
+        except CircuitOpenError:
+            # 熔断期间用已过期的缓存兜底
+            if cache is not None:
+                stale = await cache.aget(key, allow_stale=True)
+                if stale is not None:
+                    logger.warning(f"熔断中，返回过期缓存: key={key[:16]}")
+                    return stale
+            raise
+
+    async def _fetch(
+        self,
+        payload: Dict[str, Any],
+        full_message: bool,
+        cache: Optional[ResponseCache],
+        key: Optional[str],
+        priority: int,
+    ) -> Dict:
+        """调用接口并写入缓存"""
+        data = await self._post(payload, priority)
+        result = build_response(data, full_message=full_message)
+
+        if cache is not None:
+            await cache.aset(key, result)
+        return result
+
+    async def _post_stream_once(self, payload: Dict[str, Any], priority: int) -> AsyncIterator[Dict[str, Any]]:
+        """以SSE方式调用一次文本生成接口
+
+        Args:
+            payload: 请求体
+            priority: 调度优先级
+
+        Yields:
+            每个SSE事件的JSON数据
+        """
+        headers = self._headers()
+        headers['Accept'] = 'text/event-stream'
+        headers['X-DashScope-SSE'] = 'enable'
+
+        ticket = await self._acquire(payload, priority)
+        usage = None
+        try:
+            async with self.pool.slot() as http_client:
+                async with http_client.stream('POST', GENERATION_PATH, json=payload, headers=headers) as response:
+                    if response.status_code != 200:
+                        body = await response.aread()
+                        try:
+                            data = json.loads(body)
+                        except ValueError:
+                            data = {'code': response.status_code, 'message': body.decode('utf-8', 'replace')}
+                        self._raise_for_status(response.status_code, data, response.headers)
+
+                    event = None
+                    async for line in response.aiter_lines():
+                        if line.startswith('event:'):
+                            event = line[len('event:'):].strip()
+                        elif line.startswith('data:'):
+                            data = json.loads(line[len('data:'):])
+                            if event == 'error':
+                                raise classify_error(None, data.get('code'), data.get('message'), data.get('request_id'))
+                            usage = data.get('usage') or usage
+                            yield data
+        except httpx.TimeoutException as e:
+            raise DashscopeTimeoutError(f"API调用超时: {str(e)}") from e
+        except httpx.TransportError as e:
+            raise DashscopeConnectionError(f"API连接失败: {str(e)}") from e
+        finally:
+            self._reconcile(ticket, usage)
+            self._observe_usage(payload, usage)
+
+    async def _post_stream(self, payload: Dict[str, Any], priority: int = PRIORITY_INTERACTIVE) -> AsyncIterator[Dict[str, Any]]:
+        """以SSE方式调用文本生成接口，收到首个事件前失败可重试
+
+        Args:
+            payload: 请求体
+            priority: 调度优先级
+
+        Yields:
+            每个SSE事件的JSON数据
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            self._before_call()
+            started = False
+            try:
+                async for data in self._post_stream_once(payload, priority):
+                    started = True
+                    yield data
+            except DashscopeError as e:
+                self._record(e)
+                delay = self.retry_policy.backoff(attempt, e.retry_after) if e.retryable and not started else None
+                if delay is None:
+                    raise
+                logger.warning(f"DashScope流式调用失败，{delay:.2f}秒后重试（第{attempt}次失败）: {str(e)}")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException as e:
+                self._record(e)
+                raise
+            self._record(None)
+            return
+
+    async def chat(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict]] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        use_cache: bool = True,
+        priority: int = PRIORITY_INTERACTIVE,
+        stop: Optional[List[str]] = None,
+    ) -> Dict:
+        """发送聊天请求
+
+        Args:
+            messages: 聊天消息列表
+            tools: 工具列表
+            temperature: 温度参数
+            max_tokens: 最大生成token数量
+            use_cache: 是否使用响应缓存
+            priority: 调度优先级
+            stop: 停止序列，生成到其中任一序列时停止
+
+        Returns:
+            API响应结果
+        """
+        payload = self._build_payload(messages, tools, temperature, max_tokens, stop=stop)
+        return await self._generate(payload, use_cache=use_cache, priority=priority)
+
+    async def stream_chat(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict]] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+        stop: Optional[List[str]] = None,
+    ) -> AsyncIterator[Dict]:
+        """发送流式聊天请求
+
+        Args:
+            messages: 聊天消息列表
+            tools: 工具列表
+            temperature: 温度参数
+            max_tokens: 最大生成token数量
+            priority: 调度优先级
+            stop: 停止序列，生成到其中任一序列时停止
+
+        Yields:
+            增量片段，最后一个片段带有finish_reason和usage
+        """
+        payload = self._build_payload(messages, tools, temperature, max_tokens, stream=True, stop=stop)
+        key = self._cache_key(payload)
+
+        # 确定性请求共享同一条上游流
+        if key is not None and SINGLEFLIGHT_ENABLED:
+            source = self.singleflight.stream(f"stream:{key}", lambda: self._stream_chunks(payload, priority))
+        else:
+            source = self._stream_chunks(payload, priority)
+
+        async for chunk in source:
+            yield chunk
+
+    async def _stream_chunks(self, payload: Dict[str, Any], priority: int) -> AsyncIterator[Dict]:
+        """调用流式接口并转换为增量片段"""
+        async for data in self._post_stream(payload, priority):
+            yield build_stream_chunk(data)
+
+    async def function_call(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict]] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        use_cache: bool = True,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> Dict:
+        """发送工具调用请求
+
+        Args:
+            messages: 聊天消息列表
+            tools: 工具列表，如果为None则使用默认工具
+            temperature: 温度参数
+            max_tokens: 最大生成token数量
+            use_cache: 是否使用响应缓存
+            priority: 调度优先级
+
+        Returns:
+            工具调用结果
+        """
+        logger.debug(f"接收function_call请求: messages={messages}")
+
+        formatted_tools = tool_registry.normalize(tools)
+        payload = self._build_payload(messages, formatted_tools, temperature, max_tokens)
+
+        try:
+            result = await self._generate(payload, full_message=True, use_cache=use_cache, priority=priority)
+            logger.debug(f"成功处理响应: request_id={result['request_id']}")
+            return result
+        except Exception as e:
+            logger.error(f"AsyncDashscopeClient.function_call错误: {str(e)}")
+            raise
+
+    async def stream_function_call(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict]] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> AsyncIterator[Dict]:
+        """发送流式工具调用请求
+
+        tool_calls按片段返回在每个增量片段的message中，可以用ToolCallAccumulator合并
+
+        Args:
+            messages: 聊天消息列表
+            tools: 工具列表，如果为None则使用默认工具
+            temperature: 温度参数
+            max_tokens: 最大生成token数量
+            priority: 调度优先级
+
+        Yields:
+            增量片段，最后一个片段带有finish_reason和usage
+        """
+        formatted_tools = tool_registry.normalize(tools)
+        payload = self._build_payload(messages, formatted_tools, temperature, max_tokens, stream=True)
+        async for chunk in self._stream_chunks(payload, priority):
+            yield chunk
+
+    async def process_tool_results(
+        self,
+        messages: List[Dict[str, Any]],
+        tool_results: List[Dict[str, Any]],
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        use_cache: bool = True,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> Dict:
+        """处理工具调用结果，并发送给模型处理
+
+        Args:
+            messages: 聊天历史消息
+            tool_results: 工具调用结果
+            temperature: 温度参数
+            max_tokens: 最大生成token数量
+            use_cache: 是否使用响应缓存
+            priority: 调度优先级
+
+        Returns:
+            模型处理结果
+        """
+        full_messages = list(messages)
+        full_messages.extend(tool_results)
+
+        return await self.chat(
+            messages=full_messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            use_cache=use_cache,
+            priority=priority
+        )
+
+    format_messages = staticmethod(DashscopeClient.format_messages)
+
+
+# 进程内共享客户端
+_shared_client: Optional[AsyncDashscopeClient] = None
+
+
+def get_client() -> AsyncDashscopeClient:
+    """获取进程内共享的异步客户端（使用共享连接池）"""
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = AsyncDashscopeClient()
+    return _shared_client
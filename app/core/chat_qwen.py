@@ -0,0 +1,282 @@
+"""
+千问LangChain聊天模型
+
+LangChainFunctionAgent需要支持bind_functions的聊天模型。ChatQwen把LangChain的消息和工具
+转换为DashScope格式：异步调用和流式输出使用进程内共享的AsyncDashscopeClient，
+与REST路由共用连接池、响应缓存、调度限流和统计。同步调用（invoke/stream）使用一个复用的
+DashscopeClient，经dashscope SDK自己的HTTP会话发送请求，只与REST路由共用响应缓存，
+不经过共享连接池和调度限流，也不计入客户端统计；代理应优先使用异步接口（ainvoke/astream）。
+"""
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Union
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    FunctionMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+)
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.pydantic_v1 import PrivateAttr
+from langchain_core.utils.function_calling import convert_to_openai_function
+
+from app.core.async_dashscope_client import AsyncDashscopeClient, get_client
+from app.core.dashscope_client import DashscopeClient
+from app.core.rate_limiter import PRIORITY_INTERACTIVE
+from app.core.tool_call_parser import ToolCallAccumulator
+
+
+def to_dashscope_messages(messages: List[BaseMessage]) -> List[Dict[str, Any]]:
+    """将LangChain消息转换为DashScope消息
+
+    bind_functions模式下AIMessage的function_call没有ID，这里补上ID，
+    随后的FunctionMessage使用同一个ID作为tool_call_id
+    """
+    converted = []
+    last_call_id = None
+    for message in messages:
+        if isinstance(message, SystemMessage):
+            converted.append({"role": "system", "content": message.content})
+        elif isinstance(message, HumanMessage):
+            converted.append({"role": "user", "content": message.content})
+        elif isinstance(message, AIMessage):
+            item: Dict[str, Any] = {"role": "assistant", "content": message.content or ""}
+            function_call = message.additional_kwargs.get("function_call")
+            tool_calls = message.additional_kwargs.get("tool_calls")
+            if function_call:
+                last_call_id = f"call_{len(converted)}"
+                item["tool_calls"] = [{
+                    "id": last_call_id,
+                    "type": "function",
+                    "function": {"name": function_call["name"], "arguments": function_call.get("arguments") or ""}
+                }]
+            elif tool_calls:
+                item["tool_calls"] = [
+                    {"id": call.get("id"), "type": "function", "function": call["function"]}
+                    for call in tool_calls
+                ]
+            converted.append(item)
+        elif isinstance(message, FunctionMessage):
+            converted.append({
+                "tool_call_id": last_call_id,
+                "role": "tool",
+                "name": message.name,
+                "content": message.content
+            })
+        elif isinstance(message, ToolMessage):
+            converted.append({"tool_call_id": message.tool_call_id, "role": "tool", "content": message.content})
+        else:
+            raise ValueError(f"不支持的消息类型: {message.type}")
+    return converted
+
+
+class ChatQwen(BaseChatModel):
+    """基于DashScope客户端的千问聊天模型
+
+    Example:
+        llm = ChatQwen(temperature=0)
+        agent = LangChainFunctionAgent(llm)
+    """
+
+    client: Optional[Any] = None
+    """异步客户端，默认使用进程内共享客户端（共享连接池）"""
+    sync_client: Optional[Any] = None
+    """同步客户端，默认创建一个DashscopeClient并复用（只共用响应缓存）"""
+    temperature: Optional[float] = None
+    """温度参数，默认使用客户端配置"""
+    max_tokens: Optional[int] = None
+    """最大生成token数量，默认使用客户端配置"""
+    use_cache: bool = True
+    """是否使用响应缓存（只有temperature为0的请求会被缓存）"""
+    priority: int = PRIORITY_INTERACTIVE
+    """调度优先级"""
+
+    _default_sync_client: Optional[DashscopeClient] = PrivateAttr(default=None)
+
+    @property
+    def _llm_type(self) -> str:
+        return "qwen-dashscope"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {
+            "model": self._async_client().model,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens
+        }
+
+    def _async_client(self) -> AsyncDashscopeClient:
+        return self.client or get_client()
+
+    def _sync_client(self) -> DashscopeClient:
+        if self.sync_client is not None:
+            return self.sync_client
+        if self._default_sync_client is None:
+            self._default_sync_client = DashscopeClient()
+        return self._default_sync_client
+
+    def bind_functions(
+        self,
+        functions: Sequence[Union[Dict[str, Any], Any]],
+        **kwargs: Any,
+    ):
+        """绑定函数（OpenAI functions格式），模型选择工具时回答带有additional_kwargs["function_call"]
+
+        Args:
+            functions: 函数schema、LangChain工具、pydantic模型或Python函数
+        """
+        return self.bind(functions=[convert_to_openai_function(f) for f in functions], **kwargs)
+
+    def bind_tools(
+        self,
+        tools: Sequence[Union[Dict[str, Any], Any]],
+        **kwargs: Any,
+    ):
+        """绑定工具，模型选择工具时回答带有tool_calls"""
+        return self.bind(
+            tools=[{"type": "function", "function": convert_to_openai_function(t)} for t in tools],
+            **kwargs
+        )
+
+    @staticmethod
+    def _request_tools(kwargs: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        if kwargs.get("tools"):
+            return kwargs["tools"]
+        if kwargs.get("functions"):
+            return [{"type": "function", "function": f} for f in kwargs["functions"]]
+        return None
+
+    @staticmethod
+    def _tool_call_kwargs(tool_calls: List[Dict[str, Any]], kwargs: Dict[str, Any], chunk: bool = False) -> Dict[str, Any]:
+        """把千问返回的tool_calls转换为绑定方式对应的additional_kwargs"""
+        if not tool_calls:
+            return {}
+        if kwargs.get("functions") and not kwargs.get("tools"):
+            # functions模式每次只调用一个函数
+            function = tool_calls[0]["function"]
+            return {"function_call": {"name": function["name"], "arguments": function.get("arguments") or ""}}
+        return {"tool_calls": [
+            {**({"index": i} if chunk else {}), "id": call["id"], "type": "function", "function": call["function"]}
+            for i, call in enumerate(tool_calls)
+        ]}
+
+    def _create_result(self, response: Dict[str, Any], kwargs: Dict[str, Any]) -> ChatResult:
+        message = response["choices"][0]["message"]
+        usage = response.get("usage") or {}
+        ai_message = AIMessage(
+            content=message.get("content") or "",
+            additional_kwargs=self._tool_call_kwargs(message.get("tool_calls") or [], kwargs)
+        )
+        generation = ChatGeneration(message=ai_message, generation_info={"request_id": response.get("request_id")})
+        return ChatResult(generations=[generation], llm_output={"token_usage": usage})
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        response = self._sync_client().chat(
+            to_dashscope_messages(messages),
+            tools=self._request_tools(kwargs),
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            use_cache=self.use_cache,
+            stop=stop
+        )
+        return self._create_result(response, kwargs)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        response = await self._async_client().chat(
+            to_dashscope_messages(messages),
+            tools=self._request_tools(kwargs),
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            use_cache=self.use_cache,
+            priority=self.priority,
+            stop=stop
+        )
+        return self._create_result(response, kwargs)
+
+    def _chunk(self, chunk: Dict[str, Any], accumulator: ToolCallAccumulator) -> Optional[ChatGenerationChunk]:
+        """文本增量转换为ChatGenerationChunk，tool_calls片段合并后在流结束时一次性返回"""
+        accumulator.feed(chunk["message"].get("tool_calls") or [])
+        if not chunk["content"]:
+            return None
+        return ChatGenerationChunk(message=AIMessageChunk(content=chunk["content"]))
+
+    def _last_chunk(self, last: Optional[Dict[str, Any]], accumulator: ToolCallAccumulator,
+                    kwargs: Dict[str, Any]) -> ChatGenerationChunk:
+        """流结束时的片段：带有合并后的工具调用、finish_reason和usage"""
+        last = last or {}
+        return ChatGenerationChunk(
+            message=AIMessageChunk(
+                content="",
+                additional_kwargs=self._tool_call_kwargs(accumulator.tool_calls, kwargs, chunk=True)
+            ),
+            generation_info={
+                "request_id": last.get("request_id"),
+                "finish_reason": last.get("finish_reason"),
+                "token_usage": last.get("usage") or {}
+            }
+        )
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        accumulator = ToolCallAccumulator()
+        last = None
+        for chunk in self._sync_client().stream_chat(
+            to_dashscope_messages(messages),
+            tools=self._request_tools(kwargs),
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            stop=stop
+        ):
+            last = chunk
+            generation = self._chunk(chunk, accumulator)
+            if generation is not None:
+                if run_manager:
+                    run_manager.on_llm_new_token(generation.text, chunk=generation)
+                yield generation
+        yield self._last_chunk(last, accumulator, kwargs)
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        accumulator = ToolCallAccumulator()
+        last = None
+        async for chunk in self._async_client().stream_chat(
+            to_dashscope_messages(messages),
+            tools=self._request_tools(kwargs),
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            priority=self.priority,
+            stop=stop
+        ):
+            last = chunk
+            generation = self._chunk(chunk, accumulator)
+            if generation is not None:
+                if run_manager:
+                    await run_manager.on_llm_new_token(generation.text, chunk=generation)
+                yield generation
+        yield self._last_chunk(last, accumulator, kwargs)
@@ -23,6 +23,17 @@ API_TITLE = "千问API服务"
 API_DESCRIPTION = "阿里云千问大模型API封装服务"
 API_VERSION = "1.0.0"
 
+# 批量请求配置
+BATCH_DEFAULT_CONCURRENCY = 8  # 默认并发数
+BATCH_MAX_CONCURRENCY = 32  # 并发数上限
+BATCH_MAX_ITEMS = 1000  # 单次批量请求的最大条数
+
+# 会话配置（服务端保存多轮对话历史，客户端每轮只发送新问题）
+SESSION_TTL = 2 * 60 * 60  # 会话空闲过期时间（秒）
+SESSION_MAX_SESSIONS = 10000  # 内存中最多保留的会话数
+SESSION_MAX_BYTES = 64 * 1024 * 1024  # 内存中会话消息的最大占用（64MB）
+SESSION_SQLITE_PATH = os.getenv("SESSION_SQLITE_PATH", "")  # 会话消息日志的SQLite路径，为空时只保存在内存
+
 # CORS配置
 CORS_ORIGINS = ["*"]
 CORS_CREDENTIALS = True
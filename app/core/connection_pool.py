@@ -0,0 +1,190 @@
+"""
+DashScope连接池
+
+进程内共享的httpx连接池，负责keep-alive连接复用、并发上限控制、预热和统计
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional
+
+import httpx
+
+from app.core.llm_config import (
+    DASHSCOPE_BASE_URL,
+    DEFAULT_TIMEOUT,
+    DASHSCOPE_POOL_MAX_CONNECTIONS,
+    DASHSCOPE_POOL_MAX_KEEPALIVE,
+    DASHSCOPE_POOL_KEEPALIVE_EXPIRY,
+    DASHSCOPE_HTTP2,
+    DASHSCOPE_WARMUP_CONNECTIONS,
+    DASHSCOPE_WARMUP_TIMEOUT
+)
+
+# h2为可选依赖，未安装时退回HTTP/1.1
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# 获取logger
+logger = logging.getLogger("gongdi-api.pool")
+
+
+class DashscopePool:
+    """DashScope共享连接池"""
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        max_connections: Optional[int] = None,
+        max_keepalive_connections: Optional[int] = None,
+        keepalive_expiry: Optional[float] = None,
+        timeout: Optional[float] = None,
+        http2: Optional[bool] = None,
+    ):
+        """初始化连接池
+
+        Args:
+            base_url: 接口地址
+            max_connections: 最大并发连接（请求）数
+            max_keepalive_connections: 最大保活空闲连接数
+            keepalive_expiry: 空闲连接保活时间（秒）
+            timeout: 请求超时时间（秒）
+            http2: 是否启用HTTP/2，仅在安装h2时生效
+        """
+        self.base_url = base_url or DASHSCOPE_BASE_URL
+        self.max_connections = max_connections or DASHSCOPE_POOL_MAX_CONNECTIONS
+        self.max_keepalive_connections = max_keepalive_connections or DASHSCOPE_POOL_MAX_KEEPALIVE
+        self.keepalive_expiry = keepalive_expiry or DASHSCOPE_POOL_KEEPALIVE_EXPIRY
+        self.timeout = timeout or DEFAULT_TIMEOUT
+        self.http2 = (DASHSCOPE_HTTP2 if http2 is None else http2) and HTTP2_AVAILABLE
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+        # 统计信息
+        self.active = 0
+        self.waiting = 0
+        self.waits_total = 0
+        self.requests_total = 0
+        self.warmed_up = False
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """获取底层httpx客户端，首次使用时创建"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                http2=self.http2,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                    keepalive_expiry=self.keepalive_expiry
+                )
+            )
+            logger.info(f"创建DashScope连接池: max_connections={self.max_connections}, http2={self.http2}")
+        return self._client
+
+    @asynccontextmanager
+    async def slot(self):
+        """占用一个连接槽位，槽位用尽时排队等待"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_connections)
+
+        if self._semaphore.locked():
+            self.waits_total += 1
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        self.requests_total += 1
+        try:
+            yield self.client
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    async def warmup(self, connections: Optional[int] = None) -> int:
+        """预热连接，提前完成TCP和TLS握手
+
+        Args:
+            connections: 预热连接数
+
+        Returns:
+            成功预热的连接数
+        """
+        count = DASHSCOPE_WARMUP_CONNECTIONS if connections is None else connections
+        if count <= 0:
+            return 0
+
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(self.client.head("/", timeout=httpx.Timeout(DASHSCOPE_WARMUP_TIMEOUT)) for _ in range(count)),
+            return_exceptions=True
+        )
+        warmed = sum(1 for r in results if not isinstance(r, Exception))
+        self.warmed_up = warmed > 0
+
+        elapsed = (time.perf_counter() - start) * 1000
+        if warmed < count:
+            logger.warning(f"连接池预热部分失败: {warmed}/{count}")
+        logger.info(f"连接池预热完成: {warmed}个连接, 耗时{elapsed:.1f}ms")
+        return warmed
+
+    def stats(self) -> Dict[str, Any]:
+        """获取连接池统计信息"""
+        return {
+            "max_connections": self.max_connections,
+            "max_keepalive_connections": self.max_keepalive_connections,
+            "keepalive_expiry": self.keepalive_expiry,
+            "http2": self.http2,
+            "warmed_up": self.warmed_up,
+            "active": self.active,
+            "waiting": self.waiting,
+            "waits_total": self.waits_total,
+            "requests_total": self.requests_total
+        }
+
+    async def aclose(self) -> None:
+        """关闭连接池"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self._semaphore = None
+        self.warmed_up = False
+
+
+# 进程内共享连接池
+_shared_pool: Optional[DashscopePool] = None
+
+
+def get_pool() -> DashscopePool:
+    """获取进程内共享连接池"""
+    global _shared_pool
+    if _shared_pool is None:
+        _shared_pool = DashscopePool()
+    return _shared_pool
+
+
+async def startup_pool(warmup: bool = True) -> DashscopePool:
+    """应用启动时初始化并预热连接池"""
+    pool = get_pool()
+    if warmup:
+        await pool.warmup()
+    return pool
+
+
+async def shutdown_pool() -> None:
+    """应用关闭时释放连接池"""
+    global _shared_pool
+    if _shared_pool is not None:
+        await _shared_pool.aclose()
+        _shared_pool = None
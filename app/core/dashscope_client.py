@@ -6,7 +6,7 @@
 
 import os
 import logging
-from typing import Dict, List, Any, Optional, Union
+from typing import Dict, List, Any, Optional, Union, Iterator
 import json
 
 from dashscope import Generation
@@ -15,9 +15,11 @@ from app.core.llm_config import (
     DASHSCOPE_API_KEY,
     DEFAULT_MODEL,
     DEFAULT_TEMPERATURE,
-    DEFAULT_MAX_TOKENS,
-    DEFAULT_TOOLS
+    DEFAULT_MAX_TOKENS
 )
+from app.core.errors import classify_error
+from app.core.response_cache import ResponseCache, get_response_cache, make_cache_key
+from app.utils.tools import tool_registry
 
 # 获取logger
 logger = logging.getLogger("gongdi-api.dashscope")
@@ -44,6 +46,7 @@ class DashscopeClient:
         model: Optional[str] = None,
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = None,
+        cache: Optional[ResponseCache] = None,
     ):
         """初始化阿里云千问API客户端
 
@@ -52,14 +55,29 @@ class DashscopeClient:
             model: 模型名称
             temperature: 温度参数
             max_tokens: 最大生成token数量
+            cache: 响应缓存，默认使用进程内共享缓存
         """
         self.api_key = api_key or DASHSCOPE_API_KEY
         self.model = model or DEFAULT_MODEL
         self.temperature = temperature if temperature is not None else DEFAULT_TEMPERATURE
         self.max_tokens = max_tokens or DEFAULT_MAX_TOKENS
+        self.cache = cache or get_response_cache()
         
         # 记录初始化信息
         logger.debug(f"DashscopeClient初始化: model={self.model}, temperature={self.temperature}, max_tokens={self.max_tokens}")
+    
+    def _cache_key(self, params: Dict[str, Any], use_cache: bool) -> Optional[str]:
+        """计算缓存键，只有temperature为0的确定性请求才可缓存"""
+        if not use_cache or self.cache is None or params['temperature'] != 0:
+            return None
+        return make_cache_key(
+            params['model'],
+            params['messages'],
+            params.get('tools'),
+            params['temperature'],
+            params['max_tokens'],
+            params.get('stop')
+        )
         
     def chat(
         self,
@@ -67,6 +85,8 @@ class DashscopeClient:
         tools: Optional[List[Dict]] = None,
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = None,
+        use_cache: bool = True,
+        stop: Optional[List[str]] = None,
     ) -> Dict:
         """发送聊天请求
 
@@ -75,6 +95,8 @@ class DashscopeClient:
             tools: 工具列表
             temperature: 温度参数
             max_tokens: 最大生成token数量
+            use_cache: 是否使用响应缓存
+            stop: 停止序列，生成到其中任一序列时停止
 
         Returns:
             API响应结果
@@ -92,6 +114,17 @@ class DashscopeClient:
         if tools:
             params['tools'] = tools
         
+        if stop:
+            params['stop'] = list(stop)
+        
+        # 先查缓存
+        cache_key = self._cache_key(params, use_cache)
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.debug(f"响应缓存命中: key={cache_key[:16]}")
+                return cached
+        
         # 调用千问API
         response = Generation.call(**params)
         
@@ -102,7 +135,7 @@ class DashscopeClient:
                 'message' in response.output['choices'][0] and 
                 'tool_calls' in response.output['choices'][0]['message']):
                 # 返回包含工具调用的完整响应
-                return to_dict({
+                result = to_dict({
                     'status_code': response.status_code,
                     'request_id': response.request_id,
                     'choices': [{
@@ -112,7 +145,7 @@ class DashscopeClient:
                 })
             else:
                 # 返回普通响应
-                return to_dict({
+                result = to_dict({
                     'status_code': response.status_code,
                     'request_id': response.request_id,
                     'choices': [{
@@ -124,7 +157,63 @@ class DashscopeClient:
                     'usage': response.output.get('usage', {})
                 })
         else:
-            raise Exception(f"API调用失败: {response.code} - {response.message}")
+            raise classify_error(response.status_code, response.code, response.message, response.request_id)
+        
+        if cache_key is not None:
+            self.cache.set(cache_key, result)
+        return result
+    
+    def stream_chat(
+        self,
+        messages: List[Dict[str, str]],
+        tools: Optional[List[Dict]] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        stop: Optional[List[str]] = None,
+    ) -> Iterator[Dict]:
+        """发送流式聊天请求（增量输出）
+
+        Args:
+            messages: 聊天消息列表
+            tools: 工具列表
+            temperature: 温度参数
+            max_tokens: 最大生成token数量
+            stop: 停止序列，生成到其中任一序列时停止
+
+        Yields:
+            增量片段，最后一个片段带有finish_reason和usage
+        """
+        params = {
+            'model': self.model,
+            'messages': messages,
+            'temperature': temperature if temperature is not None else self.temperature,
+            'max_tokens': max_tokens or self.max_tokens,
+            'result_format': 'message',
+            'stream': True,
+            'incremental_output': True,
+            'api_key': self.api_key
+        }
+        
+        if tools:
+            params['tools'] = tools
+        
+        if stop:
+            params['stop'] = list(stop)
+        
+        for response in Generation.call(**params):
+            if response.status_code != 200:
+                raise classify_error(response.status_code, response.code, response.message, response.request_id)
+            
+            choice = response.output['choices'][0]
+            message = to_dict(choice['message'])
+            finish_reason = choice.get('finish_reason')
+            yield {
+                'request_id': response.request_id,
+                'content': message.get('content') or '',
+                'message': message,
+                'finish_reason': None if finish_reason in (None, 'null') else finish_reason,
+                'usage': to_dict(response.usage) or {}
+            }
     
     def function_call(
         self,
@@ -132,6 +221,7 @@ class DashscopeClient:
         tools: Optional[List[Dict]] = None,
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = None,
+        use_cache: bool = True,
     ) -> Dict:
         """发送工具调用请求
 
@@ -140,73 +230,15 @@ class DashscopeClient:
             tools: 工具列表，如果为None则使用默认工具
             temperature: 温度参数
             max_tokens: 最大生成token数量
+            use_cache: 是否使用响应缓存
 
         Returns:
             工具调用结果
         """
         logger.debug(f"接收function_call请求: messages={messages}")
         
-        # 确保工具格式正确
-        tools_to_use = tools or DEFAULT_TOOLS
-        logger.debug(f"原始工具列表: {tools_to_use}")
-        
-        formatted_tools = []
-        
-        for i, tool in enumerate(tools_to_use):
-            # 处理空对象或None
-            if not tool:
-                formatted_tool = {
-                    'type': 'function',
-                    'function': {
-                        'name': f'default_tool_{i}',
-                        'description': '默认工具'
-                    }
-                }
-                logger.debug(f"替换空工具为默认工具: {formatted_tool}")
-                formatted_tools.append(formatted_tool)
-                continue
-                
-            if isinstance(tool, dict):
-                if 'type' not in tool:
-                    formatted_tool = {'type': 'function'}
-                    logger.debug(f"添加默认type字段: function")
-                else:
-                    formatted_tool = {'type': tool['type']}
-                
-                if 'function' in tool:
-                    formatted_tool['function'] = tool['function']
-                    # 确保function对象有name属性
-                    if 'name' not in formatted_tool['function']:
-                        # 如果没有name，尝试找到一个可能的name
-                        if isinstance(formatted_tool['function'], dict) and formatted_tool['function'].get('description'):
-                            # 从描述中提取一个简短的名称
-                            desc = formatted_tool['function']['description']
-                            suggested_name = desc.split()[0].lower() if desc else "unknown_tool"
-                            formatted_tool['function']['name'] = suggested_name
-                            logger.debug(f"从描述中提取工具名称: {suggested_name}")
-                        else:
-                            # 使用默认名称
-                            formatted_tool['function']['name'] = f"tool_{i}"
-                            logger.debug(f"使用默认工具名称: tool_{i}")
-                elif not any(k == 'function' for k in tool.keys()):
-                    # 假设整个工具是function定义
-                    func_def = {k: v for k, v in tool.items() if k != 'type'}
-                    # 确保function对象有name属性
-                    if 'name' not in func_def:
-                        if 'description' in func_def:
-                            # 从描述中提取一个简短的名称
-                            desc = func_def['description']
-                            suggested_name = desc.split()[0].lower() if desc else "unknown_tool"
-                            func_def['name'] = suggested_name
-                            logger.debug(f"从描述中提取工具名称: {suggested_name}")
-                        else:
-                            # 使用默认名称
-                            func_def['name'] = f"tool_{i}"
-                            logger.debug(f"使用默认工具名称: tool_{i}")
-                    formatted_tool['function'] = func_def
-                
-                formatted_tools.append(formatted_tool)
-        
+        # 确保工具格式正确（按内容缓存规范化结果）
+        formatted_tools = tool_registry.normalize(tools)
         logger.debug(f"格式化后的工具列表: {formatted_tools}")
         
         try:
@@ -222,6 +254,14 @@ class DashscopeClient:
             
             logger.debug(f"调用DashScope API参数: model={params['model']}, temperature={params['temperature']}, max_tokens={params['max_tokens']}")
             
+            # 先查缓存
+            cache_key = self._cache_key(params, use_cache)
+            if cache_key is not None:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    logger.debug(f"响应缓存命中: key={cache_key[:16]}")
+                    return cached
+            
             # 调用千问API
             logger.debug("开始调用DashScope API...")
             response = Generation.call(**params)
@@ -238,11 +278,14 @@ class DashscopeClient:
                     'usage': response.output.get('usage', {})
                 }
                 logger.debug(f"成功处理响应: request_id={result['request_id']}")
-                return to_dict(result)
+                result = to_dict(result)
+                if cache_key is not None:
+                    self.cache.set(cache_key, result)
+                return result
             else:
-                error_msg = f"API调用失败: {response.code} - {response.message}"
-                logger.error(error_msg)
-                raise Exception(error_msg)
+                error = classify_error(response.status_code, response.code, response.message, response.request_id)
+                logger.error(str(error))
+                raise error
         except Exception as e:
             # 记录详细错误信息
             logger.error(f"DashscopeClient.function_call错误: {str(e)}")
@@ -257,6 +300,7 @@ class DashscopeClient:
         tool_results: List[Dict[str, Any]],
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = None,
+        use_cache: bool = True,
     ) -> Dict:
         """处理工具调用结果，并发送给模型处理
         
@@ -265,6 +309,7 @@ class DashscopeClient:
             tool_results: 工具调用结果
             temperature: 温度参数
             max_tokens: 最大生成token数量
+            use_cache: 是否使用响应缓存
             
         Returns:
             模型处理结果
@@ -279,7 +324,8 @@ class DashscopeClient:
         return self.chat(
             messages=full_messages,
             temperature=temperature,
-            max_tokens=max_tokens
+            max_tokens=max_tokens,
+            use_cache=use_cache
         )
         
     @staticmethod
@@ -0,0 +1,128 @@
+"""
+DashScope调用异常类型
+
+按上游返回的状态码和错误码分类，标记是否可重试、是否计入熔断统计以及对外返回的HTTP状态码
+"""
+
+from typing import Optional
+
+
+class DashscopeError(Exception):
+    """DashScope调用异常基类"""
+
+    retryable = False  # 是否可以重试
+    breaker_failure = False  # 是否计入熔断器失败统计
+    http_status = 502  # 对外返回的HTTP状态码
+
+    def __init__(
+        self,
+        message: str,
+        status_code: Optional[int] = None,
+        code: Optional[str] = None,
+        request_id: Optional[str] = None,
+        retry_after: Optional[float] = None,
+    ):
+        """初始化异常
+
+        Args:
+            message: 错误信息
+            status_code: 上游HTTP状态码
+            code: 上游错误码
+            request_id: 上游请求ID
+            retry_after: 上游建议的重试等待时间（秒）
+        """
+        super().__init__(message)
+        self.status_code = status_code
+        self.code = code
+        self.request_id = request_id
+        self.retry_after = retry_after
+
+
+class DashscopeBadRequestError(DashscopeError):
+    """请求参数错误或内容审核未通过"""
+    http_status = 400
+
+
+class DashscopeAuthError(DashscopeError):
+    """API密钥无效或无权限"""
+    http_status = 502
+
+
+class DashscopeRateLimitError(DashscopeError):
+    """触发上游限流"""
+    retryable = True
+    http_status = 429
+
+
+class DashscopeServerError(DashscopeError):
+    """上游服务内部错误"""
+    retryable = True
+    breaker_failure = True
+    http_status = 502
+
+
+class DashscopeTimeoutError(DashscopeError):
+    """上游请求超时"""
+    retryable = True
+    breaker_failure = True
+    http_status = 504
+
+
+class DashscopeConnectionError(DashscopeError):
+    """网络连接失败"""
+    retryable = True
+    breaker_failure = True
+    http_status = 502
+
+
+class CircuitOpenError(DashscopeError):
+    """熔断器打开，快速失败"""
+    http_status = 503
+
+
+def classify_error(
+    status_code: Optional[int],
+    code: Optional[str] = None,
+    message: Optional[str] = None,
+    request_id: Optional[str] = None,
+    retry_after: Optional[float] = None,
+) -> DashscopeError:
+    """根据上游响应构造对应类型的异常
+
+    Args:
+        status_code: 上游HTTP状态码
+        code: 上游错误码
+        message: 上游错误信息
+        request_id: 上游请求ID
+        retry_after: 上游建议的重试等待时间（秒）
+
+    Returns:
+        分类后的异常
+    """
+    code_str = str(code or "")
+    if status_code == 429 or code_str.startswith("Throttling"):
+        error_class = DashscopeRateLimitError
+    elif status_code in (401, 403) or code_str in ("InvalidApiKey", "AccessDenied"):
+        error_class = DashscopeAuthError
+    elif status_code is not None and 400 <= status_code < 500:
+        error_class = DashscopeBadRequestError
+    else:
+        error_class = DashscopeServerError
+
+    return error_class(
+        f"API调用失败: {code} - {message}",
+        status_code=status_code,
+        code=code_str or None,
+        request_id=request_id,
+        retry_after=retry_after
+    )
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析Retry-After响应头（仅支持秒数格式）"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
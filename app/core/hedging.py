@@ -0,0 +1,140 @@
+"""
+对冲请求（hedged requests）
+
+上游少量慢响应决定了接口的尾延迟。请求发出后若在最近首字节耗时的高分位数
+时间内仍未收到响应头，再发起一次相同的请求，取先返回者并取消另一个。
+对冲请求数量受预算比例限制，避免上游整体变慢时请求量翻倍。
+"""
+
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from app.core.llm_config import (
+    HEDGE_ENABLED,
+    HEDGE_PERCENTILE,
+    HEDGE_MIN_DELAY,
+    HEDGE_MAX_DELAY,
+    HEDGE_BUDGET_RATIO,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_WINDOW
+)
+
+# 获取logger
+logger = logging.getLogger("gongdi-api.hedging")
+
+
+class LatencyTracker:
+    """记录最近的首字节耗时"""
+
+    def __init__(self, window: int = HEDGE_WINDOW):
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def observe(self, seconds: float) -> None:
+        """记录一次耗时"""
+        self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """获取分位数，没有样本时返回None"""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(p * len(ordered)))
+        return ordered[index]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+class HedgePolicy:
+    """对冲策略"""
+
+    def __init__(
+        self,
+        percentile: float = HEDGE_PERCENTILE,
+        min_delay: float = HEDGE_MIN_DELAY,
+        max_delay: float = HEDGE_MAX_DELAY,
+        budget_ratio: float = HEDGE_BUDGET_RATIO,
+        min_samples: int = HEDGE_MIN_SAMPLES,
+        window: int = HEDGE_WINDOW,
+    ):
+        """初始化对冲策略
+
+        Args:
+            percentile: 对冲等待时间取首字节耗时的分位数
+            min_delay: 对冲等待时间下限（秒）
+            max_delay: 对冲等待时间上限（秒）
+            budget_ratio: 对冲请求占总请求数的最大比例
+            min_samples: 最少样本数，不足时不对冲
+            window: 参与统计的最近样本数
+        """
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.budget_ratio = budget_ratio
+        self.min_samples = min_samples
+        self.latency = LatencyTracker(window)
+
+        # 统计信息
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.budget_denied = 0
+
+    def delay(self) -> Optional[float]:
+        """获取对冲等待时间，样本不足时返回None表示不对冲"""
+        if len(self.latency) < self.min_samples:
+            return None
+        value = self.latency.percentile(self.percentile)
+        return min(self.max_delay, max(self.min_delay, value))
+
+    def observe(self, seconds: float) -> None:
+        """记录一次首字节耗时"""
+        self.latency.observe(seconds)
+
+    def record_request(self) -> None:
+        """记录一次可对冲的请求"""
+        self.requests += 1
+
+    def try_hedge(self) -> bool:
+        """申请发起一次对冲请求，超出预算时返回False"""
+        if self.hedges + 1 > self.requests * self.budget_ratio:
+            self.budget_denied += 1
+            return False
+        self.hedges += 1
+        return True
+
+    def record_win(self, hedge_won: bool) -> None:
+        """记录已对冲的请求中由哪一方胜出"""
+        if hedge_won:
+            self.hedge_wins += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """获取对冲统计"""
+        delay = self.delay()
+        return {
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "hedge_rate": round(self.hedges / self.requests, 4) if self.requests else 0.0,
+            "hedge_wins": self.hedge_wins,
+            "hedge_win_rate": round(self.hedge_wins / self.hedges, 4) if self.hedges else 0.0,
+            "budget_ratio": self.budget_ratio,
+            "budget_denied": self.budget_denied,
+            "samples": len(self.latency),
+            "percentile": self.percentile,
+            "current_delay_ms": round(delay * 1000, 1) if delay is not None else None
+        }
+
+
+# 进程内共享对冲策略
+_shared_policy: Optional[HedgePolicy] = None
+
+
+def get_hedge_policy() -> Optional[HedgePolicy]:
+    """获取进程内共享的对冲策略，未启用时返回None"""
+    global _shared_policy
+    if not HEDGE_ENABLED:
+        return None
+    if _shared_policy is None:
+        _shared_policy = HedgePolicy()
+    return _shared_policy
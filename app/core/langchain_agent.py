@@ -4,8 +4,10 @@ LangChain函数调用封装类
 用于处理函数调用的LangChain代理封装
 """
 
-from typing import Dict, List, Any, Callable, Optional, Type, Union
+from typing import AsyncIterator, Dict, List, Any, Callable, Optional, Type, Union
+import asyncio
 import inspect
+import time
 from functools import wraps
 
 from langchain.agents import AgentExecutor
@@ -17,6 +19,38 @@ from langchain_core.messages import FunctionMessage, AIMessage, HumanMessage
 from langchain_core.runnables import RunnablePassthrough
 from langchain_core.tools import BaseTool
 
+from app.core.llm_config import AGENT_MAX_STEPS, AGENT_MAX_SECONDS, AGENT_VERBOSE
+from app.utils.tool_registry import CompiledTool, ToolRegistry
+from app.utils.tools import tool_registry
+
+# 运行结束原因
+STOP_FINISHED = "stop"  # 模型给出了最终回答
+STOP_MAX_STEPS = "max_steps"  # 达到步骤上限
+STOP_MAX_SECONDS = "max_seconds"  # 达到时间上限
+
+# 运行超时被取消时的回答
+TIMEOUT_OUTPUT = "运行超时，已停止"
+
+
+async def iterate_until(iterator: AsyncIterator[Any], deadline: Optional[float]) -> AsyncIterator[Any]:
+    """在截止时间（time.monotonic）前逐个产出元素，超时时取消正在进行的调用
+
+    Raises:
+        asyncio.TimeoutError: 到达截止时间
+    """
+    try:
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise asyncio.TimeoutError()
+            try:
+                item = await asyncio.wait_for(iterator.__anext__(), remaining)
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        await iterator.aclose()
+
 
 class LangChainFunctionAgent:
     """LangChain函数调用封装类
@@ -24,16 +58,30 @@ class LangChainFunctionAgent:
     封装LangChain的函数调用逻辑，使其更易于使用
     """
     
-    def __init__(self, llm: Any, system_message: str = "你是一个建筑工地智能助手"):
+    def __init__(self, llm: Any, system_message: str = "你是一个建筑工地智能助手",
+                 registry: Optional[ToolRegistry] = None,
+                 max_steps: int = AGENT_MAX_STEPS,
+                 max_seconds: Optional[float] = AGENT_MAX_SECONDS,
+                 verbose: bool = AGENT_VERBOSE):
         """初始化LangChain函数调用代理
 
         Args:
             llm: 语言模型实例（需要支持OpenAI函数调用格式的模型，如Qwen3）
             system_message: 系统消息
+            registry: 工具注册表，默认使用共享注册表（与TOOL_HANDLERS、DEFAULT_TOOLS相同）
+            max_steps: 默认的步骤（模型调用）上限
+            max_seconds: 默认的单次运行时间上限（秒），为None时不限制
+            verbose: 是否向标准输出打印执行过程
         """
         self.llm = llm
         self.system_message = system_message
+        self.registry = registry or tool_registry
+        self.max_steps = max_steps
+        self.max_seconds = max_seconds
+        self.verbose = verbose
         self.tools: List[BaseTool] = []
+        # add_function添加的工具使用注册表编译好的schema，不再由LangChain重新推导
+        self.function_schemas: Dict[str, Dict[str, Any]] = {}
         self.prompt = None
         self.agent = None
         self.agent_executor = None
@@ -52,24 +100,57 @@ class LangChainFunctionAgent:
                     description: Optional[str] = None) -> None:
         """将Python函数添加为工具
 
+        函数注册到工具注册表，schema和参数校验器只编译一次
+
         Args:
             func: Python函数
             name: 函数名称（如果为None则使用函数本身的名称）
             description: 函数描述（如果为None则使用函数的文档字符串）
         """
+        compiled = self.registry.add(func, name, description)
+        self.add_compiled(compiled)
+    
+    def add_compiled(self, compiled: CompiledTool) -> None:
+        """将注册表中已编译的工具添加为LangChain工具，直接使用编译好的schema和参数校验器
+
+        Args:
+            compiled: 编译后的工具
+        """
         from langchain.tools import StructuredTool
         
-        func_name = name or func.__name__
-        func_description = description or func.__doc__ or f"{func_name}函数"
-        
-        tool = StructuredTool.from_function(
-            func=func,
-            name=func_name,
-            description=func_description
-        )
+        wrapped = compiled.validating()
+        if inspect.iscoroutinefunction(compiled.func):
+            tool = StructuredTool.from_function(
+                coroutine=wrapped,
+                name=compiled.name,
+                description=compiled.description
+            )
+        else:
+            tool = StructuredTool.from_function(
+                func=wrapped,
+                name=compiled.name,
+                description=compiled.description
+            )
         
+        self.function_schemas[compiled.name] = compiled.schema["function"]
         self.add_tool(tool)
     
+    @classmethod
+    def from_registry(cls, llm: Any, system_message: str = "你是一个建筑工地智能助手",
+                      registry: Optional[ToolRegistry] = None, **kwargs: Any) -> "LangChainFunctionAgent":
+        """创建代理并添加注册表中的全部工具
+
+        Args:
+            llm: 语言模型实例
+            system_message: 系统消息
+            registry: 工具注册表，默认使用共享注册表
+            **kwargs: 传给构造函数的其他参数（max_steps、max_seconds）
+        """
+        agent = cls(llm, system_message, registry, **kwargs)
+        for compiled in agent.registry:
+            agent.add_compiled(compiled)
+        return agent
+    
     def register(self, name: Optional[str] = None, description: Optional[str] = None):
         """装饰器：注册函数作为工具
 
@@ -100,7 +181,9 @@ class LangChainFunctionAgent:
         ])
         
         # 创建LangChain代理
-        llm_with_tools = self.llm.bind_functions(self.tools)
+        llm_with_tools = self.llm.bind_functions([
+            self.function_schemas.get(tool.name, tool) for tool in self.tools
+        ])
         
         # 构建代理执行链
         self.agent = (
@@ -114,51 +197,203 @@ class LangChainFunctionAgent:
             | OpenAIFunctionsAgentOutputParser()
         )
         
-        self.agent_executor = AgentExecutor(
+        self.agent_executor = self._make_executor(self.max_steps, self.max_seconds)
+    
+    def _make_executor(self, max_steps: int, max_seconds: Optional[float]) -> AgentExecutor:
+        return AgentExecutor(
             agent=self.agent, 
             tools=self.tools,
-            verbose=True,
+            verbose=self.verbose,
             handle_parsing_errors=True,
-            max_iterations=10,
+            max_iterations=max_steps,
+            max_execution_time=max_seconds,
             return_intermediate_steps=True,
         )
     
-    def run(self, query: str, chat_history: Optional[List] = None) -> Dict[str, Any]:
+    def _executor(self, max_steps: Optional[int] = None, max_seconds: Optional[float] = None) -> AgentExecutor:
+        """获取执行器，指定了本次运行的上限时使用带该上限的新执行器（代理和工具共用）
+
+        执行器在步骤之间检查时间上限，arun/astream另外在到达上限时取消正在进行的调用
+        """
+        if not self.agent_executor:
+            self.build()
+        
+        if max_steps is None and max_seconds is None:
+            return self.agent_executor
+        return self._make_executor(
+            max_steps if max_steps is not None else self.max_steps,
+            max_seconds if max_seconds is not None else self.max_seconds
+        )
+    
+    @staticmethod
+    def stop_reason(executor: AgentExecutor, steps: int, elapsed: float) -> str:
+        """判断运行结束原因（达到上限时最后一次工具调用之后不再调用模型）"""
+        if executor.max_iterations is not None and steps >= executor.max_iterations:
+            return STOP_MAX_STEPS
+        if executor.max_execution_time is not None and elapsed >= executor.max_execution_time:
+            return STOP_MAX_SECONDS
+        return STOP_FINISHED
+    
+    def run(self, query: str, chat_history: Optional[List] = None,
+            max_steps: Optional[int] = None, max_seconds: Optional[float] = None) -> Dict[str, Any]:
         """运行代理处理查询
 
         Args:
             query: 用户查询
             chat_history: 聊天历史记录
+            max_steps: 本次运行的步骤上限，默认使用初始化时的配置
+            max_seconds: 本次运行的时间上限（秒），默认使用初始化时的配置
 
         Returns:
             Dict[str, Any]: 包含输出和中间步骤的结果字典
         """
-        if not self.agent_executor:
-            self.build()
-            
         history = chat_history or []
         
-        return self.agent_executor.invoke({
+        return self._executor(max_steps, max_seconds).invoke({
             "input": query,
             "chat_history": history
         })
     
-    def stream(self, query: str, chat_history: Optional[List] = None):
+    @staticmethod
+    def _deadline(executor: AgentExecutor, started: float) -> Optional[float]:
+        if executor.max_execution_time is None:
+            return None
+        return started + executor.max_execution_time
+    
+    async def arun(self, query: str, chat_history: Optional[List] = None,
+                   max_steps: Optional[int] = None, max_seconds: Optional[float] = None) -> Dict[str, Any]:
+        """异步运行代理处理查询，模型调用和工具执行不阻塞事件循环
+
+        参数和返回值与run相同，返回值另外包含stop_reason（stop、max_steps或max_seconds）。
+        到达时间上限时取消正在进行的模型或工具调用，返回已完成的中间步骤。
+        """
+        executor = self._executor(max_steps, max_seconds)
+        history = chat_history or []
+        started = time.monotonic()
+        intermediate_steps = []
+        output = None
+        
+        try:
+            async for chunk in iterate_until(executor.astream({
+                "input": query,
+                "chat_history": history
+            }), self._deadline(executor, started)):
+                intermediate_steps.extend((step.action, step.observation) for step in chunk.get("steps", []))
+                if "output" in chunk:
+                    output = chunk["output"]
+            stop_reason = self.stop_reason(executor, len(intermediate_steps), time.monotonic() - started)
+        except asyncio.TimeoutError:
+            output = TIMEOUT_OUTPUT
+            stop_reason = STOP_MAX_SECONDS
+        
+        return {
+            "input": query,
+            "chat_history": history,
+            "output": output,
+            "intermediate_steps": intermediate_steps,
+            "stop_reason": stop_reason
+        }
+    
+    def stream(self, query: str, chat_history: Optional[List] = None,
+               max_steps: Optional[int] = None, max_seconds: Optional[float] = None):
         """流式运行代理处理查询
 
         Args:
             query: 用户查询
             chat_history: 聊天历史记录
+            max_steps: 本次运行的步骤上限，默认使用初始化时的配置
+            max_seconds: 本次运行的时间上限（秒），默认使用初始化时的配置
 
         Returns:
             迭代器，产生流式响应
         """
-        if not self.agent_executor:
-            self.build()
-            
         history = chat_history or []
         
-        return self.agent_executor.stream({
+        return self._executor(max_steps, max_seconds).stream({
             "input": query, 
             "chat_history": history
-        }) 
\ No newline at end of file
+        })
+    
+    async def astream(self, query: str, chat_history: Optional[List] = None,
+                      max_steps: Optional[int] = None,
+                      max_seconds: Optional[float] = None) -> AsyncIterator[Dict[str, Any]]:
+        """异步流式运行代理，中间步骤和最终回答的文本随发生随返回
+
+        参数与run相同，产生的事件：
+            {"event": "tool_call", "step", "name", "arguments"}: 模型选定工具
+            {"event": "tool_result", "step", "name", "result"}: 工具执行完成
+            {"event": "delta", "content"}: 模型输出的增量文本
+            {"event": "done", "output", "steps", "stop_reason", "elapsed_ms"}: 运行结束
+
+        到达时间上限时取消正在进行的调用，done事件的stop_reason为max_seconds
+        """
+        executor = self._executor(max_steps, max_seconds)
+        history = chat_history or []
+        started = time.monotonic()
+        root_id = None
+        steps = 0
+        
+        try:
+            async for event in iterate_until(executor.astream_events({
+                "input": query,
+                "chat_history": history
+            }, version="v1"), self._deadline(executor, started)):
+                if root_id is None:
+                    root_id = event["run_id"]
+                kind = event["event"]
+                if kind == "on_chat_model_stream":
+                    content = event["data"]["chunk"].content
+                    if content:
+                        yield {"event": "delta", "content": content}
+                elif kind == "on_chain_stream" and event["run_id"] == root_id:
+                    chunk = event["data"]["chunk"]
+                    for offset, action in enumerate(chunk.get("actions", []), 1):
+                        yield {
+                            "event": "tool_call",
+                            "step": steps + offset,
+                            "name": action.tool,
+                            "arguments": action.tool_input
+                        }
+                    for step in chunk.get("steps", []):
+                        steps += 1
+                        yield {
+                            "event": "tool_result",
+                            "step": steps,
+                            "name": step.action.tool,
+                            "result": step.observation
+                        }
+                    if "output" in chunk:
+                        elapsed = time.monotonic() - started
+                        yield {
+                            "event": "done",
+                            "output": chunk["output"],
+                            "steps": steps,
+                            "stop_reason": self.stop_reason(executor, steps, elapsed),
+                            "elapsed_ms": round(elapsed * 1000, 1)
+                        }
+        except asyncio.TimeoutError:
+            yield {
+                "event": "done",
+                "output": TIMEOUT_OUTPUT,
+                "steps": steps,
+                "stop_reason": STOP_MAX_SECONDS,
+                "elapsed_ms": round((time.monotonic() - started) * 1000, 1)
+            }
+
+# 进程内共享的代理，可以在应用启动时通过set_shared_agent替换
+_shared_agent: Optional[LangChainFunctionAgent] = None
+
+
+def set_shared_agent(agent: Optional[LangChainFunctionAgent]) -> None:
+    """设置/api/agent路由使用的共享代理，为None时恢复默认代理"""
+    global _shared_agent
+    _shared_agent = agent
+
+
+def get_shared_agent() -> LangChainFunctionAgent:
+    """获取进程内共享的代理，默认使用ChatQwen（共享客户端）和共享注册表中的全部工具"""
+    global _shared_agent
+    if _shared_agent is None:
+        from app.core.chat_qwen import ChatQwen
+        _shared_agent = LangChainFunctionAgent.from_registry(ChatQwen(temperature=0))
+    return _shared_agent
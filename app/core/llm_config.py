@@ -8,6 +8,7 @@ import os
 
 # 大模型配置
 DASHSCOPE_API_KEY = os.environ.get("DASHSCOPE_API_KEY", "")  # 阿里云DashScope API密钥
+DASHSCOPE_BASE_URL = os.environ.get("DASHSCOPE_BASE_URL", "https://dashscope.aliyuncs.com/api/v1")  # DashScope HTTP接口地址
 
 # 默认使用的模型
 DEFAULT_MODEL = "qwen-turbo"  # 可选模型请参考：https://help.aliyun.com/zh/model-studio/getting-started/models
@@ -15,33 +16,109 @@ DEFAULT_MODEL = "qwen-turbo"  # 可选模型请参考：https://help.aliyun.com/
 # 默认参数
 DEFAULT_TEMPERATURE = 0  # 温度参数，控制输出的随机性
 DEFAULT_MAX_TOKENS = 2048  # 最大生成token数量
+DEFAULT_TIMEOUT = 60  # 单次请求超时时间（秒）
 
-# 工具配置
-DEFAULT_TOOLS = [
-    # 示例工具配置
-    {
-        "type": "function",
-        "function": {
-            "name": "get_current_time",
-            "description": "当你想知道现在的时间时非常有用。",
-            "parameters": {}  # 因为获取当前时间无需输入参数，因此parameters为空字典
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "get_current_weather",
-            "description": "当你想查询指定城市的天气时非常有用。",
-            "parameters": {  
-                "type": "object",
-                "properties": {
-                    "location": {
-                        "type": "string",
-                        "description": "城市或县区，比如北京市、杭州市、余杭区等。"
-                    }
-                },
-                "required": ["location"]
-            }
-        }
-    }
-] 
\ No newline at end of file
+# 连接池配置
+DASHSCOPE_POOL_MAX_CONNECTIONS = int(os.environ.get("DASHSCOPE_POOL_MAX_CONNECTIONS", "100"))  # 最大并发连接数
+DASHSCOPE_POOL_MAX_KEEPALIVE = int(os.environ.get("DASHSCOPE_POOL_MAX_KEEPALIVE", "20"))  # 最大保活空闲连接数
+DASHSCOPE_POOL_KEEPALIVE_EXPIRY = 30  # 空闲连接保活时间（秒）
+DASHSCOPE_HTTP2 = True  # 安装h2时启用HTTP/2
+DASHSCOPE_WARMUP_CONNECTIONS = 2  # 启动时预热的连接数
+DASHSCOPE_WARMUP_TIMEOUT = 3  # 预热请求的超时时间（秒），上游不可达时不拖慢服务启动
+
+# 响应缓存配置（仅缓存temperature为0的确定性请求）
+RESPONSE_CACHE_ENABLED = True  # 是否启用响应缓存
+RESPONSE_CACHE_TTL = 300  # 缓存过期时间（秒）
+RESPONSE_CACHE_MAX_ENTRIES = 1024  # 内存缓存最大条数
+RESPONSE_CACHE_MAX_BYTES = 32 * 1024 * 1024  # 内存缓存最大占用（32MB）
+RESPONSE_CACHE_SQLITE_PATH = os.environ.get("RESPONSE_CACHE_SQLITE_PATH", "")  # 磁盘缓存路径，为空时不启用
+RESPONSE_CACHE_STALE_TTL = 3600  # 过期后仍保留的时间（秒），熔断期间可用于兜底回答
+
+# 请求合并配置
+SINGLEFLIGHT_ENABLED = True  # 并发的相同确定性请求只调用一次上游
+
+# 上游限流配置（按账号配额设置）
+RATE_LIMIT_ENABLED = True  # 是否启用上游调度
+RATE_LIMIT_QPS = float(os.environ.get("DASHSCOPE_RATE_LIMIT_QPS", "10"))  # 每秒请求数上限
+RATE_LIMIT_TPM = float(os.environ.get("DASHSCOPE_RATE_LIMIT_TPM", "300000"))  # 每分钟token数上限
+RATE_LIMIT_MAX_QUEUE_WAIT = 30  # 最长排队时间（秒）
+
+# 重试配置
+RETRY_MAX_ATTEMPTS = 3  # 最大尝试次数（含首次）
+RETRY_BASE_DELAY = 0.5  # 指数退避基准时间（秒）
+RETRY_MAX_DELAY = 8  # 单次退避上限（秒）
+RETRY_MAX_RETRY_AFTER = 30  # 上游Retry-After超过该值时不再重试（秒）
+
+# 熔断配置
+BREAKER_ENABLED = True  # 是否启用熔断器
+BREAKER_ERROR_RATE = 0.5  # 窗口内错误率达到该值时打开熔断
+BREAKER_MIN_REQUESTS = 10  # 窗口内最少请求数
+BREAKER_WINDOW = 30  # 统计窗口（秒）
+BREAKER_OPEN_SECONDS = 30  # 熔断打开后的冷却时间（秒）
+
+# 对冲请求配置（首字节迟迟未到时发起一次重复请求，取先返回者）
+HEDGE_ENABLED = os.environ.get("DASHSCOPE_HEDGE_ENABLED", "false").lower() == "true"  # 是否启用对冲请求
+HEDGE_PERCENTILE = 0.95  # 按首字节耗时的该分位数确定对冲等待时间
+HEDGE_MIN_DELAY = 0.5  # 对冲等待时间下限（秒）
+HEDGE_MAX_DELAY = 10  # 对冲等待时间上限（秒）
+HEDGE_BUDGET_RATIO = 0.05  # 对冲请求最多占总请求数的比例
+HEDGE_MIN_SAMPLES = 20  # 样本数不足时不对冲
+HEDGE_WINDOW = 500  # 参与分位数计算的最近样本数
+
+# 工具执行配置
+TOOL_DEFAULT_TIMEOUT = 10  # 单个工具默认超时时间（秒）
+TOOL_TIMEOUTS = {}  # 按工具名单独设置的超时时间（秒），如 {"get_current_weather": 5}
+TOOL_EXECUTOR_MAX_WORKERS = 16  # 执行同步工具函数的线程数
+TOOL_CACHE_ENABLED = True  # 是否启用工具结果缓存（按工具声明的缓存策略）
+TOOL_CACHE_MAX_ENTRIES = 256  # 每个工具默认最多缓存的结果数
+
+# 多步工具调用配置（模型->工具->模型循环）
+FUNCTION_CALL_MAX_STEPS = 5  # 最多调用模型的次数（含最终回答）
+FUNCTION_CALL_MAX_SECONDS = 60  # 整个流程的时间预算（秒），超出后要求模型直接回答
+FUNCTION_CALL_TOKEN_BUDGET = 20000  # 整个流程的token预算，超出后要求模型直接回答
+
+# 工具预选配置（工具较多时只把与问题相关的工具发给模型）
+TOOL_SELECTION_ENABLED = os.environ.get("DASHSCOPE_TOOL_SELECTION_ENABLED", "true").lower() == "true"  # 是否启用工具预选
+TOOL_SELECTION_TOP_K = 5  # 最多发送的工具数，工具总数不超过该值时全部发送
+TOOL_SELECTION_MIN_SCORE = 1.0  # 最高相关度低于该值时退回全部工具
+TOOL_SELECTION_ALWAYS_INCLUDE = []  # 总是发送的工具名称
+
+# 意图快速通道配置（高频问题按规则直接调用工具并用模板回答，不调用模型）
+INTENT_FAST_PATH_ENABLED = os.environ.get("DASHSCOPE_INTENT_FAST_PATH_ENABLED", "true").lower() == "true"  # 是否启用意图快速通道
+INTENT_MIN_CONFIDENCE = 0.8  # 置信度（匹配片段占问题的比例）低于该值时交给模型
+INTENT_MAX_QUERY_LENGTH = 40  # 超过该长度的问题直接交给模型
+INTENT_RULES_PATH = os.environ.get("INTENT_RULES_PATH", "")  # 追加意图规则的JSON文件，为空时只使用内置规则
+
+# 工具预取配置（第一次模型请求的同时预先执行可能用到的无副作用工具）
+TOOL_PREFETCH_ENABLED = os.environ.get("DASHSCOPE_TOOL_PREFETCH_ENABLED", "false").lower() == "true"  # 是否启用工具预取
+TOOL_PREFETCH_MIN_CONFIDENCE = 0.5  # 意图匹配置信度达到该值时预取
+TOOL_PREFETCH_MAX_TOOLS = 2  # 每次请求最多预取的工具调用数
+TOOL_PREFETCH_HISTORY_SIZE = 512  # 记录模型选择的问题数
+TOOL_PREFETCH_SIMILARITY = 0.6  # 与历史问题的相似度达到该值时按历史选择预取
+
+# 阶段缓存配置（工具执行后的模型回答按问题和工具结果缓存，数据不变时跳过第二次模型请求）
+STAGE_CACHE_ENABLED = os.environ.get("DASHSCOPE_STAGE_CACHE_ENABLED", "true").lower() == "true"  # 是否启用阶段缓存
+STAGE_CACHE_TTL = 300  # 缓存过期时间（秒）
+STAGE_CACHE_MAX_ENTRIES = 1024  # 最大缓存条数
+
+# 本地token估算配置（按千问分词规则近似估算，用于调度额度、工具预选和历史压缩）
+TOKEN_ESTIMATE_SCALE = float(os.environ.get("DASHSCOPE_TOKEN_ESTIMATE_SCALE", "1.0"))  # 估算结果的校正系数，可参考/api/tokens/calibration的建议值
+TOKEN_ESTIMATE_CACHE_SIZE = 16384  # 缓存的单条消息估算结果数
+TOKEN_CALIBRATION_WINDOW = 500  # 校准报告使用的最近样本数
+
+# 多轮对话历史压缩配置（历史超出提示token预算时丢弃较早的轮次，并用后台生成的摘要代替）
+HISTORY_COMPACTION_ENABLED = os.environ.get("DASHSCOPE_HISTORY_COMPACTION_ENABLED", "true").lower() == "true"  # 是否启用历史压缩
+HISTORY_PROMPT_BUDGET = 6000  # 多轮对话提示（系统消息+历史+本轮问题）的token预算
+HISTORY_COMPACTION_CHUNK_TURNS = 4  # 丢弃的轮数按该值向上取整，同一段摘要可以在之后多轮请求中复用
+HISTORY_SUMMARY_ENABLED = True  # 是否为丢弃的轮次生成摘要（后台生成并缓存，不在请求路径上）
+HISTORY_SUMMARY_MAX_TOKENS = 300  # 摘要的最大token数，同时作为预算中为摘要预留的部分
+HISTORY_SUMMARY_CACHE_SIZE = 512  # 最多缓存的摘要数
+
+# LangChain代理配置（每次运行可在请求中单独指定，超出时返回已有结果并说明原因）
+AGENT_MAX_STEPS = int(os.environ.get("AGENT_MAX_STEPS", "10"))  # 最多执行的步骤（模型调用）数
+AGENT_MAX_SECONDS = float(os.environ.get("AGENT_MAX_SECONDS", "60"))  # 单次运行的最长时间（秒），超时的模型或工具调用会被取消
+AGENT_VERBOSE = os.environ.get("AGENT_VERBOSE", "false").lower() == "true"  # 是否向标准输出打印执行过程（调试用）
+
+# 工具配置：默认工具由app.utils.tools注册到工具注册表（app.utils.tool_registry），
+# 参数schema根据工具函数的类型注解生成
+ 
\ No newline at end of file
@@ -0,0 +1,300 @@
+"""
+上游调用调度器
+
+按令牌桶控制对DashScope的QPS和每分钟token数（TPM），超出额度的请求按优先级排队，
+交互式对话优先于批量任务。token数在调用前按max_tokens和提示长度预估，
+调用完成后根据返回的usage校正。
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from app.core.errors import DashscopeError
+from app.core.token_estimator import get_token_estimator
+from app.core.llm_config import (
+    RATE_LIMIT_ENABLED,
+    RATE_LIMIT_QPS,
+    RATE_LIMIT_TPM,
+    RATE_LIMIT_MAX_QUEUE_WAIT
+)
+
+# 获取logger
+logger = logging.getLogger("gongdi-api.scheduler")
+
+# 优先级，数值越小越优先
+PRIORITY_INTERACTIVE = 0  # 交互式对话
+PRIORITY_BATCH = 10  # 批量任务
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_BATCH: "batch"
+}
+
+
+class SchedulerQueueTimeout(DashscopeError):
+    """排队等待超时，本地额度已饱和"""
+    http_status = 503
+
+
+def estimate_text_tokens(text: str) -> int:
+    """估算文本token数（本地token估算器，见app.core.token_estimator）"""
+    return get_token_estimator().text_tokens(text)
+
+
+def estimate_request_tokens(
+    messages: List[Dict[str, Any]],
+    tools: Optional[List[Dict]] = None,
+    max_tokens: int = 0,
+) -> int:
+    """预估一次请求消耗的token数（提示token + 最大生成token）
+
+    Args:
+        messages: 聊天消息列表
+        tools: 工具列表
+        max_tokens: 最大生成token数量
+
+    Returns:
+        预估token数
+    """
+    return get_token_estimator().request_tokens(messages, tools, max_tokens)
+
+
+class TokenBucket:
+    """令牌桶"""
+
+    def __init__(self, rate: float, capacity: float):
+        """初始化令牌桶
+
+        Args:
+            rate: 每秒补充的令牌数
+            capacity: 桶容量
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """获取令牌还需等待的秒数，0表示可以立即获取"""
+        self._refill()
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        """扣除令牌（允许透支，透支部分由后续补充抵消）"""
+        self._refill()
+        self.tokens -= amount
+
+    def refund(self, amount: float) -> None:
+        """归还令牌"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class Ticket:
+    """一次获准的上游调用"""
+
+    def __init__(self, estimated_tokens: int, priority: int, waited: float):
+        self.estimated_tokens = estimated_tokens
+        self.priority = priority
+        self.waited = waited
+        self.reconciled = False
+
+
+class _Waiter:
+    """排队中的请求"""
+
+    def __init__(self, tokens: int, priority: int, future: asyncio.Future):
+        self.tokens = tokens
+        self.priority = priority
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+class UpstreamScheduler:
+    """基于令牌桶和优先级队列的上游调度器"""
+
+    def __init__(
+        self,
+        qps: float = RATE_LIMIT_QPS,
+        tpm: float = RATE_LIMIT_TPM,
+        max_queue_wait: float = RATE_LIMIT_MAX_QUEUE_WAIT,
+    ):
+        """初始化调度器
+
+        Args:
+            qps: 每秒请求数上限
+            tpm: 每分钟token数上限
+            max_queue_wait: 最长排队时间（秒），超时抛出SchedulerQueueTimeout
+        """
+        self.qps = qps
+        self.tpm = tpm
+        self.max_queue_wait = max_queue_wait
+        self._requests = TokenBucket(qps, max(qps, 1))
+        self._tokens = TokenBucket(tpm / 60.0, tpm)
+        self._queue: List = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        # 统计信息
+        self.granted = 0
+        self.queued_total = 0
+        self.queued_granted = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _try_grant(self, tokens: int) -> float:
+        """尝试同时获取请求令牌和token额度，返回需要等待的秒数"""
+        wait = max(self._requests.wait_time(1), self._tokens.wait_time(tokens))
+        if wait == 0:
+            self._requests.consume(1)
+            self._tokens.consume(tokens)
+        return wait
+
+    async def acquire(self, estimated_tokens: int, priority: int = PRIORITY_INTERACTIVE) -> Ticket:
+        """申请一次上游调用额度，额度不足时排队
+
+        Args:
+            estimated_tokens: 预估token数
+            priority: 优先级，数值越小越优先
+
+        Returns:
+            调用凭证，调用完成后需传给reconcile校正token数
+        """
+        # 单次请求不能超过桶容量，否则永远无法获准
+        tokens = min(estimated_tokens, int(self.tpm))
+
+        if not self._queue and self._try_grant(tokens) == 0:
+            self.granted += 1
+            return Ticket(tokens, priority, 0.0)
+
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(tokens, priority, loop.create_future())
+        heapq.heappush(self._queue, (priority, next(self._seq), waiter))
+        self.queued_total += 1
+        self._dispatch()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.max_queue_wait)
+        except asyncio.TimeoutError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # 超时与获准同时发生，额度已扣除，照常放行
+                pass
+            else:
+                waiter.future.cancel()
+                self.timeouts += 1
+                raise SchedulerQueueTimeout(f"上游调用排队超过{self.max_queue_wait}秒")
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self._refund(waiter.tokens)
+            waiter.future.cancel()
+            raise
+
+        waited = time.monotonic() - waiter.enqueued_at
+        self.queued_granted += 1
+        self.wait_seconds_total += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        return Ticket(tokens, priority, waited)
+
+    def _dispatch(self) -> None:
+        """按优先级放行队首请求，额度不足时定时重试"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._queue:
+            _, _, waiter = self._queue[0]
+            if waiter.future.done():
+                heapq.heappop(self._queue)
+                continue
+
+            wait = self._try_grant(waiter.tokens)
+            if wait > 0:
+                loop = asyncio.get_running_loop()
+                self._timer = loop.call_later(wait, self._dispatch)
+                return
+
+            heapq.heappop(self._queue)
+            self.granted += 1
+            waiter.future.set_result(None)
+
+    def _refund(self, tokens: int) -> None:
+        self._tokens.refund(tokens)
+        if self._queue:
+            self._dispatch()
+
+    def reconcile(self, ticket: Ticket, actual_tokens: Optional[int]) -> None:
+        """根据实际消耗的token数校正额度
+
+        Args:
+            ticket: acquire返回的凭证
+            actual_tokens: 实际消耗的token数，调用失败时传0
+        """
+        if ticket.reconciled:
+            return
+        ticket.reconciled = True
+        if actual_tokens is None:
+            return
+
+        delta = ticket.estimated_tokens - actual_tokens
+        if delta > 0:
+            self._refund(delta)
+        elif delta < 0:
+            self._tokens.consume(-delta)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取调度统计"""
+        depth: Dict[str, int] = {}
+        for priority, _, waiter in self._queue:
+            if not waiter.future.done():
+                name = PRIORITY_NAMES.get(priority, str(priority))
+                depth[name] = depth.get(name, 0) + 1
+
+        return {
+            "qps": self.qps,
+            "tpm": self.tpm,
+            "max_queue_wait": self.max_queue_wait,
+            "available_requests": round(self._requests.tokens, 2),
+            "available_tokens": int(self._tokens.tokens),
+            "queue_depth": sum(depth.values()),
+            "queue_depth_by_priority": depth,
+            "granted": self.granted,
+            "queued_total": self.queued_total,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(self.wait_seconds_total / self.queued_granted * 1000, 1) if self.queued_granted else 0.0,
+            "max_wait_ms": round(self.max_wait_seconds * 1000, 1)
+        }
+
+
+def usage_total_tokens(usage: Optional[Dict[str, Any]]) -> Optional[int]:
+    """从usage中取出总token数"""
+    if not usage:
+        return None
+    if usage.get('total_tokens') is not None:
+        return usage['total_tokens']
+    return (usage.get('input_tokens') or 0) + (usage.get('output_tokens') or 0)
+
+
+# 进程内共享调度器
+_shared_scheduler: Optional[UpstreamScheduler] = None
+
+
+def get_scheduler() -> Optional[UpstreamScheduler]:
+    """获取进程内共享的调度器，未启用限流时返回None"""
+    global _shared_scheduler
+    if not RATE_LIMIT_ENABLED:
+        return None
+    if _shared_scheduler is None:
+        _shared_scheduler = UpstreamScheduler()
+    return _shared_scheduler
@@ -0,0 +1,201 @@
+"""
+重试与熔断
+
+RetryPolicy：指数退避加全抖动，优先遵循上游的Retry-After
+CircuitBreaker：滑动窗口内上游错误率超过阈值时打开，打开期间快速失败，
+冷却后进入半开状态放行少量探测请求
+"""
+
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from app.core.errors import CircuitOpenError
+from app.core.llm_config import (
+    RETRY_MAX_ATTEMPTS,
+    RETRY_BASE_DELAY,
+    RETRY_MAX_DELAY,
+    RETRY_MAX_RETRY_AFTER,
+    BREAKER_ENABLED,
+    BREAKER_ERROR_RATE,
+    BREAKER_MIN_REQUESTS,
+    BREAKER_WINDOW,
+    BREAKER_OPEN_SECONDS
+)
+
+# 获取logger
+logger = logging.getLogger("gongdi-api.resilience")
+
+
+class RetryPolicy:
+    """重试策略"""
+
+    def __init__(
+        self,
+        max_attempts: int = RETRY_MAX_ATTEMPTS,
+        base_delay: float = RETRY_BASE_DELAY,
+        max_delay: float = RETRY_MAX_DELAY,
+        max_retry_after: float = RETRY_MAX_RETRY_AFTER,
+    ):
+        """初始化重试策略
+
+        Args:
+            max_attempts: 最大尝试次数（含首次）
+            base_delay: 退避基准时间（秒）
+            max_delay: 单次退避上限（秒）
+            max_retry_after: 允许遵循的Retry-After上限（秒），超过时不再重试
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> Optional[float]:
+        """计算第attempt次失败后的等待时间
+
+        Args:
+            attempt: 已失败次数（从1开始）
+            retry_after: 上游建议的等待时间
+
+        Returns:
+            等待秒数，返回None表示不再重试
+        """
+        if attempt >= self.max_attempts:
+            return None
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+        if retry_after is not None:
+            if retry_after > self.max_retry_after:
+                return None
+            delay = max(delay, retry_after)
+        return delay
+
+
+class CircuitBreaker:
+    """熔断器"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        error_rate: float = BREAKER_ERROR_RATE,
+        min_requests: int = BREAKER_MIN_REQUESTS,
+        window: float = BREAKER_WINDOW,
+        open_seconds: float = BREAKER_OPEN_SECONDS,
+    ):
+        """初始化熔断器
+
+        Args:
+            error_rate: 打开熔断的错误率阈值
+            min_requests: 窗口内最少请求数，低于该数量不判定
+            window: 统计窗口（秒）
+            open_seconds: 打开后的冷却时间（秒）
+        """
+        self.error_rate = error_rate
+        self.min_requests = min_requests
+        self.window = window
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+        # 统计信息
+        self.opened_total = 0
+        self.rejected_total = 0
+
+    def _trim(self, now: float) -> None:
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            self._outcomes.popleft()
+
+    def before_call(self) -> None:
+        """调用前检查，熔断打开时抛出CircuitOpenError"""
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                self.rejected_total += 1
+                raise CircuitOpenError("上游服务熔断中，请稍后再试", retry_after=self.retry_after())
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+            logger.info("熔断器进入半开状态")
+
+        if self.state == self.HALF_OPEN:
+            # 半开状态只放行一个探测请求
+            if self._probe_in_flight:
+                self.rejected_total += 1
+                raise CircuitOpenError("上游服务熔断探测中，请稍后再试", retry_after=1)
+            self._probe_in_flight = True
+
+    def record_success(self) -> None:
+        """记录一次成功调用"""
+        now = time.monotonic()
+        if self.state == self.HALF_OPEN:
+            self.state = self.CLOSED
+            self._outcomes.clear()
+            self._probe_in_flight = False
+            logger.info("熔断器已关闭")
+        self._outcomes.append((now, True))
+        self._trim(now)
+
+    def record_failure(self) -> None:
+        """记录一次上游故障"""
+        now = time.monotonic()
+        if self.state == self.HALF_OPEN:
+            self._open(now)
+            return
+
+        self._outcomes.append((now, False))
+        self._trim(now)
+        total = len(self._outcomes)
+        failures = sum(1 for _, ok in self._outcomes if not ok)
+        if total >= self.min_requests and failures / total >= self.error_rate:
+            self._open(now)
+
+    def release(self) -> None:
+        """调用既未成功也未计入失败时（如参数错误）释放半开探测名额"""
+        self._probe_in_flight = False
+
+    def _open(self, now: float) -> None:
+        self.state = self.OPEN
+        self._opened_at = now
+        self._probe_in_flight = False
+        self.opened_total += 1
+        logger.warning(f"上游错误率过高，熔断器打开{self.open_seconds}秒")
+
+    def retry_after(self) -> float:
+        """距离熔断冷却结束的秒数"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+
+    def stats(self) -> Dict[str, Any]:
+        """获取熔断器状态"""
+        self._trim(time.monotonic())
+        total = len(self._outcomes)
+        failures = sum(1 for _, ok in self._outcomes if not ok)
+        return {
+            "state": self.state,
+            "window_requests": total,
+            "window_failures": failures,
+            "window_error_rate": round(failures / total, 4) if total else 0.0,
+            "error_rate_threshold": self.error_rate,
+            "retry_after": round(self.retry_after(), 1),
+            "opened_total": self.opened_total,
+            "rejected_total": self.rejected_total
+        }
+
+
+# 进程内共享熔断器
+_shared_breaker: Optional[CircuitBreaker] = None
+
+
+def get_breaker() -> Optional[CircuitBreaker]:
+    """获取进程内共享的熔断器，未启用时返回None"""
+    global _shared_breaker
+    if not BREAKER_ENABLED:
+        return None
+    if _shared_breaker is None:
+        _shared_breaker = CircuitBreaker()
+    return _shared_breaker
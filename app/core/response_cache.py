@@ -0,0 +1,409 @@
+"""
+大模型响应缓存
+
+temperature为0时相同的请求会得到确定的回答，按规范化请求的哈希缓存响应，
+避免重复问题重复调用千问API。支持内存LRU+TTL和可选的SQLite磁盘层。
+"""
+
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Tuple
+
+from app.core.llm_config import (
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_TTL,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_SQLITE_PATH,
+    RESPONSE_CACHE_STALE_TTL
+)
+
+# 获取logger
+logger = logging.getLogger("gongdi-api.cache")
+
+# 磁盘缓存清理过期条目的间隔（秒）
+PRUNE_INTERVAL = 60
+
+# 参与缓存键计算的消息字段
+MESSAGE_KEY_FIELDS = ("role", "content", "name", "tool_calls", "tool_call_id")
+
+
+def normalize_message(message: Dict[str, Any]) -> Dict[str, Any]:
+    """规范化单条消息，只保留影响回答的字段"""
+    normalized = {k: message[k] for k in MESSAGE_KEY_FIELDS if message.get(k) is not None}
+    if isinstance(normalized.get("content"), str):
+        normalized["content"] = normalized["content"].strip()
+    return normalized
+
+
+def make_cache_key(
+    model: str,
+    messages: List[Dict[str, Any]],
+    tools: Optional[List[Dict]] = None,
+    temperature: Optional[float] = None,
+    max_tokens: Optional[int] = None,
+    stop: Optional[List[str]] = None,
+) -> str:
+    """计算请求的规范化哈希
+
+    Args:
+        model: 模型名称
+        messages: 聊天消息列表
+        tools: 工具列表
+        temperature: 温度参数
+        max_tokens: 最大生成token数量
+        stop: 停止序列，未设置时不计入（与之前的缓存键保持一致）
+
+    Returns:
+        sha256十六进制字符串
+    """
+    payload = {
+        "model": model,
+        "messages": [normalize_message(m) for m in messages],
+        "tools": tools or [],
+        "temperature": temperature,
+        "max_tokens": max_tokens
+    }
+    if stop:
+        payload["stop"] = list(stop)
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseCache(ABC):
+    """响应缓存基类
+
+    子类实现get/set/clear，异步调用方使用aget/aset。
+    过期条目会再保留stale_ttl秒，allow_stale=True时仍可读取（熔断期间兜底）。
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.stale_hits = 0
+
+    @abstractmethod
+    def get(self, key: str, allow_stale: bool = False) -> Optional[Dict]:
+        """查询缓存
+
+        Args:
+            key: 缓存键
+            allow_stale: 是否返回已过期但仍在stale_ttl内的条目
+
+        Returns:
+            缓存的响应，未命中时返回None
+        """
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: Dict) -> None:
+        """写入缓存，过期时间从写入时开始计算"""
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        """清空缓存"""
+        ...
+
+    async def aget(self, key: str, allow_stale: bool = False) -> Optional[Dict]:
+        return self.get(key, allow_stale)
+
+    async def aset(self, key: str, value: Dict) -> None:
+        self.set(key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取命中统计"""
+        total = self.hits + self.misses
+        return {
+            "backend": type(self).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "sets": self.sets,
+            "stale_hits": self.stale_hits,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
+
+
+class MemoryResponseCache(ResponseCache):
+    """内存缓存，按条数和占用字节数做LRU淘汰，条目按TTL过期"""
+
+    def __init__(
+        self,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        max_bytes: int = RESPONSE_CACHE_MAX_BYTES,
+        ttl: float = RESPONSE_CACHE_TTL,
+        stale_ttl: float = RESPONSE_CACHE_STALE_TTL,
+    ):
+        """初始化内存缓存
+
+        Args:
+            max_entries: 最大缓存条数
+            max_bytes: 最大占用字节数（按序列化后的JSON长度估算）
+            ttl: 过期时间（秒）
+            stale_ttl: 过期后保留的时间（秒）
+        """
+        super().__init__()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.evictions = 0
+        self.current_bytes = 0
+        self._entries: "OrderedDict[str, Tuple[float, int, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, allow_stale: bool = False) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, size, value = entry
+            now = time.monotonic()
+            if expires_at < now:
+                if expires_at + self.stale_ttl < now:
+                    del self._entries[key]
+                    self.current_bytes -= size
+                    allow_stale = False
+                if not allow_stale:
+                    self.misses += 1
+                    return None
+                self.stale_hits += 1
+            else:
+                self.hits += 1
+
+            self._entries.move_to_end(key)
+            return copy.deepcopy(value)
+
+    def set(self, key: str, value: Dict, ttl: Optional[float] = None) -> None:
+        """写入缓存
+
+        Args:
+            key: 缓存键
+            value: 响应
+            ttl: 本条的有效时间（秒），默认使用初始化时的ttl（从磁盘回填时传剩余的有效时间）
+        """
+        size = len(json.dumps(value, ensure_ascii=False))
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+
+            self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), size, copy.deepcopy(value))
+            self.current_bytes += size
+            self.sets += 1
+
+            while len(self._entries) > self.max_entries or self.current_bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        result = super().stats()
+        result.update({
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "evictions": self.evictions
+        })
+        return result
+
+
+class SQLiteResponseCache(ResponseCache):
+    """SQLite磁盘缓存，服务重启后仍然有效
+
+    过期条目在读取时删除，写入时每隔PRUNE_INTERVAL秒批量清理一次不再读取的过期条目。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl: float = RESPONSE_CACHE_TTL,
+        stale_ttl: float = RESPONSE_CACHE_STALE_TTL,
+    ):
+        """初始化磁盘缓存
+
+        Args:
+            path: SQLite数据库文件路径
+            ttl: 过期时间（秒）
+            stale_ttl: 过期后保留的时间（秒）
+        """
+        super().__init__()
+        self.path = path
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.pruned = 0
+        self._lock = threading.Lock()
+        # 首次写入时清理上次运行遗留的过期条目
+        self._last_prune = 0.0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS response_cache_expires ON response_cache (expires_at)")
+        self._conn.commit()
+
+    def get(self, key: str, allow_stale: bool = False) -> Optional[Dict]:
+        entry = self.get_entry(key, allow_stale)
+        return entry[0] if entry is not None else None
+
+    def get_entry(self, key: str, allow_stale: bool = False) -> Optional[Tuple[Dict, float]]:
+        """查询缓存，同时返回剩余的有效时间
+
+        Returns:
+            (响应, 剩余有效秒数)，过期条目的剩余时间不大于0；未命中时返回None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            now = time.time()
+            if row[1] < now:
+                if row[1] + self.stale_ttl < now:
+                    self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                    self._conn.commit()
+                    allow_stale = False
+                if not allow_stale:
+                    self.misses += 1
+                    return None
+                self.stale_hits += 1
+            else:
+                self.hits += 1
+            return json.loads(row[0]), row[1] - now
+
+    def set(self, key: str, value: Dict) -> None:
+        with self._lock:
+            now = time.time()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now + self.ttl)
+            )
+            if now - self._last_prune >= PRUNE_INTERVAL:
+                self._last_prune = now
+                cursor = self._conn.execute(
+                    "DELETE FROM response_cache WHERE expires_at < ?", (now - self.stale_ttl,)
+                )
+                self.pruned += cursor.rowcount
+            self._conn.commit()
+            self.sets += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM response_cache")
+            self._conn.commit()
+
+    async def aget(self, key: str, allow_stale: bool = False) -> Optional[Dict]:
+        return await asyncio.to_thread(self.get, key, allow_stale)
+
+    async def aset(self, key: str, value: Dict) -> None:
+        await asyncio.to_thread(self.set, key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        result = super().stats()
+        result.update({"path": self.path, "ttl": self.ttl, "pruned": self.pruned})
+        return result
+
+
+class TieredResponseCache(ResponseCache):
+    """内存+磁盘两级缓存，磁盘命中时回填内存（沿用磁盘条目剩余的有效时间）"""
+
+    def __init__(self, memory: MemoryResponseCache, disk: SQLiteResponseCache):
+        super().__init__()
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key: str, allow_stale: bool = False) -> Optional[Dict]:
+        value = self.memory.get(key, allow_stale)
+        if value is None:
+            value = self._backfill(key, self.disk.get_entry(key, allow_stale))
+        self._count(value, allow_stale)
+        return value
+
+    def _backfill(self, key: str, entry: Optional[Tuple[Dict, float]]) -> Optional[Dict]:
+        """磁盘命中且未过期时回填内存，有效时间取磁盘条目的剩余时间"""
+        if entry is None:
+            return None
+        value, remaining = entry
+        if remaining > 0:
+            self.memory.set(key, value, ttl=remaining)
+        return value
+
+    def set(self, key: str, value: Dict) -> None:
+        self.memory.set(key, value)
+        self.disk.set(key, value)
+        self.sets += 1
+
+    def clear(self) -> None:
+        self.memory.clear()
+        self.disk.clear()
+
+    async def aget(self, key: str, allow_stale: bool = False) -> Optional[Dict]:
+        value = self.memory.get(key, allow_stale)
+        if value is None:
+            entry = await asyncio.to_thread(self.disk.get_entry, key, allow_stale)
+            value = self._backfill(key, entry)
+        self._count(value, allow_stale)
+        return value
+
+    async def aset(self, key: str, value: Dict) -> None:
+        self.memory.set(key, value)
+        await self.disk.aset(key, value)
+        self.sets += 1
+
+    def _count(self, value: Optional[Dict], stale: bool) -> None:
+        if value is None:
+            self.misses += 1
+        elif stale:
+            self.stale_hits += 1
+        else:
+            self.hits += 1
+
+    def stats(self) -> Dict[str, Any]:
+        result = super().stats()
+        result.update({"memory": self.memory.stats(), "disk": self.disk.stats()})
+        return result
+
+
+# 进程内共享缓存
+_shared_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """获取进程内共享的响应缓存，未启用时返回None"""
+    global _shared_cache
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    if _shared_cache is None:
+        memory = MemoryResponseCache()
+        if RESPONSE_CACHE_SQLITE_PATH:
+            _shared_cache = TieredResponseCache(memory, SQLiteResponseCache(RESPONSE_CACHE_SQLITE_PATH))
+            logger.info(f"启用两级响应缓存: {RESPONSE_CACHE_SQLITE_PATH}")
+        else:
+            _shared_cache = memory
+    return _shared_cache
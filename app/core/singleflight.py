@@ -0,0 +1,152 @@
+"""
+相同请求合并（single-flight）
+
+并发到达的相同请求（相同缓存键）只向上游发起一次调用，结果分发给所有等待者；
+流式请求同样只建立一条上游连接，后加入的订阅者会先重放已收到的片段。
+"""
+
+import asyncio
+import copy
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+# 获取logger
+logger = logging.getLogger("gongdi-api.singleflight")
+
+
+class _Broadcast:
+    """一次上游流式调用的广播状态"""
+
+    def __init__(self):
+        self.chunks: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.condition = asyncio.Condition()
+        self.task: Optional[asyncio.Task] = None
+
+
+class SingleFlight:
+    """相同请求合并器"""
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+        self._streams: Dict[str, _Broadcast] = {}
+
+        # 统计信息
+        self.calls = 0
+        self.collapsed = 0
+        self.stream_calls = 0
+        self.stream_collapsed = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """执行调用，若相同key的调用正在进行则等待其结果
+
+        上游调用在独立任务中执行，单个等待者取消不会影响其他等待者
+
+        Args:
+            key: 请求键
+            fn: 发起上游调用的协程函数
+
+        Returns:
+            调用结果（每个等待者拿到独立副本）
+        """
+        task = self._calls.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._finish_call(key, t))
+        else:
+            self.collapsed += 1
+            logger.debug(f"合并相同请求: key={key[:16]}")
+
+        result = await asyncio.shield(task)
+        return copy.deepcopy(result)
+
+    def _finish_call(self, key: str, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # 取出异常，避免所有等待者都已取消时出现未处理异常的警告
+        if not task.cancelled():
+            task.exception()
+
+    async def stream(self, key: str, factory: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """订阅流式调用，若相同key的流正在进行则加入广播
+
+        Args:
+            key: 请求键
+            factory: 创建上游流式迭代器的函数
+
+        Yields:
+            上游产生的每个片段
+        """
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            self.stream_calls += 1
+            broadcast = _Broadcast()
+            self._streams[key] = broadcast
+            broadcast.task = asyncio.ensure_future(self._pump(key, broadcast, factory))
+        else:
+            self.stream_collapsed += 1
+            logger.debug(f"合并相同流式请求: key={key[:16]}")
+
+        broadcast.subscribers += 1
+        index = 0
+        try:
+            while True:
+                async with broadcast.condition:
+                    await broadcast.condition.wait_for(
+                        lambda: len(broadcast.chunks) > index or broadcast.done
+                    )
+                while index < len(broadcast.chunks):
+                    yield broadcast.chunks[index]
+                    index += 1
+                if broadcast.done and index >= len(broadcast.chunks):
+                    if broadcast.error is not None:
+                        raise broadcast.error
+                    return
+        finally:
+            broadcast.subscribers -= 1
+            # 最后一个订阅者提前离开时取消上游调用
+            if broadcast.subscribers == 0 and not broadcast.done and broadcast.task is not None:
+                broadcast.task.cancel()
+
+    async def _pump(self, key: str, broadcast: _Broadcast, factory: Callable[[], AsyncIterator[Any]]) -> None:
+        """消费上游流并通知所有订阅者"""
+        try:
+            async for chunk in factory():
+                async with broadcast.condition:
+                    broadcast.chunks.append(chunk)
+                    broadcast.condition.notify_all()
+        except Exception as e:
+            broadcast.error = e
+        finally:
+            if self._streams.get(key) is broadcast:
+                del self._streams[key]
+            broadcast.done = True
+            async with broadcast.condition:
+                broadcast.condition.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        """获取合并统计"""
+        return {
+            "in_flight": len(self._calls),
+            "in_flight_streams": len(self._streams),
+            "calls": self.calls,
+            "collapsed": self.collapsed,
+            "stream_calls": self.stream_calls,
+            "stream_collapsed": self.stream_collapsed
+        }
+
+
+# 进程内共享合并器
+_shared_singleflight: Optional[SingleFlight] = None
+
+
+def get_singleflight() -> SingleFlight:
+    """获取进程内共享的请求合并器"""
+    global _shared_singleflight
+    if _shared_singleflight is None:
+        _shared_singleflight = SingleFlight()
+    return _shared_singleflight
@@ -0,0 +1,266 @@
+"""
+本地token估算
+
+调度额度、工具预选和历史压缩都需要在调用千问之前知道token数，而usage只有调用之后才有。
+这里按千问分词器的预切分规则（字母连续段、单个数字、标点段、空白）近似估算：
+汉字按平均每字约0.7个token，英文单词按长度，数字每位1个token，另加对话模板的固定开销。
+单条消息的估算结果按内容哈希缓存，多轮对话的历史消息不会重复计算。
+每次调用返回usage后记录估算值与实际值，生成校准报告。
+"""
+import hashlib
+import json
+import math
+import re
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from app.core.llm_config import (
+    TOKEN_ESTIMATE_SCALE,
+    TOKEN_ESTIMATE_CACHE_SIZE,
+    TOKEN_CALIBRATION_WINDOW
+)
+
+# 千问分词器预切分规则的近似（re不支持\p{L}，用[^\W\d_]表示字母）
+_PRETOKEN_RE = re.compile(
+    r"'(?:s|t|re|ve|m|ll|d)"
+    r"|[^\r\n\w]?[^\W\d_]+"
+    r"|\d"
+    r"| ?(?:[^\s\w]|_)+[\r\n]*"
+    r"|\s*[\r\n]+"
+    r"|\s+(?!\S)"
+    r"|\s+",
+    re.IGNORECASE
+)
+_CJK_RE = re.compile(r"[㐀-䶿一-鿿豈-﫿]")
+
+CJK_TOKENS_PER_CHAR = 0.7  # 词表包含大量常用词，平均每个汉字约0.7个token
+LATIN_CHARS_PER_TOKEN = 6  # 英文单词（含前导空格）每6个字母约1个token
+SYMBOL_CHARS_PER_TOKEN = 2  # 连续标点常被合并
+
+# 对话模板开销：<|im_start|>role\n ... <|im_end|>\n
+MESSAGE_OVERHEAD_TOKENS = 5
+# 回答开头的<|im_start|>assistant\n
+REPLY_OVERHEAD_TOKENS = 3
+# 工具说明模板的固定开销（近似值，偏差见校准报告）
+TOOLS_OVERHEAD_TOKENS = 50
+
+# 校准报告按提示中汉字的比例分组
+LANG_ZH = "zh"
+LANG_EN = "en"
+LANG_MIXED = "mixed"
+
+
+def count_text(text: str) -> Tuple[float, int]:
+    """估算文本的token数
+
+    Returns:
+        (token数, 汉字数)
+    """
+    tokens = 0.0
+    cjk_total = 0
+    for piece in _PRETOKEN_RE.findall(text):
+        first = piece[0]
+        if first.isdigit():
+            tokens += 1
+        elif piece.isspace():
+            tokens += 1
+        elif any(ch.isalpha() for ch in piece):
+            cjk = len(_CJK_RE.findall(piece))
+            latin = sum(1 for ch in piece if ch.isalpha()) - cjk
+            cjk_total += cjk
+            piece_tokens = cjk * CJK_TOKENS_PER_CHAR
+            if latin:
+                piece_tokens += math.ceil(latin / LATIN_CHARS_PER_TOKEN)
+            tokens += max(1, math.ceil(piece_tokens))
+        else:
+            tokens += max(1, math.ceil(len(piece.strip(" \r\n")) / SYMBOL_CHARS_PER_TOKEN))
+    return tokens, cjk_total
+
+
+def count_text_tokens(text: str) -> int:
+    """估算文本的token数（不含对话模板开销，不做校正）"""
+    return int(count_text(text)[0])
+
+
+def language_of(cjk_chars: int, chars: int) -> str:
+    """按汉字比例判断提示的语言类型"""
+    if not chars:
+        return LANG_EN
+    ratio = cjk_chars / chars
+    if ratio >= 0.6:
+        return LANG_ZH
+    if ratio <= 0.1:
+        return LANG_EN
+    return LANG_MIXED
+
+
+class TokenEstimator:
+    """本地token估算，单条消息按内容哈希缓存"""
+
+    def __init__(
+        self,
+        scale: float = TOKEN_ESTIMATE_SCALE,
+        cache_size: int = TOKEN_ESTIMATE_CACHE_SIZE,
+        calibration_window: int = TOKEN_CALIBRATION_WINDOW,
+    ):
+        """初始化估算器
+
+        Args:
+            scale: 估算结果的校正系数
+            cache_size: 缓存的单条消息估算结果数
+            calibration_window: 校准报告使用的最近样本数
+        """
+        self.scale = scale
+        self.cache_size = cache_size
+        # 角色和内容的摘要 -> (token数, 汉字数, 字符数)；只保存16字节摘要，不保留消息原文
+        self._memo: "OrderedDict[bytes, Tuple[int, int, int]]" = OrderedDict()
+        self._samples: Deque[Tuple[str, int, int]] = deque(maxlen=calibration_window)
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.memo_hits = 0
+        self.memo_misses = 0
+
+    def _message_stats(self, message: Dict[str, Any]) -> Tuple[int, int, int]:
+        """单条消息的(token数, 汉字数, 字符数)，不含校正系数"""
+        content = message.get("content") or ""
+        if not isinstance(content, str):
+            content = json.dumps(content, ensure_ascii=False)
+        if message.get("tool_calls"):
+            content += json.dumps(message["tool_calls"], ensure_ascii=False)
+        key = hashlib.blake2b(
+            f"{message.get('role') or ''}\0{content}".encode("utf-8"), digest_size=16
+        ).digest()
+
+        with self._lock:
+            cached = self._memo.get(key)
+            if cached is not None:
+                self._memo.move_to_end(key)
+                self.memo_hits += 1
+                return cached
+
+        tokens, cjk = count_text(content)
+        stats = (math.ceil(tokens) + MESSAGE_OVERHEAD_TOKENS, cjk, len(content))
+        with self._lock:
+            self.memo_misses += 1
+            self._memo[key] = stats
+            while len(self._memo) > self.cache_size:
+                self._memo.popitem(last=False)
+        return stats
+
+    def message_tokens(self, message: Dict[str, Any]) -> int:
+        """估算单条消息的token数（含对话模板开销）"""
+        return math.ceil(self._message_stats(message)[0] * self.scale)
+
+    def text_tokens(self, text: str) -> int:
+        """估算一段文本的token数"""
+        return math.ceil(count_text(text)[0] * self.scale)
+
+    def _prompt_stats(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+    ) -> Tuple[int, int, int]:
+        tokens = REPLY_OVERHEAD_TOKENS
+        cjk = chars = 0
+        for message in messages:
+            message_tokens, message_cjk, message_chars = self._message_stats(message)
+            tokens += message_tokens
+            cjk += message_cjk
+            chars += message_chars
+        if tools:
+            serialized = json.dumps(tools, ensure_ascii=False)
+            tools_tokens, tools_cjk = count_text(serialized)
+            tokens += math.ceil(tools_tokens) + TOOLS_OVERHEAD_TOKENS
+            cjk += tools_cjk
+            chars += len(serialized)
+        return tokens, cjk, chars
+
+    def prompt_tokens(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+    ) -> int:
+        """估算一次请求的提示token数（对应usage.input_tokens）"""
+        return math.ceil(self._prompt_stats(messages, tools)[0] * self.scale)
+
+    def request_tokens(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        max_tokens: int = 0,
+    ) -> int:
+        """预估一次请求消耗的token数（提示token + 最大生成token）"""
+        return self.prompt_tokens(messages, tools) + max_tokens
+
+    def observe(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]],
+        usage: Optional[Dict[str, Any]],
+    ) -> None:
+        """记录一次调用的估算值与usage中的实际输入token数"""
+        actual = (usage or {}).get("input_tokens")
+        if not actual:
+            return
+        tokens, cjk, chars = self._prompt_stats(messages, tools)
+        with self._lock:
+            self._samples.append((language_of(cjk, chars), tokens, actual))
+
+    def calibration(self) -> Dict[str, Any]:
+        """校准报告：估算值（未乘校正系数）与实际输入token数的偏差
+
+        Returns:
+            总体和按语言类型分组的样本数、平均绝对百分比误差、误差分位数、偏差方向和建议的校正系数
+        """
+        with self._lock:
+            samples = list(self._samples)
+
+        def summarize(group: List[Tuple[str, int, int]]) -> Dict[str, Any]:
+            if not group:
+                return {"samples": 0}
+            errors = sorted(abs(estimated - actual) / actual for _, estimated, actual in group)
+            total_estimated = sum(estimated for _, estimated, _ in group)
+            total_actual = sum(actual for _, _, actual in group)
+            return {
+                "samples": len(group),
+                "estimated_tokens": total_estimated,
+                "actual_tokens": total_actual,
+                "mean_abs_error": round(sum(errors) / len(errors), 4),
+                "p50_abs_error": round(errors[len(errors) // 2], 4),
+                "p90_abs_error": round(errors[min(len(errors) - 1, int(len(errors) * 0.9))], 4),
+                "bias": round(total_estimated / total_actual - 1, 4),
+                "suggested_scale": round(total_actual / total_estimated, 4) if total_estimated else None
+            }
+
+        return {
+            "scale": self.scale,
+            "overall": summarize(samples),
+            "by_language": {
+                lang: summarize([s for s in samples if s[0] == lang])
+                for lang in (LANG_ZH, LANG_EN, LANG_MIXED)
+            },
+            "memo": {
+                "entries": len(self._memo),
+                "hits": self.memo_hits,
+                "misses": self.memo_misses
+            }
+        }
+
+
+# 进程内共享的估算器
+_shared_estimator: Optional[TokenEstimator] = None
+
+
+def get_token_estimator() -> TokenEstimator:
+    """获取进程内共享的token估算器"""
+    global _shared_estimator
+    if _shared_estimator is None:
+        _shared_estimator = TokenEstimator()
+    return _shared_estimator
+
+
+def message_tokens(message: Dict[str, Any]) -> int:
+    """使用共享估算器估算单条消息的token数"""
+    return get_token_estimator().message_tokens(message)
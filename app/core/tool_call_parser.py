@@ -0,0 +1,80 @@
+"""
+流式工具调用解析
+
+开启incremental_output后，模型决定调用工具时tool_calls按片段返回：
+第一个片段通常带有index、id和函数名，后续片段逐段追加arguments。
+这里按index合并片段，arguments拼成完整的JSON对象时立即交出该工具调用，
+调用方可以在模型输出剩余内容的同时开始执行工具。
+"""
+import json
+from typing import Any, Dict, List
+
+
+class ToolCallAccumulator:
+    """按index合并流式tool_calls片段"""
+
+    def __init__(self):
+        self._calls: Dict[int, Dict[str, Any]] = {}
+        self._completed: set = set()
+
+    @staticmethod
+    def _arguments_complete(arguments: str) -> bool:
+        """arguments是否已经是完整的JSON对象（顶层对象闭合后不会再有合法的后续内容）"""
+        if not arguments.strip():
+            return False
+        try:
+            return isinstance(json.loads(arguments), dict)
+        except ValueError:
+            return False
+
+    def _complete(self, index: int) -> Dict[str, Any]:
+        self._completed.add(index)
+        call = self._calls[index]
+        if not call['id']:
+            call['id'] = f"call_{index}"
+        return call
+
+    def feed(self, deltas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """合并一个流式片段中的tool_calls
+
+        Args:
+            deltas: 片段中message.tool_calls的内容
+
+        Returns:
+            本次新完成的工具调用
+        """
+        completed = []
+        for position, delta in enumerate(deltas or []):
+            index = delta.get('index', position)
+            call = self._calls.get(index)
+            if call is None:
+                # 不同index的片段可能交错到达，未完成的调用等arguments闭合或流结束时再交出
+                call = {'id': '', 'type': 'function', 'function': {'name': '', 'arguments': ''}}
+                self._calls[index] = call
+
+            if delta.get('id'):
+                call['id'] = delta['id']
+            if delta.get('type'):
+                call['type'] = delta['type']
+            function = delta.get('function') or {}
+            if function.get('name'):
+                call['function']['name'] = function['name']
+            if function.get('arguments'):
+                call['function']['arguments'] += function['arguments']
+
+            if (index not in self._completed and call['function']['name']
+                    and self._arguments_complete(call['function']['arguments'])):
+                completed.append(self._complete(index))
+        return completed
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """流结束时交出剩余的工具调用（arguments可能为空或不完整，由执行器报告错误）"""
+        return [self._complete(index) for index in sorted(self._calls) if index not in self._completed]
+
+    @property
+    def tool_calls(self) -> List[Dict[str, Any]]:
+        """合并后的完整tool_calls，用于组装assistant消息"""
+        for index in sorted(self._calls):
+            if not self._calls[index]['id']:
+                self._calls[index]['id'] = f"call_{index}"
+        return [self._calls[index] for index in sorted(self._calls)]
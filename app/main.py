@@ -1,6 +1,7 @@
 """
 FastAPI 应用入口
 """
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import (
@@ -13,16 +14,31 @@ from app.core.config import (
     CORS_HEADERS
 )
 from app.core.logging import setup_logging
-from app.api.routes import chat, debug, tools
+from app.core.connection_pool import startup_pool, shutdown_pool
+from app.api.routes import batch, chat, chat_stream, debug, sessions, tokens, tools, tools_stream
+
+# langchain为可选依赖，未安装时不提供/api/agent路由
+try:
+    from app.api.routes import agent
+except ImportError:
+    agent = None
 
 # 设置日志
 logger = setup_logging()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时预热共享连接池，关闭时释放"""
+    await startup_pool()
+    yield
+    await shutdown_pool()
+
 # 创建FastAPI应用
 app = FastAPI(
     title=API_TITLE,
     description=API_DESCRIPTION,
-    version=API_VERSION
+    version=API_VERSION,
+    lifespan=lifespan
 )
 
 # 添加CORS中间件
@@ -36,8 +52,15 @@ app.add_middleware(
 
 # 注册路由
 app.include_router(chat.router, prefix="/api", tags=["chat"])
+app.include_router(chat_stream.router, prefix="/api", tags=["chat"])
 app.include_router(debug.router, prefix="/api", tags=["debug"])
 app.include_router(tools.router, prefix="/api", tags=["tools"])
+app.include_router(tools_stream.router, prefix="/api", tags=["tools"])
+app.include_router(batch.router, prefix="/api", tags=["batch"])
+app.include_router(sessions.router, prefix="/api", tags=["sessions"])
+app.include_router(tokens.router, prefix="/api", tags=["tokens"])
+if agent is not None:
+    app.include_router(agent.router, prefix="/api", tags=["agent"])
 
 @app.get("/")
 async def read_root():
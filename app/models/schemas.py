@@ -1,8 +1,9 @@
 """
 数据模型定义
 """
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Dict, Any, Optional
+from app.core.llm_config import AGENT_MAX_STEPS, AGENT_MAX_SECONDS
 
 class MessageItem(BaseModel):
     """消息项模型"""
@@ -13,14 +14,43 @@ class ChatRequest(BaseModel):
     """聊天请求模型"""
     prompt: str
     system_message: Optional[str] = "你是一个建筑工地智能助手，会简洁明了地回答问题。"
+    use_cache: bool = True  # 是否使用响应缓存
 
 class FunctionCallRequest(BaseModel):
     """函数调用请求模型"""
     query: str
     tools: Optional[List[Dict[str, Any]]] = None
+    use_cache: bool = True  # 是否使用响应缓存
+    fast_path: bool = True  # 是否允许高频问题走意图快速通道（不调用模型）
 
 class ChatHistoryRequest(BaseModel):
     """带历史记录的聊天请求模型"""
     prompt: str
     system_message: Optional[str] = "你是一个建筑工地智能助手，会简洁明了地回答问题。"
-    history: List[MessageItem] = [] 
\ No newline at end of file
+    history: List[MessageItem] = []
+    use_cache: bool = True  # 是否使用响应缓存
+    session_id: Optional[str] = None  # 服务端会话ID，指定后使用会话中保存的历史（忽略history和system_message）
+
+class AgentRequest(BaseModel):
+    """LangChain代理请求模型"""
+    query: str
+    history: List[MessageItem] = []
+    # 本次运行的步骤和时间（秒）上限，默认使用服务端配置，只能调低不能超过服务端配置
+    max_steps: Optional[int] = Field(default=None, ge=1, le=AGENT_MAX_STEPS)
+    max_seconds: Optional[float] = Field(default=None, gt=0, le=AGENT_MAX_SECONDS)
+
+class SessionCreateRequest(BaseModel):
+    """创建会话请求模型"""
+    system_message: Optional[str] = "你是一个建筑工地智能助手，会简洁明了地回答问题。"
+
+class BatchChatRequest(BaseModel):
+    """批量聊天请求模型"""
+    requests: List[ChatRequest]
+    concurrency: Optional[int] = None  # 并发数，默认使用服务端配置
+
+class TokenEstimateRequest(BaseModel):
+    """token估算请求模型"""
+    text: Optional[str] = None  # 单独估算的文本
+    messages: Optional[List[Dict[str, Any]]] = None  # 聊天消息列表
+    tools: Optional[List[Dict[str, Any]]] = None  # 工具列表（按函数调用时的规范化结果估算）
+    max_tokens: int = 0  # 最大生成token数，计入request_tokens
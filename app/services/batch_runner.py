@@ -0,0 +1,313 @@
+"""
+离线批量任务
+
+逐行读取输入JSONL，每行按/api/chat或/api/complete_function_call的流程并发处理，
+结果逐行追加写入输出JSONL。输出文件同时作为检查点：重新运行时跳过已成功的行，
+任务中断后可以从断点继续，不会重复消耗token。续跑前先压缩输出文件，只保留成功的记录，
+失败的行重新处理后写入新记录，因此每个输入行在输出中最多只有一条记录。
+
+输入行格式：
+    {"id": "可选的业务ID", "prompt": "...", "system_message": "..."}                  # chat
+    {"id": "可选的业务ID", "mode": "function_call", "query": "...", "tools": [...]}   # 完整函数调用
+
+输出行格式：
+    {"line": 行号, "id": ..., "ok": true, "result": {...}}
+    {"line": 行号, "id": ..., "ok": false, "status": 429, "error": "..."}
+
+用法：
+    python -m app.services.batch_runner input.jsonl output.jsonl --workers 8
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from app.core.async_dashscope_client import get_client
+from app.core.config import BATCH_DEFAULT_CONCURRENCY, BATCH_MAX_CONCURRENCY
+from app.core.connection_pool import shutdown_pool, startup_pool
+from app.core.errors import DashscopeError
+from app.core.rate_limiter import PRIORITY_BATCH
+from app.models.schemas import ChatRequest
+from app.services.function_call_service import complete_function_call
+
+# 获取logger
+logger = logging.getLogger("gongdi-api.batch_runner")
+
+MODE_CHAT = "chat"
+MODE_FUNCTION_CALL = "function_call"
+
+FSYNC_EVERY = 100  # 每写入多少行落盘一次
+PROGRESS_EVERY = 100  # 每完成多少行输出一次进度
+
+
+def compact_output(output_path: str) -> Set[int]:
+    """压缩输出文件，只保留每行的成功记录，返回已成功处理的行号
+
+    失败的记录会在本次运行中重试并写入新记录，这里先删除；中断时最后一行可能只写了一半，
+    解析失败的行直接丢弃。压缩结果写入临时文件后原子替换原文件。
+    """
+    if not os.path.exists(output_path):
+        return set()
+
+    succeeded: Dict[int, str] = {}
+    with open(output_path, 'r', encoding='utf-8') as f:
+        for raw in f:
+            try:
+                record = json.loads(raw)
+            except ValueError:
+                continue
+            if record.get("ok"):
+                succeeded[record["line"]] = json.dumps(record, ensure_ascii=False)
+
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for line in sorted(succeeded):
+            f.write(succeeded[line] + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, output_path)
+    return set(succeeded)
+
+
+def iter_input(input_path: str, completed: Set[int]) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """逐行读取输入文件，跳过空行和已完成的行
+
+    Yields:
+        (行号, 解析后的数据, 解析错误)
+    """
+    with open(input_path, 'r', encoding='utf-8') as f:
+        for line_no, raw in enumerate(f, start=1):
+            if line_no in completed or not raw.strip():
+                continue
+            try:
+                item = json.loads(raw)
+            except ValueError as e:
+                yield line_no, None, f"JSON解析失败: {str(e)}"
+                continue
+            if not isinstance(item, dict):
+                yield line_no, None, "每行必须是JSON对象"
+                continue
+            yield line_no, item, None
+
+
+async def process_item(item: Dict[str, Any], default_mode: str) -> Dict[str, Any]:
+    """按chat或function_call流程处理一行"""
+    mode = item.get("mode", default_mode)
+    use_cache = item.get("use_cache", True)
+
+    if mode == MODE_FUNCTION_CALL:
+        query = item.get("query") or item.get("prompt")
+        if not query:
+            raise ValueError("缺少query字段")
+        return await complete_function_call(
+            query=query,
+            tools=item.get("tools"),
+            use_cache=use_cache,
+            priority=PRIORITY_BATCH,
+            fast_path=item.get("fast_path", True)
+        )
+
+    if mode != MODE_CHAT:
+        raise ValueError(f"未知的mode: {mode}")
+
+    request = ChatRequest(**{k: v for k, v in item.items() if k in ChatRequest.model_fields})
+    client = get_client()
+    messages = client.format_messages(
+        prompt=request.prompt,
+        system_message=request.system_message
+    )
+    response = await client.chat(messages, use_cache=request.use_cache, priority=PRIORITY_BATCH)
+    return {
+        "status_code": response['status_code'],
+        "request_id": response['request_id'],
+        "answer": response['choices'][0]['message']['content']
+    }
+
+
+class BatchRunner:
+    """JSONL批量任务执行器"""
+
+    def __init__(
+        self,
+        input_path: str,
+        output_path: str,
+        workers: int = BATCH_DEFAULT_CONCURRENCY,
+        mode: str = MODE_CHAT,
+        resume: bool = True,
+    ):
+        """初始化批量任务
+
+        Args:
+            input_path: 输入JSONL文件
+            output_path: 输出JSONL文件（兼作检查点）
+            workers: 并发数
+            mode: 未指定mode的行使用的处理流程
+            resume: 是否跳过输出文件中已成功的行
+        """
+        self.input_path = input_path
+        self.output_path = output_path
+        self.workers = max(1, min(workers, BATCH_MAX_CONCURRENCY))
+        self.mode = mode
+        self.resume = resume
+
+        # 统计信息
+        self.skipped = 0
+        self.succeeded = 0
+        self.failed = 0
+        self._written = 0
+        self._started = 0.0
+
+    def _write(self, out, record: Dict[str, Any]) -> None:
+        """追加一行结果，定期落盘
+
+        Raises:
+            TypeError: 结果无法序列化为JSON（此时不写入任何内容）
+        """
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        out.write(line)
+        out.flush()
+        self._written += 1
+        if self._written % FSYNC_EVERY == 0:
+            os.fsync(out.fileno())
+
+        if record["ok"]:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+
+        done = self.succeeded + self.failed
+        if done % PROGRESS_EVERY == 0:
+            elapsed = time.monotonic() - self._started
+            logger.info(f"已处理{done}行（成功{self.succeeded}，失败{self.failed}），{done / elapsed:.1f}行/秒")
+
+    async def _worker(self, queue: asyncio.Queue, out) -> None:
+        while True:
+            entry = await queue.get()
+            if entry is None:
+                return
+            line_no, item, error = entry
+            record: Dict[str, Any] = {"line": line_no, "id": (item or {}).get("id")}
+            if error is not None:
+                record.update({"ok": False, "status": 400, "error": error})
+            else:
+                try:
+                    record.update({"ok": True, "result": await process_item(item, self.mode)})
+                except DashscopeError as e:
+                    record.update({"ok": False, "status": e.http_status, "error": str(e)})
+                except ValueError as e:
+                    record.update({"ok": False, "status": 400, "error": str(e)})
+                except Exception as e:
+                    record.update({"ok": False, "status": 500, "error": str(e)})
+            try:
+                self._write(out, record)
+            except (TypeError, ValueError) as e:
+                # 结果无法序列化时记为失败，不影响其他行；写入失败（OSError）结束工作协程，由run停止任务
+                self._write(out, {
+                    "line": line_no, "id": record["id"], "ok": False, "status": 500,
+                    "error": f"结果无法序列化为JSON: {str(e)}"
+                })
+
+    @staticmethod
+    async def _put(queue: asyncio.Queue, entry: Any, tasks: List[asyncio.Future]) -> None:
+        """放入队列，同时监视工作协程
+
+        工作协程异常退出后（如写入输出文件失败）队列不再被消费，这里抛出该异常，
+        避免在满队列上永远等待。
+        """
+        workers = [task for task in tasks if not task.done() or task.exception() is not None]
+        put = asyncio.ensure_future(queue.put(entry))
+        try:
+            while True:
+                for task in workers:
+                    if task.done() and task.exception() is not None:
+                        raise task.exception()
+                if put.done():
+                    return
+                workers = [task for task in workers if not task.done()]
+                if not workers:
+                    raise RuntimeError("工作协程已全部退出，队列无法继续消费")
+                await asyncio.wait([put, *workers], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            if not put.done():
+                put.cancel()
+
+    async def run(self) -> Dict[str, Any]:
+        """执行批量任务
+
+        Returns:
+            运行统计
+        """
+        completed = set()
+        if self.resume:
+            completed = compact_output(self.output_path)
+        self.skipped = len(completed)
+        if completed:
+            logger.info(f"从检查点恢复，跳过已完成的{len(completed)}行")
+
+        self._started = time.monotonic()
+        # 有界队列：边读边处理，内存占用与输入文件大小无关
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.workers * 2)
+        mode = 'a' if self.resume else 'w'
+
+        await startup_pool(warmup=True)
+        try:
+            with open(self.output_path, mode, encoding='utf-8') as out:
+                tasks = [asyncio.ensure_future(self._worker(queue, out)) for _ in range(self.workers)]
+                try:
+                    for entry in iter_input(self.input_path, completed):
+                        await self._put(queue, entry, tasks)
+                    for _ in tasks:
+                        await self._put(queue, None, tasks)
+                    await asyncio.gather(*tasks)
+                finally:
+                    for task in tasks:
+                        task.cancel()
+                    out.flush()
+                    os.fsync(out.fileno())
+        finally:
+            await shutdown_pool()
+
+        return {
+            "skipped": self.skipped,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "elapsed_seconds": round(time.monotonic() - self._started, 1)
+        }
+
+
+def main(argv: Optional[list] = None) -> int:
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="按/api/chat或/api/complete_function_call流程批量处理JSONL文件")
+    parser.add_argument("input", help="输入JSONL文件")
+    parser.add_argument("output", help="输出JSONL文件，兼作检查点")
+    parser.add_argument("--workers", type=int, default=BATCH_DEFAULT_CONCURRENCY, help="并发数")
+    parser.add_argument("--mode", choices=[MODE_CHAT, MODE_FUNCTION_CALL], default=MODE_CHAT,
+                        help="未指定mode的行使用的处理流程")
+    parser.add_argument("--no-resume", action="store_true", help="忽略已有输出，从头开始（会覆盖输出文件）")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    runner = BatchRunner(
+        args.input,
+        args.output,
+        workers=args.workers,
+        mode=args.mode,
+        resume=not args.no_resume
+    )
+    try:
+        stats = asyncio.run(runner.run())
+    except KeyboardInterrupt:
+        logger.warning("任务已中断，重新运行相同命令即可从断点继续")
+        return 130
+
+    print(json.dumps(stats, ensure_ascii=False))
+    return 0 if stats["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""
+批量聊天服务
+
+将一批聊天请求在并发上限内通过共享客户端并发执行，每完成一条立即产出结果（顺序不定），
+批量任务使用低于交互式对话的调度优先级
+"""
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from app.core.async_dashscope_client import AsyncDashscopeClient, get_client
+from app.core.config import BATCH_DEFAULT_CONCURRENCY, BATCH_MAX_CONCURRENCY
+from app.core.errors import DashscopeError
+from app.core.rate_limiter import PRIORITY_BATCH
+from app.models.schemas import ChatRequest
+
+# 获取logger
+logger = logging.getLogger("gongdi-api.batch")
+
+
+def resolve_concurrency(concurrency: Optional[int]) -> int:
+    """将请求的并发数限制在配置范围内"""
+    return max(1, min(concurrency or BATCH_DEFAULT_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+
+
+async def run_chat(
+    client: AsyncDashscopeClient,
+    index: int,
+    request: ChatRequest,
+    priority: int = PRIORITY_BATCH,
+) -> Dict[str, Any]:
+    """执行单条聊天请求，失败时返回错误结果而不抛出异常
+
+    Args:
+        client: 异步客户端
+        index: 请求在批次中的序号
+        request: 聊天请求
+        priority: 调度优先级
+
+    Returns:
+        成功时包含answer，失败时包含error和status
+    """
+    try:
+        messages = client.format_messages(
+            prompt=request.prompt,
+            system_message=request.system_message
+        )
+        response = await client.chat(messages, use_cache=request.use_cache, priority=priority)
+        return {
+            "index": index,
+            "status_code": response['status_code'],
+            "request_id": response['request_id'],
+            "answer": response['choices'][0]['message']['content']
+        }
+    except DashscopeError as e:
+        logger.warning(f"批量请求第{index}条失败: {str(e)}")
+        return {"index": index, "status": e.http_status, "error": str(e)}
+    except Exception as e:
+        logger.error(f"批量请求第{index}条失败: {str(e)}")
+        return {"index": index, "status": 500, "error": str(e)}
+
+
+async def run_chat_batch(
+    requests: List[ChatRequest],
+    concurrency: Optional[int] = None,
+    priority: int = PRIORITY_BATCH,
+) -> AsyncIterator[Dict[str, Any]]:
+    """并发执行一批聊天请求，按完成顺序产出结果
+
+    调用方提前停止迭代（如客户端断开）时取消尚未完成的请求
+
+    Args:
+        requests: 聊天请求列表
+        concurrency: 并发数
+        priority: 调度优先级
+
+    Yields:
+        每条请求的结果，带有index字段
+    """
+    client = get_client()
+    pending: asyncio.Queue = asyncio.Queue()
+    for item in enumerate(requests):
+        pending.put_nowait(item)
+    results: asyncio.Queue = asyncio.Queue()
+
+    async def worker():
+        while True:
+            try:
+                index, request = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await results.put(await run_chat(client, index, request, priority))
+
+    workers = [
+        asyncio.ensure_future(worker())
+        for _ in range(min(resolve_concurrency(concurrency), len(requests)))
+    ]
+    try:
+        for _ in range(len(requests)):
+            yield await results.get()
+    finally:
+        for task in workers:
+            task.cancel()
@@ -0,0 +1,516 @@
+"""
+函数调用服务模块
+
+多步工具调用引擎：模型选择工具 -> 并发执行工具 -> 结果返回模型，循环直到模型给出最终回答
+或超出步数、时间、token预算。/api/function_call、/api/complete_function_call和批量任务共用。
+"""
+import asyncio
+import json
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from app.core.async_dashscope_client import AsyncDashscopeClient, get_client
+from app.core.llm_config import (
+    FUNCTION_CALL_MAX_STEPS,
+    FUNCTION_CALL_MAX_SECONDS,
+    FUNCTION_CALL_TOKEN_BUDGET
+)
+from app.core.rate_limiter import PRIORITY_INTERACTIVE, usage_total_tokens
+from app.core.tool_call_parser import ToolCallAccumulator
+from app.services.tool_executor import ToolExecutor, get_tool_executor
+from app.services.intent_router import get_intent_router
+from app.services.stage_cache import StageCache, get_stage_cache
+from app.services.tool_prefetch import ToolPrefetcher, get_tool_prefetcher
+from app.services.tool_selector import get_tool_selector
+from app.utils.tools import tool_registry
+
+# 获取logger
+logger = logging.getLogger("gongdi-api.function_call")
+
+# 结束原因
+STOP_COMPLETED = "completed"  # 模型给出了最终回答
+STOP_MAX_STEPS = "max_steps"  # 达到步数上限
+STOP_TIME_BUDGET = "time_budget"  # 超出时间预算
+STOP_TOKEN_BUDGET = "token_budget"  # 超出token预算
+STOP_FAST_PATH = "fast_path"  # 意图快速通道直接回答，未调用模型
+
+
+class FunctionCallEngine:
+    """多步工具调用引擎"""
+
+    def __init__(
+        self,
+        client: Optional[AsyncDashscopeClient] = None,
+        executor: Optional[ToolExecutor] = None,
+        max_steps: int = FUNCTION_CALL_MAX_STEPS,
+        max_seconds: float = FUNCTION_CALL_MAX_SECONDS,
+        token_budget: int = FUNCTION_CALL_TOKEN_BUDGET,
+        prefetcher: Optional[ToolPrefetcher] = None,
+        stage_cache: Optional[StageCache] = None,
+    ):
+        """初始化引擎
+
+        Args:
+            client: 异步客户端，默认使用共享客户端
+            executor: 工具执行器，默认使用共享执行器
+            max_steps: 最多调用模型的次数（含最终回答），至少为2
+            max_seconds: 时间预算（秒）
+            token_budget: token预算
+            prefetcher: 工具预取，默认使用共享实例（未启用时为None）
+            stage_cache: 工具执行后的回答缓存，默认使用共享实例（未启用时为None）
+        """
+        self.client = client or get_client()
+        self.executor = executor or get_tool_executor()
+        self.prefetcher = prefetcher or get_tool_prefetcher()
+        self.stage_cache = stage_cache or get_stage_cache()
+        self.max_steps = max(2, max_steps)
+        self.max_seconds = max_seconds
+        self.token_budget = token_budget
+
+    def _budget_exhausted(self, step: int, elapsed: float, total_tokens: int) -> Optional[str]:
+        """检查预算，返回结束原因；第一步总是允许调用工具"""
+        if step == 1:
+            return None
+        if step >= self.max_steps:
+            return STOP_MAX_STEPS
+        if elapsed >= self.max_seconds:
+            return STOP_TIME_BUDGET
+        if total_tokens >= self.token_budget:
+            return STOP_TOKEN_BUDGET
+        return None
+
+    def _stage_key(
+        self,
+        buffer: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]],
+        executed_tools: List[Dict[str, Any]],
+    ) -> Optional[str]:
+        """工具执行后模型请求的阶段缓存键，未启用或不可缓存时返回None"""
+        if self.stage_cache is None or not executed_tools:
+            return None
+        return self.stage_cache.key(
+            self.client.model, self.client.temperature, self.client.max_tokens,
+            buffer, tools, executed_tools
+        )
+
+    async def run(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: List[Dict[str, Any]],
+        use_cache: bool = True,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> Dict[str, Any]:
+        """执行模型->工具->模型循环
+
+        预算用尽时不再提供工具，要求模型根据已有的工具结果直接回答
+
+        Args:
+            messages: 初始消息列表（不会被修改）
+            tools: 规范化后的工具列表（不会被修改）
+            use_cache: 是否使用响应缓存
+            priority: 调度优先级
+
+        Returns:
+            {"status_code", "request_id", "answer", "message", "used_tools", "executed_tools",
+             "steps", "usage", "stop_reason", "elapsed_ms"}
+        """
+        # 整个循环共用一个消息缓冲区，每步只追加新消息
+        buffer = list(messages)
+        executed_tools: List[Dict[str, Any]] = []
+        steps: List[Dict[str, Any]] = []
+        usage = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+        started = time.monotonic()
+
+        # 第一次模型请求的同时预取可能用到的工具
+        query = next((m.get('content') for m in reversed(messages) if m.get('role') == 'user'), None)
+        speculation = None
+        if self.prefetcher is not None and isinstance(query, str):
+            speculation = self.prefetcher.start(query, tools, self.executor)
+
+        try:
+            step = 0
+            while True:
+                step += 1
+                stop_reason = self._budget_exhausted(step, time.monotonic() - started, usage["total_tokens"])
+
+                # 工具结果与之前的请求相同（且数据版本未变）时直接使用缓存的回答
+                stage_key = self._stage_key(buffer, tools if stop_reason is None else None, executed_tools) if use_cache else None
+                cached = self.stage_cache.get(stage_key) if stage_key is not None else None
+
+                model_started = time.monotonic()
+                if cached is not None:
+                    response = {
+                        "status_code": 200,
+                        "request_id": cached['request_id'],
+                        "choices": [{"message": cached['message']}],
+                        "usage": {}
+                    }
+                elif stop_reason is None:
+                    response = await self.client.function_call(buffer, tools, use_cache=use_cache, priority=priority)
+                else:
+                    logger.info(f"工具调用第{step}步触发{stop_reason}，要求模型直接回答")
+                    response = await self.client.chat(buffer, use_cache=use_cache, priority=priority)
+                model_ms = round((time.monotonic() - model_started) * 1000, 1)
+
+                message = response['choices'][0]['message']
+                step_usage = response.get('usage') or {}
+                if stage_key is not None and cached is None:
+                    self.stage_cache.set(stage_key, response['request_id'], message, step_usage)
+                usage["input_tokens"] += step_usage.get('input_tokens') or 0
+                usage["output_tokens"] += step_usage.get('output_tokens') or 0
+                usage["total_tokens"] += usage_total_tokens(step_usage) or 0
+
+                step_info = {
+                    "step": step,
+                    "request_id": response['request_id'],
+                    "model_latency_ms": model_ms,
+                    "usage": step_usage,
+                    "tool_calls": []
+                }
+                if cached is not None:
+                    step_info["stage_cache"] = "hit"
+                steps.append(step_info)
+                buffer.append(message)
+
+                tool_calls = message.get('tool_calls')
+                if stop_reason is not None or not tool_calls:
+                    break
+
+                # 并发执行本轮全部工具调用，第一步优先使用预取结果
+                tools_started = time.monotonic()
+                if step == 1 and self.prefetcher is not None and isinstance(query, str):
+                    self.prefetcher.learn(query, tool_calls)
+                if step == 1 and speculation is not None:
+                    step_executed, tool_results = await speculation.execute_all(tool_calls)
+                else:
+                    step_executed, tool_results = await self.executor.execute_all(tool_calls)
+                step_info["tool_latency_ms"] = round((time.monotonic() - tools_started) * 1000, 1)
+                step_info["tool_calls"] = [item["function_name"] for item in step_executed]
+                for item in step_executed:
+                    item["step"] = step
+                executed_tools.extend(step_executed)
+                buffer.extend(tool_results)
+        finally:
+            if speculation is not None:
+                speculation.discard()
+
+        return {
+            "status_code": response['status_code'],
+            "request_id": response['request_id'],
+            "answer": message.get('content') or '无内容',
+            "message": message,
+            "used_tools": bool(executed_tools),
+            "executed_tools": executed_tools,
+            "steps": steps,
+            "usage": usage,
+            "stop_reason": stop_reason or STOP_COMPLETED,
+            "elapsed_ms": round((time.monotonic() - started) * 1000, 1)
+        }
+
+    def _dispatch(self, tool_call: Dict[str, Any], speculation) -> asyncio.Task:
+        """立即开始执行一个工具调用，有预取时优先使用预取结果"""
+        if speculation is not None:
+            return asyncio.ensure_future(speculation.resolve(tool_call))
+        return asyncio.ensure_future(self.executor.execute(tool_call))
+
+    async def stream(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: List[Dict[str, Any]],
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """流式执行模型->工具->模型循环
+
+        模型输出的tool_calls逐段解析，某个工具调用的参数完整后立即开始执行，
+        与模型剩余的输出并行；最终回答逐段产出
+
+        Args:
+            messages: 初始消息列表（不会被修改）
+            tools: 规范化后的工具列表（不会被修改）
+            priority: 调度优先级
+
+        Yields:
+            事件字典，event字段为：
+                step: 开始第几步 {"step"}
+                delta: 模型输出的文本片段 {"step", "content"}
+                tool_call: 模型选定的工具调用 {"step", "id", "name", "arguments"}
+                tool_start: 工具开始执行 {"step", "id", "name", "at_ms"}
+                tool_result: 工具执行完成 {"step", "at_ms", 执行记录的各字段}
+                at_ms为距请求开始的毫秒数，执行记录中的elapsed_ms为工具执行耗时
+                done: 结束 {"request_id", "answer", "stop_reason", "steps", "usage", "executed_tools", "elapsed_ms"}
+        """
+        buffer = list(messages)
+        executed_tools: List[Dict[str, Any]] = []
+        steps: List[Dict[str, Any]] = []
+        usage = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+        started = time.monotonic()
+
+        query = next((m.get('content') for m in reversed(messages) if m.get('role') == 'user'), None)
+        speculation = None
+        if self.prefetcher is not None and isinstance(query, str):
+            speculation = self.prefetcher.start(query, tools, self.executor)
+
+        pending: List[asyncio.Task] = []
+        try:
+            step = 0
+            while True:
+                step += 1
+                stop_reason = self._budget_exhausted(step, time.monotonic() - started, usage["total_tokens"])
+                yield {"event": "step", "step": step}
+
+                stage_key = self._stage_key(buffer, tools if stop_reason is None else None, executed_tools)
+                cached = self.stage_cache.get(stage_key) if stage_key is not None else None
+                if cached is not None:
+                    source = replay_cached(cached)
+                elif stop_reason is None:
+                    source = self.client.stream_function_call(buffer, tools, priority=priority)
+                else:
+                    logger.info(f"工具调用第{step}步触发{stop_reason}，要求模型直接回答")
+                    source = self.client.stream_chat(buffer, priority=priority)
+
+                model_started = time.monotonic()
+                accumulator = ToolCallAccumulator()
+                parts: List[str] = []
+                request_id = None
+                step_usage: Dict[str, Any] = {}
+                pending = []
+                tools_started = None
+
+                async for chunk in source:
+                    request_id = chunk['request_id'] or request_id
+                    step_usage = chunk['usage'] or step_usage
+                    if chunk['content']:
+                        parts.append(chunk['content'])
+                        yield {"event": "delta", "step": step, "content": chunk['content']}
+                    for call in accumulator.feed(chunk['message'].get('tool_calls')):
+                        if tools_started is None:
+                            tools_started = time.monotonic()
+                        pending.append(self._dispatch(call, speculation if step == 1 else None))
+                        for event in tool_call_events(call, step, started):
+                            yield event
+                for call in accumulator.finish():
+                    if tools_started is None:
+                        tools_started = time.monotonic()
+                    pending.append(self._dispatch(call, speculation if step == 1 else None))
+                    for event in tool_call_events(call, step, started):
+                        yield event
+                model_ms = round((time.monotonic() - model_started) * 1000, 1)
+
+                usage["input_tokens"] += step_usage.get('input_tokens') or 0
+                usage["output_tokens"] += step_usage.get('output_tokens') or 0
+                usage["total_tokens"] += usage_total_tokens(step_usage) or 0
+
+                message: Dict[str, Any] = {"role": "assistant", "content": "".join(parts)}
+                tool_calls = accumulator.tool_calls
+                if tool_calls:
+                    message["tool_calls"] = tool_calls
+                if stage_key is not None and cached is None:
+                    self.stage_cache.set(stage_key, request_id, message, step_usage)
+                step_info = {
+                    "step": step,
+                    "request_id": request_id,
+                    "model_latency_ms": model_ms,
+                    "usage": step_usage,
+                    "tool_calls": []
+                }
+                if cached is not None:
+                    step_info["stage_cache"] = "hit"
+                steps.append(step_info)
+                buffer.append(message)
+
+                if stop_reason is not None or not tool_calls:
+                    break
+
+                if step == 1 and self.prefetcher is not None and isinstance(query, str):
+                    self.prefetcher.learn(query, tool_calls)
+
+                # 工具在模型输出期间已经开始执行，按完成顺序产出结果
+                waiting = set(pending)
+                while waiting:
+                    done, waiting = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        executed, _ = task.result()
+                        executed["step"] = step
+                        yield {"event": "tool_result", **executed, "at_ms": elapsed_ms(started)}
+
+                outcomes = [task.result() for task in pending]
+                step_info["tool_latency_ms"] = round((time.monotonic() - tools_started) * 1000, 1)
+                step_info["tool_calls"] = [executed["function_name"] for executed, _ in outcomes]
+                executed_tools.extend(executed for executed, _ in outcomes)
+                buffer.extend(tool_message for _, tool_message in outcomes)
+                pending = []
+        finally:
+            for task in pending:
+                task.cancel()
+            if speculation is not None:
+                speculation.discard()
+
+        yield {
+            "event": "done",
+            "request_id": request_id,
+            "answer": message.get('content') or '无内容',
+            "used_tools": bool(executed_tools),
+            "executed_tools": executed_tools,
+            "steps": steps,
+            "usage": usage,
+            "stop_reason": stop_reason or STOP_COMPLETED,
+            "elapsed_ms": elapsed_ms(started)
+        }
+
+
+async def replay_cached(cached: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+    """以流式片段的形式产出阶段缓存中的回答"""
+    yield {
+        "request_id": cached['request_id'],
+        "content": cached['message'].get('content') or '',
+        "message": {},
+        "finish_reason": "stop",
+        "usage": {}
+    }
+
+
+def elapsed_ms(started: float) -> float:
+    """距started（time.monotonic()）的毫秒数"""
+    return round((time.monotonic() - started) * 1000, 1)
+
+
+def tool_call_events(call: Dict[str, Any], step: int, started: float) -> List[Dict[str, Any]]:
+    """模型选定一个工具调用并开始执行时的事件（tool_call、tool_start）"""
+    name = call['function']['name']
+    return [
+        {"event": "tool_call", "step": step, "id": call['id'], "name": name,
+         "arguments": call['function'].get('arguments')},
+        {"event": "tool_start", "step": step, "id": call['id'], "name": name, "at_ms": elapsed_ms(started)}
+    ]
+
+
+async def _try_fast_path(query: str, tools: List[Dict[str, Any]], engine: FunctionCallEngine) -> Optional[Dict[str, Any]]:
+    """尝试意图快速通道，不能直接回答时返回None"""
+    router = get_intent_router()
+    if router is None:
+        return None
+    tool_names = [tool['function'].get('name') for tool in tools if isinstance(tool.get('function'), dict)]
+    result = await router.handle(query, tool_names, engine.executor)
+    if result is not None:
+        result.update({"stop_reason": STOP_FAST_PATH, "tool_selection": None})
+    return result
+
+
+def _select_tools(query: str, tools: List[Dict[str, Any]]):
+    """按问题相关度预选工具，返回(工具列表, 预选信息)"""
+    selector = get_tool_selector()
+    if selector is None:
+        return tools, None
+    return selector.select(query, tools)
+
+
+async def run_function_call(
+    query: str,
+    tools: Optional[List[Dict[str, Any]]] = None,
+    use_cache: bool = True,
+    priority: int = PRIORITY_INTERACTIVE,
+    engine: Optional[FunctionCallEngine] = None,
+    fast_path: bool = True,
+) -> Dict[str, Any]:
+    """对单个问题执行多步工具调用
+
+    高频问题先尝试意图快速通道，直接调用工具并用模板回答；
+    工具较多时按问题相关度预选，只把相关工具发给模型
+
+    Args:
+        query: 用户问题
+        tools: 请求中的工具列表，为空时使用默认工具
+        use_cache: 是否使用响应缓存
+        priority: 调度优先级
+        engine: 工具调用引擎，默认按配置创建
+        fast_path: 是否允许走意图快速通道
+
+    Returns:
+        FunctionCallEngine.run的结果，附加预选信息tool_selection；
+        快速通道回答时stop_reason为fast_path，并附加intent
+    """
+    engine = engine or FunctionCallEngine()
+    messages = [{"role": "user", "content": query}]
+    tools = tool_registry.normalize(tools)
+
+    if fast_path:
+        result = await _try_fast_path(query, tools, engine)
+        if result is not None:
+            return result
+
+    tools, selection = _select_tools(query, tools)
+    result = await engine.run(messages, tools, use_cache=use_cache, priority=priority)
+    result["tool_selection"] = selection
+    return result
+
+
+async def stream_function_call(
+    query: str,
+    tools: Optional[List[Dict[str, Any]]] = None,
+    priority: int = PRIORITY_INTERACTIVE,
+    engine: Optional[FunctionCallEngine] = None,
+    fast_path: bool = True,
+) -> AsyncIterator[Dict[str, Any]]:
+    """流式执行单个问题的函数调用流程
+
+    Yields:
+        FunctionCallEngine.stream的事件，done事件附加tool_selection；
+        快速通道回答时同样产出tool_call、tool_result、delta和done事件
+    """
+    engine = engine or FunctionCallEngine()
+    messages = [{"role": "user", "content": query}]
+    tools = tool_registry.normalize(tools)
+    started = time.monotonic()
+
+    if fast_path:
+        result = await _try_fast_path(query, tools, engine)
+        if result is not None:
+            for executed in result["executed_tools"]:
+                call = {"id": executed["id"], "function": {
+                    "name": executed["function_name"],
+                    "arguments": json.dumps(executed.get("arguments", {}), ensure_ascii=False)
+                }}
+                for event in tool_call_events(call, 0, started):
+                    # 快速通道的工具已经执行完，开始时间按执行耗时倒推
+                    if event["event"] == "tool_start":
+                        event["at_ms"] = max(0.0, round(event["at_ms"] - executed.get("elapsed_ms", 0), 1))
+                    yield event
+                yield {"event": "tool_result", **executed, "at_ms": elapsed_ms(started)}
+            yield {"event": "delta", "step": 0, "content": result["answer"]}
+            result.pop("message", None)
+            yield {"event": "done", **result}
+            return
+
+    tools, selection = _select_tools(query, tools)
+    async for event in engine.stream(messages, tools, priority=priority):
+        if event["event"] == "done":
+            event["tool_selection"] = selection
+        yield event
+
+
+async def complete_function_call(
+    query: str,
+    tools: Optional[List[Dict[str, Any]]] = None,
+    use_cache: bool = True,
+    priority: int = PRIORITY_INTERACTIVE,
+    engine: Optional[FunctionCallEngine] = None,
+    fast_path: bool = True,
+) -> Dict[str, Any]:
+    """执行完整的函数调用流程，返回/api/complete_function_call的响应结构
+
+    Returns:
+        {"status", "answer", "used_tools", "stop_reason", "steps", "usage", "executed_tools"}
+    """
+    result = await run_function_call(query, tools, use_cache, priority, engine, fast_path)
+    response = {
+        "status": "completed",
+        "answer": result["answer"],
+        "used_tools": result["used_tools"],
+        "stop_reason": result["stop_reason"],
+        "steps": result["steps"],
+        "usage": result["usage"]
+    }
+    if result["used_tools"]:
+        response["executed_tools"] = result["executed_tools"]
+    return response
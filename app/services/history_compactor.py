@@ -0,0 +1,296 @@
+"""
+多轮对话历史压缩
+
+长时间的巡检对话会让每轮请求都带上全部历史，越来越慢、越来越贵，最终超出模型上下文。
+这里按本地估算的token数为每轮请求的提示设定预算：超出时从最早的轮次开始丢弃，
+被丢弃的轮次用摘要代替。摘要在后台生成并按内容哈希缓存，不在请求路径上；
+还没有摘要时使用已有的较短前缀的摘要（或直接丢弃）。系统消息和本轮问题总是保留，
+历史按轮次（一条用户消息及其后的回答、工具调用和工具结果）整体丢弃，工具调用不会与其结果分开。
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.core.async_dashscope_client import AsyncDashscopeClient, get_client
+from app.core.llm_config import (
+    HISTORY_COMPACTION_ENABLED,
+    HISTORY_PROMPT_BUDGET,
+    HISTORY_COMPACTION_CHUNK_TURNS,
+    HISTORY_SUMMARY_ENABLED,
+    HISTORY_SUMMARY_MAX_TOKENS,
+    HISTORY_SUMMARY_CACHE_SIZE
+)
+from app.core.rate_limiter import PRIORITY_BATCH
+from app.core.token_estimator import MESSAGE_OVERHEAD_TOKENS, message_tokens
+
+# 获取logger
+logger = logging.getLogger("gongdi-api.history")
+
+SUMMARY_PROMPT = (
+    "请把下面建筑工地助手与用户的对话压缩成简洁的摘要，保留人名、数量、地点、时间、结论和未完成的事项，"
+    "不要添加对话中没有的信息。"
+)
+SUMMARY_PREFIX = "之前对话的摘要："
+
+# 压缩结果中的摘要状态
+SUMMARY_HIT = "hit"  # 使用了覆盖全部丢弃轮次的摘要
+SUMMARY_PARTIAL = "partial"  # 使用了较短前缀的摘要，其余丢弃的轮次正在后台摘要
+SUMMARY_PENDING = "pending"  # 还没有可用的摘要，丢弃的轮次正在后台摘要
+
+
+def split_turns(history: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """按轮次切分历史：每轮从一条用户消息开始，包含其后的回答、工具调用和工具结果"""
+    turns: List[List[Dict[str, Any]]] = []
+    for message in history:
+        if message.get("role") == "user" or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+    return turns
+
+
+def prefix_keys(turns: List[List[Dict[str, Any]]]) -> List[str]:
+    """每个轮次前缀的内容哈希，keys[k]对应前k轮"""
+    digest = hashlib.sha256()
+    keys = [digest.hexdigest()]
+    for turn in turns:
+        for message in turn:
+            digest.update(json.dumps(
+                {"role": message.get("role"), "content": message.get("content"), "tool_calls": message.get("tool_calls")},
+                ensure_ascii=False, sort_keys=True
+            ).encode("utf-8"))
+            digest.update(b"\n")
+        keys.append(digest.hexdigest())
+    return keys
+
+
+def render_turns(turns: List[List[Dict[str, Any]]]) -> str:
+    """把轮次转成摘要请求中的对话文本"""
+    names = {"user": "用户", "assistant": "助手", "tool": "工具结果"}
+    lines = []
+    for turn in turns:
+        for message in turn:
+            content = message.get("content") or ""
+            if message.get("tool_calls"):
+                calls = ", ".join(
+                    f"{call['function'].get('name')}({call['function'].get('arguments') or ''})"
+                    for call in message["tool_calls"]
+                )
+                content = f"{content}（调用工具: {calls}）".strip()
+            if content:
+                lines.append(f"{names.get(message.get('role'), message.get('role'))}: {content}")
+    return "\n".join(lines)
+
+
+class HistoryCompactor:
+    """多轮对话历史压缩"""
+
+    def __init__(
+        self,
+        client: Optional[AsyncDashscopeClient] = None,
+        budget: int = HISTORY_PROMPT_BUDGET,
+        chunk_turns: int = HISTORY_COMPACTION_CHUNK_TURNS,
+        summarize: bool = HISTORY_SUMMARY_ENABLED,
+        summary_max_tokens: int = HISTORY_SUMMARY_MAX_TOKENS,
+        cache_size: int = HISTORY_SUMMARY_CACHE_SIZE,
+    ):
+        """初始化历史压缩
+
+        Args:
+            client: 生成摘要使用的异步客户端，默认使用共享客户端
+            budget: 提示（系统消息+历史+本轮问题）的token预算
+            chunk_turns: 丢弃的轮数按该值向上取整
+            summarize: 是否为丢弃的轮次生成摘要
+            summary_max_tokens: 摘要的最大token数
+            cache_size: 最多缓存的摘要数
+        """
+        self._client = client
+        self.budget = budget
+        self.chunk_turns = max(1, chunk_turns)
+        self.summarize = summarize
+        self.summary_max_tokens = summary_max_tokens
+        self.cache_size = cache_size
+
+        # 轮次前缀的内容哈希 -> 摘要
+        self._summaries: "OrderedDict[str, str]" = OrderedDict()
+        self._pending: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.requests = 0
+        self.compacted = 0
+        self.dropped_turns = 0
+        self.tokens_saved = 0
+        self.summary_hits = 0
+        self.summaries_generated = 0
+        self.summary_failures = 0
+
+    @property
+    def client(self) -> AsyncDashscopeClient:
+        return self._client or get_client()
+
+    def _get_summary(self, key: str) -> Optional[str]:
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is not None:
+                self._summaries.move_to_end(key)
+            return summary
+
+    def _set_summary(self, key: str, summary: str) -> None:
+        with self._lock:
+            self._summaries[key] = summary
+            self._summaries.move_to_end(key)
+            while len(self._summaries) > self.cache_size:
+                self._summaries.popitem(last=False)
+
+    def compact(self, messages: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """按token预算压缩消息列表，需在事件循环中调用（摘要在后台生成）
+
+        Args:
+            messages: 系统消息 + 历史消息 + 本轮问题（及本轮的工具调用和结果，不会被修改）
+
+        Returns:
+            (压缩后的消息列表, 压缩信息)
+        """
+        total = sum(message_tokens(m) for m in messages)
+        info: Dict[str, Any] = {"original_tokens": total, "tokens": total, "dropped_turns": 0, "summary": None}
+        with self._lock:
+            self.requests += 1
+        if total <= self.budget or len(messages) < 3:
+            return messages, info
+
+        # 开头的系统消息和进行中的本轮（最后一条用户消息及其后尚未得到回答的工具调用）总是保留
+        head = 0
+        while head < len(messages) - 1 and messages[head].get("role") == "system":
+            head += 1
+        tail = next(
+            (i for i in range(len(messages) - 1, head - 1, -1) if messages[i].get("role") == "user"),
+            len(messages) - 1
+        )
+        system, history, current = messages[:head], messages[head:tail], messages[tail:]
+        turns = split_turns(history)
+        if not turns:
+            return messages, info
+
+        fixed = sum(message_tokens(m) for m in system) + sum(message_tokens(m) for m in current)
+        reserve = self.summary_max_tokens + MESSAGE_OVERHEAD_TOKENS if self.summarize else 0
+        turn_tokens = [sum(message_tokens(m) for m in turn) for turn in turns]
+
+        # 最少丢弃多少轮才能放进预算，再按chunk_turns取整
+        remaining = sum(turn_tokens)
+        dropped = 0
+        while dropped < len(turns) and fixed + reserve + remaining > self.budget:
+            remaining -= turn_tokens[dropped]
+            dropped += 1
+        dropped = min(len(turns), -(-dropped // self.chunk_turns) * self.chunk_turns)
+
+        summary = None
+        if self.summarize:
+            keys = prefix_keys(turns)
+            summary = self._get_summary(keys[dropped])
+            if summary is not None:
+                info["summary"] = SUMMARY_HIT
+            else:
+                # 使用已有的最长前缀摘要，同时在后台摘要到当前丢弃的位置
+                base = next((k for k in range(dropped - 1, 0, -1) if self._get_summary(keys[k]) is not None), 0)
+                base_summary = self._get_summary(keys[base]) if base else None
+                summary = base_summary
+                info["summary"] = SUMMARY_PARTIAL if base_summary else SUMMARY_PENDING
+                self._schedule_summary(keys[dropped], base_summary, turns[base:dropped])
+
+        compacted = [dict(m) for m in system]
+        if summary:
+            if compacted:
+                compacted[-1]["content"] = f"{compacted[-1].get('content') or ''}\n\n{SUMMARY_PREFIX}{summary}"
+            else:
+                compacted.append({"role": "system", "content": f"{SUMMARY_PREFIX}{summary}"})
+        for turn in turns[dropped:]:
+            compacted.extend(turn)
+        compacted.extend(current)
+
+        tokens = sum(message_tokens(m) for m in compacted)
+        info.update({"tokens": tokens, "dropped_turns": dropped})
+        with self._lock:
+            self.compacted += 1
+            self.dropped_turns += dropped
+            self.tokens_saved += max(0, total - tokens)
+            if info["summary"] == SUMMARY_HIT:
+                self.summary_hits += 1
+        logger.debug(f"历史压缩: 丢弃{dropped}轮，{total} -> {tokens} tokens，摘要{info['summary']}")
+        return compacted, info
+
+    def _schedule_summary(self, key: str, base_summary: Optional[str], turns: List[List[Dict[str, Any]]]) -> None:
+        """在后台生成摘要，同一个前缀同时只生成一次"""
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+        task = asyncio.ensure_future(self._summarize(key, base_summary, turns))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _summarize(self, key: str, base_summary: Optional[str], turns: List[List[Dict[str, Any]]]) -> None:
+        content = render_turns(turns)
+        if base_summary:
+            content = f"{SUMMARY_PREFIX}{base_summary}\n\n之后的对话：\n{content}"
+        try:
+            response = await self.client.chat(
+                [{"role": "system", "content": SUMMARY_PROMPT}, {"role": "user", "content": content}],
+                max_tokens=self.summary_max_tokens,
+                priority=PRIORITY_BATCH
+            )
+            summary = (response['choices'][0]['message'].get('content') or '').strip()
+            if summary:
+                self._set_summary(key, summary)
+                with self._lock:
+                    self.summaries_generated += 1
+        except Exception as e:
+            with self._lock:
+                self.summary_failures += 1
+            logger.warning(f"生成对话摘要失败: {str(e)}")
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取压缩统计"""
+        with self._lock:
+            return {
+                "budget": self.budget,
+                "requests": self.requests,
+                "compacted": self.compacted,
+                "dropped_turns": self.dropped_turns,
+                "tokens_saved": self.tokens_saved,
+                "summary_hits": self.summary_hits,
+                "summaries_generated": self.summaries_generated,
+                "summary_failures": self.summary_failures,
+                "summaries_cached": len(self._summaries),
+                "summaries_pending": len(self._pending)
+            }
+
+
+# 进程内共享的历史压缩
+_shared_compactor: Optional[HistoryCompactor] = None
+
+
+def get_history_compactor() -> Optional[HistoryCompactor]:
+    """获取进程内共享的历史压缩，未启用时返回None"""
+    global _shared_compactor
+    if not HISTORY_COMPACTION_ENABLED:
+        return None
+    if _shared_compactor is None:
+        _shared_compactor = HistoryCompactor()
+    return _shared_compactor
+
+
+def compact_history(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """按共享配置压缩多轮对话消息，未启用时原样返回"""
+    compactor = get_history_compactor()
+    if compactor is None:
+        return messages
+    return compactor.compact(messages)[0]
@@ -0,0 +1,402 @@
+"""
+意图快速通道
+
+"工地上多少工人在场"这类高频问题走完整的函数调用流程需要调用两次模型（选择工具、根据结果回答），
+而答案只是一次count_workers("在岗")查询。这里在函数调用流程之前按规则匹配意图：
+匹配置信度足够时直接执行对应工具并用模板生成回答，否则（或工具执行失败时）交给完整的模型流程。
+
+置信度为匹配片段占问题（去掉标点和口语填充词后）的比例，问题中包含规则没覆盖的内容时置信度下降。
+含否定词（"不在岗的工人有多少"）或连词（"北京和上海的天气"）的问题不走快速通道；
+天气规则只识别已知城市名，城市之外的前缀（"我想知道北京的天气"中的"我想知道"）不计入匹配片段。
+规则可以通过INTENT_RULES_PATH指定的JSON文件追加或覆盖（按name）：
+    [{"name": "...", "patterns": ["正则"], "tool": "工具名",
+      "arguments": {"参数": "固定值或{分组名}"}, "slots": {"分组名": {"原文": "参数值"}},
+      "template": "用{参数}和{结果字段}格式化的回答", "min_confidence": 0.8}]
+"""
+import json
+import logging
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+from app.core.llm_config import (
+    INTENT_FAST_PATH_ENABLED,
+    INTENT_MIN_CONFIDENCE,
+    INTENT_MAX_QUERY_LENGTH,
+    INTENT_RULES_PATH
+)
+
+# 获取logger
+logger = logging.getLogger("gongdi-api.intent")
+
+# 去掉的标点和口语填充词，不计入置信度
+_FILLER_RE = re.compile(
+    r"[\s，,。.！!？?、~～]|请问|帮我查一下|帮我查查|帮我看看|查一下|看一下|一下|工地上|工地里|现场|现在|目前|当前|今天|吗|呢|啊|呀|吧"
+)
+
+# 包含这些词的问题需要推理或超出工具能力，直接交给模型：
+# 否定词会反转槽位的含义，连词说明问题涉及多个对象，规则都只能取到其中一个
+_ESCAPE_RE = re.compile(
+    r"为什么|怎么办|如果|假如|明天|后天|昨天|上周|下周|上个月|下个月|趋势|对比|比较|分析|建议|预测|并且|而且|还有|以及|同时"
+    r"|不|没|未|非|无|和|与|跟"
+)
+
+# 天气规则识别的城市，地点槽位只取这些城市名，避免把问题前缀当作地点
+KNOWN_CITIES = [
+    "北京", "上海", "天津", "重庆", "广州", "深圳", "杭州", "南京", "苏州", "无锡", "宁波", "武汉", "成都",
+    "西安", "郑州", "长沙", "合肥", "济南", "青岛", "沈阳", "大连", "长春", "哈尔滨", "石家庄", "太原",
+    "呼和浩特", "南昌", "福州", "厦门", "南宁", "海口", "贵阳", "昆明", "拉萨", "兰州", "西宁", "银川",
+    "乌鲁木齐", "东莞", "佛山", "珠海", "温州", "常州", "徐州", "烟台", "唐山"
+]
+_CITY_RE = re.compile("|".join(sorted(KNOWN_CITIES, key=len, reverse=True)))
+
+Template = Union[str, Callable[[Dict[str, Any], Any], str]]
+
+
+class IntentRule:
+    """一条意图规则：正则匹配问题，映射到工具调用和回答模板"""
+
+    def __init__(
+        self,
+        name: str,
+        patterns: Iterable[str],
+        tool: str,
+        template: Template,
+        arguments: Optional[Dict[str, Any]] = None,
+        slots: Optional[Dict[str, Dict[str, Any]]] = None,
+        min_confidence: Optional[float] = None,
+    ):
+        """初始化规则
+
+        Args:
+            name: 意图名称
+            patterns: 正则表达式列表，命名分组作为槽位
+            tool: 工具名称
+            template: 回答模板，字符串用参数和结果字段格式化，也可以是(参数, 结果)->回答的函数
+            arguments: 工具参数，字符串值中的{分组名}会被槽位值替换
+            slots: 槽位原文到参数值的映射，如{"status": {"在场": "在岗"}}
+            min_confidence: 该规则的置信度阈值，默认使用全局阈值
+        """
+        self.name = name
+        self.patterns = [re.compile(pattern) for pattern in patterns]
+        self.tool = tool
+        self.template = template
+        self.arguments = arguments or {}
+        self.slots = slots or {}
+        self.min_confidence = min_confidence
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "IntentRule":
+        """从JSON配置创建规则"""
+        return cls(
+            name=data["name"],
+            patterns=data["patterns"],
+            tool=data["tool"],
+            template=data["template"],
+            arguments=data.get("arguments"),
+            slots=data.get("slots"),
+            min_confidence=data.get("min_confidence")
+        )
+
+    def match(self, text: str) -> Optional["IntentMatch"]:
+        """匹配规范化后的问题，返回置信度最高的匹配"""
+        best = None
+        for pattern in self.patterns:
+            found = pattern.search(text)
+            if not found:
+                continue
+            confidence = (found.end() - found.start()) / len(text)
+            if best is None or confidence > best[0]:
+                best = (confidence, found)
+        if best is None:
+            return None
+
+        confidence, found = best
+        values = {
+            key: self.slots.get(key, {}).get(value, value)
+            for key, value in found.groupdict().items() if value is not None
+        }
+        arguments = {}
+        for key, value in self.arguments.items():
+            if isinstance(value, str) and "{" in value:
+                try:
+                    value = value.format(**values)
+                except KeyError:
+                    # 槽位未匹配到时不传该参数，使用工具默认值
+                    continue
+            arguments[key] = value
+        return IntentMatch(self, round(confidence, 3), arguments)
+
+    def render(self, arguments: Dict[str, Any], result: Any) -> str:
+        """根据工具结果生成回答"""
+        if callable(self.template):
+            return self.template(arguments, result)
+        fields = dict(arguments)
+        if isinstance(result, dict):
+            fields.update(result)
+        return self.template.format(**fields)
+
+
+class IntentMatch:
+    """意图匹配结果"""
+
+    def __init__(self, rule: IntentRule, confidence: float, arguments: Dict[str, Any]):
+        self.rule = rule
+        self.confidence = confidence
+        self.arguments = arguments
+
+
+_WEEKDAYS = {
+    "Monday": "星期一", "Tuesday": "星期二", "Wednesday": "星期三", "Thursday": "星期四",
+    "Friday": "星期五", "Saturday": "星期六", "Sunday": "星期日"
+}
+
+
+def _worker_count_answer(arguments: Dict[str, Any], result: Dict[str, Any]) -> str:
+    if result["status"] == "全部":
+        return f"工地上登记的工人共有{result['count']}人。"
+    return f"目前{result['status']}的工人共有{result['count']}人。"
+
+
+def _worker_list_answer(arguments: Dict[str, Any], result: Dict[str, Any]) -> str:
+    label = "登记" if result["status"] == "全部" else result["status"]
+    if not result["workers"]:
+        return f"目前没有{label}的工人。"
+    names = "、".join(f"{worker['name']}（{worker['position']}）" for worker in result["workers"])
+    return f"目前{label}的工人共{result['count']}人：{names}。"
+
+
+def _time_answer(arguments: Dict[str, Any], result: Dict[str, Any]) -> str:
+    weekday = _WEEKDAYS.get(result["weekday"], result["weekday"])
+    return f"现在是{result['date']} {result['time']}，{weekday}。"
+
+
+_WORKER_STATUS_SLOTS = {
+    "status": {
+        "在场": "在岗", "在岗": "在岗", "上班": "在岗", "出勤": "在岗",
+        "请假": "请假", "休假": "请假",
+        "离场": "已离场", "已离场": "已离场",
+        "一共": "全部", "总共": "全部", "全部": "全部", "所有": "全部"
+    }
+}
+
+_STATUS = r"(?P<status>在场|在岗|上班|出勤|请假|休假|已离场|离场)"
+
+# 内置规则
+DEFAULT_INTENT_RULES = [
+    IntentRule(
+        name="worker_count",
+        patterns=[
+            r"(?:一共|总共)?有?(?:多少|几个|几名|几位)(?:个|名|位)?(?:工人|人)" + _STATUS + r"了?",
+            _STATUS + r"的?(?:工人|人)(?:数量|人数|数)?(?:有|是|一共|共)?(?:多少|几个|几名|几位)(?:个|名|位|人)?",
+            r"(?P<status>一共|总共|全部|所有)的?(?:工人|人)?有?(?:多少|几个|几名)(?:个|名|位)?(?:工人|人)?",
+        ],
+        tool="count_workers",
+        arguments={"status": "{status}"},
+        slots=_WORKER_STATUS_SLOTS,
+        template=_worker_count_answer
+    ),
+    IntentRule(
+        name="worker_list",
+        patterns=[
+            r"(?:有)?哪些(?:工人|人)" + _STATUS + r"了?",
+            _STATUS + r"的?(?:工人|人)(?:有|是)?(?:哪些|谁)",
+        ],
+        tool="get_workers",
+        arguments={"status": "{status}"},
+        slots=_WORKER_STATUS_SLOTS,
+        template=_worker_list_answer
+    ),
+    IntentRule(
+        name="current_time",
+        patterns=[
+            r"(?:是)?(?:几点|什么时间|什么时候)(?:了|钟)?",
+            r"(?:是)?(?:几号|星期几|周几|礼拜几|什么日子|几月几号)",
+        ],
+        tool="get_current_time",
+        template=_time_answer
+    ),
+    IntentRule(
+        name="weather",
+        patterns=[
+            r"(?P<location>" + _CITY_RE.pattern + r")市?的?天气(?:怎么样|如何|情况|咋样)?",
+        ],
+        tool="get_current_weather",
+        arguments={"location": "{location}"},
+        template="{location}天气{condition}，气温{temp}，湿度{humidity}，{wind}。"
+    ),
+]
+
+
+def normalize_query(query: str) -> str:
+    """去掉标点和口语填充词"""
+    return _FILLER_RE.sub("", query)
+
+
+class IntentRouter:
+    """意图快速通道"""
+
+    def __init__(
+        self,
+        rules: Optional[List[IntentRule]] = None,
+        min_confidence: float = INTENT_MIN_CONFIDENCE,
+        max_query_length: int = INTENT_MAX_QUERY_LENGTH,
+    ):
+        """初始化意图快速通道
+
+        Args:
+            rules: 规则列表，默认使用内置规则
+            min_confidence: 置信度阈值
+            max_query_length: 超过该长度（规范化后）的问题直接交给模型
+        """
+        self.rules: Dict[str, IntentRule] = {}
+        for rule in (DEFAULT_INTENT_RULES if rules is None else rules):
+            self.add_rule(rule)
+        self.min_confidence = min_confidence
+        self.max_query_length = max_query_length
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.requests = 0
+        self.absorbed = 0
+        self.low_confidence = 0
+        self.tool_errors = 0
+        self.by_intent: Counter = Counter()
+
+    def add_rule(self, rule: IntentRule) -> None:
+        """添加规则，同名规则会被替换"""
+        self.rules[rule.name] = rule
+
+    def load_rules(self, path: str) -> int:
+        """从JSON文件加载规则
+
+        Returns:
+            加载的规则数
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            items = json.load(f)
+        for item in items:
+            self.add_rule(IntentRule.from_dict(item))
+        logger.info(f"从{path}加载了{len(items)}条意图规则")
+        return len(items)
+
+    def match(self, query: str, tool_names: Optional[Iterable[str]] = None) -> Optional[IntentMatch]:
+        """匹配意图
+
+        Args:
+            query: 用户问题
+            tool_names: 本次请求可用的工具名称，为None时不限制
+
+        Returns:
+            置信度最高的匹配（可能低于阈值），没有匹配时返回None
+        """
+        text = normalize_query(query)
+        # 城市名中的字（如"无锡"的"无"）不作为否定词
+        if not text or len(text) > self.max_query_length or _ESCAPE_RE.search(_CITY_RE.sub("", text)):
+            return None
+
+        available = set(tool_names) if tool_names is not None else None
+        best = None
+        for rule in self.rules.values():
+            if available is not None and rule.tool not in available:
+                continue
+            matched = rule.match(text)
+            if matched and (best is None or matched.confidence > best.confidence):
+                best = matched
+        return best
+
+    async def handle(self, query: str, tool_names: Iterable[str], executor) -> Optional[Dict[str, Any]]:
+        """尝试直接回答问题
+
+        Args:
+            query: 用户问题
+            tool_names: 本次请求可用的工具名称
+            executor: 工具执行器
+
+        Returns:
+            与FunctionCallEngine.run相同结构的结果，不能直接回答时返回None
+        """
+        started = time.monotonic()
+        matched = self.match(query, tool_names)
+        with self._lock:
+            self.requests += 1
+        if matched is None:
+            return None
+
+        rule = matched.rule
+        threshold = rule.min_confidence if rule.min_confidence is not None else self.min_confidence
+        if matched.confidence < threshold:
+            with self._lock:
+                self.low_confidence += 1
+            logger.debug(f"意图{rule.name}置信度{matched.confidence}低于阈值{threshold}，交给模型")
+            return None
+
+        tool_call = {
+            "id": f"intent_{uuid.uuid4().hex[:12]}",
+            "type": "function",
+            "function": {"name": rule.tool, "arguments": json.dumps(matched.arguments, ensure_ascii=False)}
+        }
+        executed, _ = await executor.execute(tool_call)
+        answer = None
+        if executed["success"]:
+            try:
+                answer = rule.render(executed.get("arguments", {}), executed["result"])
+            except Exception as e:
+                logger.warning(f"意图{rule.name}回答模板渲染失败: {str(e)}")
+        if answer is None:
+            with self._lock:
+                self.tool_errors += 1
+            logger.info(f"意图{rule.name}的工具调用失败，交给模型: {executed.get('error')}")
+            return None
+
+        with self._lock:
+            self.absorbed += 1
+            self.by_intent[rule.name] += 1
+        logger.debug(f"意图快速通道: {rule.name}，置信度{matched.confidence}")
+
+        executed["step"] = 0
+        return {
+            "status_code": 200,
+            "request_id": None,
+            "answer": answer,
+            "message": {"role": "assistant", "content": answer},
+            "used_tools": True,
+            "executed_tools": [executed],
+            "steps": [],
+            "usage": {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0},
+            "intent": {"name": rule.name, "confidence": matched.confidence},
+            "elapsed_ms": round((time.monotonic() - started) * 1000, 1)
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """获取快速通道统计"""
+        with self._lock:
+            return {
+                "rules": list(self.rules),
+                "min_confidence": self.min_confidence,
+                "requests": self.requests,
+                "absorbed": self.absorbed,
+                "absorb_rate": round(self.absorbed / self.requests, 4) if self.requests else 0.0,
+                "low_confidence": self.low_confidence,
+                "tool_errors": self.tool_errors,
+                "by_intent": dict(self.by_intent)
+            }
+
+
+# 进程内共享的意图快速通道
+_shared_router: Optional[IntentRouter] = None
+
+
+def get_intent_router() -> Optional[IntentRouter]:
+    """获取进程内共享的意图快速通道，未启用时返回None"""
+    global _shared_router
+    if not INTENT_FAST_PATH_ENABLED:
+        return None
+    if _shared_router is None:
+        _shared_router = IntentRouter()
+        if INTENT_RULES_PATH:
+            _shared_router.load_rules(INTENT_RULES_PATH)
+    return _shared_router
@@ -0,0 +1,353 @@
+"""
+多轮对话会话存储
+
+客户端每轮都上传完整历史时，请求体和校验开销随轮数线性增长。这里在服务端按session_id
+保存每个会话的消息日志，客户端每轮只发送新问题，服务端追加本轮的问答。
+内存中按最近使用做LRU，超出会话数或占用上限时淘汰；配置SQLite路径后消息同时追加写入磁盘，
+被淘汰或服务重启后的会话可以从磁盘恢复。会话空闲超过TTL后过期删除。
+"""
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from app.core.config import (
+    SESSION_TTL,
+    SESSION_MAX_SESSIONS,
+    SESSION_MAX_BYTES,
+    SESSION_SQLITE_PATH
+)
+
+# 获取logger
+logger = logging.getLogger("gongdi-api.session")
+
+# 磁盘上过期会话的清理间隔（秒）
+PURGE_INTERVAL = 60
+
+
+class SessionNotFoundError(KeyError):
+    """会话不存在或已过期"""
+
+
+class Session:
+    """一个会话的消息日志"""
+
+    def __init__(
+        self,
+        session_id: str,
+        system_message: Optional[str] = None,
+        messages: Optional[List[Dict[str, str]]] = None,
+        created_at: Optional[float] = None,
+        updated_at: Optional[float] = None,
+    ):
+        now = time.time()
+        self.session_id = session_id
+        self.system_message = system_message
+        self.messages: List[Dict[str, str]] = messages or []
+        self.created_at = created_at or now
+        self.updated_at = updated_at or self.created_at
+        self.size = sum(message_size(m) for m in self.messages) + len((system_message or "").encode("utf-8"))
+
+    def build_messages(self, prompt: str) -> List[Dict[str, str]]:
+        """组装发送给模型的消息：系统消息 + 历史消息 + 本轮问题"""
+        messages = []
+        if self.system_message:
+            messages.append({"role": "system", "content": self.system_message})
+        messages.extend(self.messages)
+        messages.append({"role": "user", "content": prompt})
+        return messages
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "system_message": self.system_message,
+            "messages": list(self.messages),
+            "created_at": self.created_at,
+            "updated_at": self.updated_at
+        }
+
+
+def message_size(message: Dict[str, str]) -> int:
+    """消息占用的字节数（按内容估算）"""
+    return len(message.get("content", "").encode("utf-8")) + len(message.get("role", ""))
+
+
+class SQLiteSessionLog:
+    """会话消息的SQLite追加日志，消息只追加不修改"""
+
+    def __init__(self, path: str):
+        """初始化会话日志
+
+        Args:
+            path: SQLite数据库文件路径
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, system_message TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_messages ("
+            "session_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL, "
+            "PRIMARY KEY (session_id, seq))"
+        )
+        self._conn.commit()
+
+    def create(self, session: Session) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO sessions (session_id, system_message, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (session.session_id, session.system_message, session.created_at, session.updated_at)
+            )
+            self._conn.commit()
+
+    def append(self, session_id: str, start_seq: int, messages: List[Dict[str, str]], updated_at: float) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO session_messages (session_id, seq, role, content) VALUES (?, ?, ?, ?)",
+                [(session_id, start_seq + i, m["role"], m["content"]) for i, m in enumerate(messages)]
+            )
+            self._conn.execute("UPDATE sessions SET updated_at = ? WHERE session_id = ?", (updated_at, session_id))
+            self._conn.commit()
+
+    def load(self, session_id: str) -> Optional[Session]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT system_message, created_at, updated_at FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            messages = [
+                {"role": role, "content": content}
+                for role, content in self._conn.execute(
+                    "SELECT role, content FROM session_messages WHERE session_id = ? ORDER BY seq", (session_id,)
+                )
+            ]
+        return Session(session_id, row[0], messages, row[1], row[2])
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM session_messages WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+    def purge(self, before: float) -> int:
+        """删除before之前不再活动的会话，返回删除的会话数"""
+        with self._lock:
+            expired = [row[0] for row in self._conn.execute(
+                "SELECT session_id FROM sessions WHERE updated_at < ?", (before,)
+            )]
+            for session_id in expired:
+                self._conn.execute("DELETE FROM session_messages WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (before,))
+            self._conn.commit()
+        return len(expired)
+
+
+class SessionStore:
+    """会话存储：内存LRU + 可选的SQLite追加日志"""
+
+    def __init__(
+        self,
+        ttl: float = SESSION_TTL,
+        max_sessions: int = SESSION_MAX_SESSIONS,
+        max_bytes: int = SESSION_MAX_BYTES,
+        log: Optional[SQLiteSessionLog] = None,
+    ):
+        """初始化会话存储
+
+        Args:
+            ttl: 会话空闲过期时间（秒）
+            max_sessions: 内存中最多保留的会话数
+            max_bytes: 内存中会话消息的最大占用
+            log: SQLite追加日志，为None时会话只保存在内存，被淘汰即丢失
+        """
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.log = log
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_purge = time.time()
+
+        # 统计信息
+        self.current_bytes = 0
+        self.created = 0
+        self.restored = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def _expired(self, session: Session, now: float) -> bool:
+        return session.updated_at + self.ttl < now
+
+    def _put(self, session: Session) -> None:
+        """放入内存并按会话数和占用淘汰最久未使用的会话，需持有锁"""
+        old = self._sessions.pop(session.session_id, None)
+        if old is not None:
+            self.current_bytes -= old.size
+        self._sessions[session.session_id] = session
+        self.current_bytes += session.size
+        while len(self._sessions) > 1 and (
+                len(self._sessions) > self.max_sessions or self.current_bytes > self.max_bytes):
+            session_id, evicted = self._sessions.popitem(last=False)
+            self.current_bytes -= evicted.size
+            self.evictions += 1
+            if self.log is None:
+                logger.warning(f"会话{session_id}因内存上限被淘汰，历史已丢失")
+
+    def _drop(self, session_id: str) -> None:
+        """从内存删除，需持有锁"""
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self.current_bytes -= session.size
+
+    def _purge_expired(self, now: float) -> None:
+        """清理过期会话：内存中最久未使用的在前面，磁盘上的定期清理"""
+        with self._lock:
+            while self._sessions:
+                session = next(iter(self._sessions.values()))
+                if not self._expired(session, now):
+                    break
+                self._drop(session.session_id)
+                self.expired += 1
+            purge_disk = self.log is not None and now - self._last_purge >= PURGE_INTERVAL
+            if purge_disk:
+                self._last_purge = now
+        if purge_disk:
+            self.log.purge(now - self.ttl)
+
+    def create(self, system_message: Optional[str] = None) -> Session:
+        """创建会话"""
+        now = time.time()
+        self._purge_expired(now)
+        session = Session(uuid.uuid4().hex, system_message, created_at=now)
+        if self.log is not None:
+            self.log.create(session)
+        with self._lock:
+            self._put(session)
+            self.created += 1
+        return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        """获取会话，内存中没有时从磁盘恢复；不存在或已过期时返回None"""
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                if self._expired(session, now):
+                    self._drop(session_id)
+                    self.expired += 1
+                    session = None
+                else:
+                    self._sessions.move_to_end(session_id)
+                    return session
+        if self.log is None:
+            return None
+
+        session = self.log.load(session_id)
+        if session is None:
+            return None
+        if self._expired(session, now):
+            self.log.delete(session_id)
+            return None
+        with self._lock:
+            self._put(session)
+            self.restored += 1
+        return session
+
+    def append(self, session_id: str, messages: List[Dict[str, str]]) -> Session:
+        """追加一轮对话的消息
+
+        Raises:
+            SessionNotFoundError: 会话不存在或已过期
+        """
+        session = self.get(session_id)
+        if session is None:
+            raise SessionNotFoundError(session_id)
+        messages = [{"role": m["role"], "content": m["content"]} for m in messages]
+        now = time.time()
+        with self._lock:
+            start_seq = len(session.messages)
+            session.messages.extend(messages)
+            session.updated_at = now
+            added = sum(message_size(m) for m in messages)
+            session.size += added
+            if session_id in self._sessions:
+                self.current_bytes += added
+                self._put(session)
+        if self.log is not None:
+            self.log.append(session_id, start_seq, messages, now)
+        return session
+
+    def delete(self, session_id: str) -> bool:
+        """删除会话，返回会话是否存在"""
+        with self._lock:
+            existed = session_id in self._sessions
+            self._drop(session_id)
+        if self.log is not None:
+            existed = self.log.load(session_id) is not None or existed
+            self.log.delete(session_id)
+        return existed
+
+    async def _run(self, func, *args):
+        """磁盘操作放到线程中执行，只有内存时直接调用"""
+        if self.log is None:
+            return func(*args)
+        return await asyncio.to_thread(func, *args)
+
+    async def acreate(self, system_message: Optional[str] = None) -> Session:
+        return await self._run(self.create, system_message)
+
+    async def aget(self, session_id: str) -> Optional[Session]:
+        return await self._run(self.get, session_id)
+
+    async def aappend(self, session_id: str, messages: List[Dict[str, str]]) -> Session:
+        return await self._run(self.append, session_id, messages)
+
+    async def adelete(self, session_id: str) -> bool:
+        return await self._run(self.delete, session_id)
+
+    async def arecord_turn(self, session_id: str, prompt: str, answer: str) -> Session:
+        """追加一轮问答（模型回答成功后调用，失败的轮次不写入历史）"""
+        return await self.aappend(session_id, [
+            {"role": "user", "content": prompt},
+            {"role": "assistant", "content": answer}
+        ])
+
+    def stats(self) -> Dict[str, Any]:
+        """获取会话存储统计"""
+        with self._lock:
+            return {
+                "backend": "memory+sqlite" if self.log is not None else "memory",
+                "sessions": len(self._sessions),
+                "bytes": self.current_bytes,
+                "max_sessions": self.max_sessions,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "created": self.created,
+                "restored": self.restored,
+                "evictions": self.evictions,
+                "expired": self.expired
+            }
+
+
+# 进程内共享的会话存储
+_shared_store: Optional[SessionStore] = None
+
+
+def get_session_store() -> SessionStore:
+    """获取进程内共享的会话存储"""
+    global _shared_store
+    if _shared_store is None:
+        log = SQLiteSessionLog(SESSION_SQLITE_PATH) if SESSION_SQLITE_PATH else None
+        if log is not None:
+            logger.info(f"会话消息追加写入: {SESSION_SQLITE_PATH}")
+        _shared_store = SessionStore(log=log)
+    return _shared_store
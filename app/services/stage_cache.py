@@ -0,0 +1,173 @@
+"""
+函数调用阶段缓存
+
+工具执行后的模型请求只取决于问题、模型的工具调用和工具结果。人数、天气这类变化慢的数据
+在相同问题下工具结果经常完全相同，但每次工具调用的ID不同，普通响应缓存无法命中。
+这里去掉调用ID后按模型实际看到的内容计算键，并带上所用工具的数据版本号，
+数据不变的重复问题直接使用缓存的最终回答，跳过第二次千问请求；数据变化时调用
+invalidate_tool_data递增版本号，依赖旧数据的缓存自然失效。
+"""
+import hashlib
+import json
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+from app.core.llm_config import (
+    STAGE_CACHE_ENABLED,
+    STAGE_CACHE_TTL,
+    STAGE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_MAX_BYTES
+)
+from app.core.response_cache import MemoryResponseCache, make_cache_key
+from app.utils.tool_cache import get_tool_cache
+from app.utils.tool_registry import ToolRegistry
+from app.utils.tools import tool_registry
+
+# 获取logger
+logger = logging.getLogger("gongdi-api.stage_cache")
+
+
+def strip_call_ids(message: Dict[str, Any]) -> Dict[str, Any]:
+    """去掉消息中的工具调用ID（每次请求都不同，不影响回答）"""
+    stripped = {k: v for k, v in message.items() if k != "tool_call_id"}
+    if message.get("tool_calls"):
+        stripped["tool_calls"] = [
+            {
+                "type": call.get("type", "function"),
+                "function": {
+                    "name": call["function"].get("name"),
+                    "arguments": call["function"].get("arguments") or ""
+                }
+            }
+            for call in message["tool_calls"]
+        ]
+    return stripped
+
+
+class StageCache:
+    """工具执行后的最终回答缓存"""
+
+    def __init__(
+        self,
+        ttl: float = STAGE_CACHE_TTL,
+        max_entries: int = STAGE_CACHE_MAX_ENTRIES,
+        registry: Optional[ToolRegistry] = None,
+    ):
+        """初始化阶段缓存
+
+        Args:
+            ttl: 过期时间（秒），数据版本号之外的兜底
+            max_entries: 最大缓存条数
+            registry: 工具注册表，用于读取数据版本号，默认使用共享注册表
+        """
+        self.registry = registry or tool_registry
+        self._cache = MemoryResponseCache(
+            max_entries=max_entries,
+            max_bytes=RESPONSE_CACHE_MAX_BYTES,
+            ttl=ttl,
+            stale_ttl=0
+        )
+        self._lock = threading.Lock()
+        self.skipped = 0
+
+    def key(
+        self,
+        model: str,
+        temperature: float,
+        max_tokens: int,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]],
+        executed_tools: List[Dict[str, Any]],
+    ) -> Optional[str]:
+        """计算工具执行后模型请求的缓存键
+
+        Args:
+            model: 模型名称
+            temperature: 温度参数，不为0时回答不确定，不缓存
+            max_tokens: 最大生成token数量
+            messages: 发送给模型的完整消息（含工具调用和工具结果）
+            tools: 本次请求提供的工具，要求直接回答时为None
+            executed_tools: 已执行的工具记录
+
+        Returns:
+            缓存键；不可缓存（温度不为0、没有执行工具、工具失败或工具未注册）时返回None
+        """
+        if temperature != 0 or not executed_tools:
+            return None
+        versions: Dict[str, int] = {}
+        for executed in executed_tools:
+            version = self.registry.data_version(executed["function_name"])
+            # 失败的工具可能只是暂时不可用，不缓存基于错误信息的回答
+            if version is None or not executed.get("success"):
+                self._count_skipped()
+                return None
+            versions[executed["function_name"]] = version
+
+        request_key = make_cache_key(model, [strip_call_ids(m) for m in messages], tools, temperature, max_tokens)
+        canonical = json.dumps({"request": request_key, "versions": versions}, sort_keys=True)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _count_skipped(self) -> None:
+        with self._lock:
+            self.skipped += 1
+
+    def get(self, key: Optional[str]) -> Optional[Dict[str, Any]]:
+        """查询缓存的最终回答 {"request_id", "message", "usage"}"""
+        if key is None:
+            return None
+        return self._cache.get(key)
+
+    def set(self, key: Optional[str], request_id: Optional[str], message: Dict[str, Any], usage: Dict[str, Any]) -> None:
+        """缓存最终回答，仍要调用工具的回答不缓存"""
+        if key is None or message.get("tool_calls"):
+            return
+        self._cache.set(key, {"request_id": request_id, "message": message, "usage": usage})
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """获取命中统计"""
+        stats = self._cache.stats()
+        return {
+            "hits": stats["hits"],
+            "misses": stats["misses"],
+            "sets": stats["sets"],
+            "skipped": self.skipped,
+            "hit_rate": stats["hit_rate"],
+            "entries": stats["entries"],
+            "ttl": stats["ttl"],
+            "evictions": stats["evictions"],
+            "data_versions": {tool.name: tool.data_version for tool in self.registry if tool.data_version}
+        }
+
+
+def invalidate_tool_data(name: str, registry: Optional[ToolRegistry] = None) -> int:
+    """工具背后的数据发生变化时调用
+
+    递增工具的数据版本号（依赖旧数据的阶段缓存失效），同时清空该工具的结果缓存
+
+    Returns:
+        新的版本号
+    """
+    version = (registry or tool_registry).bump_data_version(name)
+    tool_cache = get_tool_cache()
+    if tool_cache is not None:
+        tool_cache.clear(name)
+    logger.info(f"工具数据已更新: {name}，版本号{version}")
+    return version
+
+
+# 进程内共享的阶段缓存
+_shared_cache: Optional[StageCache] = None
+
+
+def get_stage_cache() -> Optional[StageCache]:
+    """获取进程内共享的阶段缓存，未启用时返回None"""
+    global _shared_cache
+    if not STAGE_CACHE_ENABLED:
+        return None
+    if _shared_cache is None:
+        _shared_cache = StageCache()
+    return _shared_cache
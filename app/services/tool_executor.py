@@ -0,0 +1,219 @@
+"""
+工具执行器
+
+模型一轮返回的多个工具调用并发执行：异步工具函数直接await，同步工具函数放到线程池中执行，
+避免阻塞事件循环。每个工具调用有独立的超时时间，结果按tool_calls的顺序返回。
+工具从注册表中查找，执行前用预编译的校验器检查参数，参数错误作为失败结果返回给模型。
+声明了缓存策略的工具（见app.utils.tool_cache）先查缓存，过期结果在后台刷新；
+并发的相同调用未命中缓存时只执行一次，结果分发给所有调用方。
+"""
+import asyncio
+import functools
+import inspect
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.llm_config import TOOL_DEFAULT_TIMEOUT, TOOL_TIMEOUTS, TOOL_EXECUTOR_MAX_WORKERS
+from app.core.singleflight import SingleFlight
+from app.utils.tool_cache import CACHE_FRESH, CACHE_STALE, ToolResultCache, get_tool_cache
+from app.utils.tool_registry import CompiledTool, ToolArgumentError, ToolRegistry
+from app.utils.tools import tool_registry
+
+# 获取logger
+logger = logging.getLogger("gongdi-api.tool_executor")
+
+
+def tool_message(tool_call_id: Optional[str], payload: Any) -> Dict[str, Any]:
+    """构建返回给模型的tool消息"""
+    return {
+        "tool_call_id": tool_call_id,
+        "role": "tool",
+        "content": json.dumps(payload, ensure_ascii=False)
+    }
+
+
+class ToolExecutor:
+    """工具执行器"""
+
+    def __init__(
+        self,
+        registry: Optional[ToolRegistry] = None,
+        default_timeout: float = TOOL_DEFAULT_TIMEOUT,
+        timeouts: Optional[Dict[str, float]] = None,
+        max_workers: int = TOOL_EXECUTOR_MAX_WORKERS,
+        cache: Optional[ToolResultCache] = None,
+    ):
+        """初始化工具执行器
+
+        Args:
+            registry: 工具注册表，默认使用共享注册表
+            default_timeout: 默认超时时间（秒）
+            timeouts: 按工具名单独设置的超时时间（秒）
+            max_workers: 执行同步工具函数的线程数
+            cache: 工具结果缓存，默认使用进程内共享缓存
+        """
+        self.registry = registry or tool_registry
+        self.default_timeout = default_timeout
+        self.timeouts = dict(TOOL_TIMEOUTS if timeouts is None else timeouts)
+        self._thread_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+        self.cache = cache or get_tool_cache()
+        # 未命中缓存的相同调用（工具名+缓存键）合并执行
+        self._inflight = SingleFlight()
+
+    def timeout_for(self, function_name: str) -> float:
+        """获取工具的超时时间"""
+        return self.timeouts.get(function_name, self.default_timeout)
+
+    async def _invoke(self, handler: Callable, arguments: Dict[str, Any]) -> Any:
+        """调用处理函数，同步函数在线程池中执行"""
+        if inspect.iscoroutinefunction(handler):
+            return await handler(**arguments)
+
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(self._thread_pool, functools.partial(handler, **arguments))
+        # 同步函数也可能返回协程（如被装饰器包装的异步函数）
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    async def _call(self, function_name: str, handler: Callable, arguments: Dict[str, Any]) -> Any:
+        """在超时时间内调用处理函数"""
+        return await asyncio.wait_for(self._invoke(handler, arguments), self.timeout_for(function_name))
+
+    async def _call_cached(self, tool: CompiledTool, arguments: Dict[str, Any]) -> Tuple[Any, Optional[str]]:
+        """按工具声明的缓存策略调用处理函数
+
+        Returns:
+            (结果, 缓存状态)，未使用缓存时缓存状态为None
+        """
+        function_name, handler, policy = tool.name, tool.func, tool.cache_policy
+        if policy is None or self.cache is None:
+            return await self._call(function_name, handler, arguments), None
+
+        key = policy.key(arguments)
+        state, value = self.cache.lookup(function_name, key, policy)
+        if state == CACHE_FRESH:
+            return value, state
+        if state == CACHE_STALE:
+            # 先返回旧结果，后台刷新
+            self.cache.refresh(function_name, key, policy, lambda: self._call(function_name, handler, arguments))
+            return value, state
+
+        async def fetch():
+            result = await self._call(function_name, handler, arguments)
+            self.cache.set(function_name, key, result, policy)
+            return result
+
+        value = await self._inflight.do(f"{function_name}:{key}", fetch)
+        return value, None
+
+    def prepare_arguments(self, tool: CompiledTool, arguments_str: Optional[str]) -> Dict[str, Any]:
+        """解析、校验并规范化工具参数
+
+        Raises:
+            ValueError: 参数不是合法的JSON
+            ToolArgumentError: 参数校验失败
+        """
+        arguments = json.loads(arguments_str) if arguments_str else {}
+        arguments = tool.validate(arguments)
+        if tool.cache_policy is not None:
+            arguments = tool.cache_policy.normalize(arguments)
+        return arguments
+
+    def call_key(self, tool_call: Dict[str, Any]) -> Optional[str]:
+        """工具调用的规范化标识（工具名+规范化参数），参数不合法时返回None"""
+        function = tool_call.get('function') or {}
+        tool = self.registry.get(function.get('name'))
+        if tool is None:
+            return None
+        try:
+            arguments = self.prepare_arguments(tool, function.get('arguments'))
+        except ValueError:
+            return None
+        return f"{tool.name}:{json.dumps(arguments, ensure_ascii=False, sort_keys=True)}"
+
+    async def execute(self, tool_call: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """执行一个工具调用，异常和超时都转换为失败记录
+
+        Args:
+            tool_call: 模型返回的工具调用
+
+        Returns:
+            (执行记录, 返回给模型的tool消息)
+        """
+        tool_call_id = tool_call.get('id')
+        function_name = tool_call['function']['name']
+        arguments_str = tool_call['function'].get('arguments')
+        executed_tool: Dict[str, Any] = {"id": tool_call_id, "function_name": function_name}
+
+        tool = self.registry.get(function_name)
+        if tool is None:
+            error_message = f"未找到处理函数 '{function_name}'"
+            logger.warning(error_message)
+            executed_tool.update({"success": False, "error": error_message})
+            return executed_tool, tool_message(tool_call_id, {"error": error_message})
+
+        timeout = self.timeout_for(function_name)
+        started = time.monotonic()
+        try:
+            arguments = json.loads(arguments_str) if arguments_str else {}
+            executed_tool["arguments"] = arguments
+            arguments = self.prepare_arguments(tool, arguments_str)
+            executed_tool["arguments"] = arguments
+            logger.debug(f"执行函数: {function_name}, 参数: {arguments}")
+            result, cache_state = await self._call_cached(tool, arguments)
+            executed_tool.update({"success": True, "result": result})
+            if cache_state is not None:
+                executed_tool["cache"] = cache_state
+            message = tool_message(tool_call_id, result)
+        except ToolArgumentError as e:
+            error_message = f"参数错误: {str(e)}"
+            logger.warning(f"{function_name}: {error_message}")
+            executed_tool.update({"success": False, "error": error_message})
+            message = tool_message(tool_call_id, {"error": error_message})
+        except asyncio.TimeoutError:
+            # 线程池中的同步函数无法强制中止，结果会被丢弃
+            error_message = f"函数执行超时（{timeout}秒）"
+            logger.warning(f"{function_name}: {error_message}")
+            executed_tool.update({"success": False, "error": error_message})
+            message = tool_message(tool_call_id, {"error": error_message})
+        except Exception as e:
+            error_message = f"函数执行错误: {str(e)}"
+            logger.error(f"{function_name}: {error_message}")
+            executed_tool.update({"success": False, "error": error_message})
+            message = tool_message(tool_call_id, {"error": error_message})
+
+        executed_tool["elapsed_ms"] = round((time.monotonic() - started) * 1000, 1)
+        return executed_tool, message
+
+    async def execute_all(self, tool_calls: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """并发执行一轮模型返回的全部工具调用
+
+        Args:
+            tool_calls: 模型返回的工具调用列表
+
+        Returns:
+            (执行记录列表, tool消息列表)，顺序与tool_calls一致
+        """
+        function_calls = [call for call in tool_calls if call.get('type', 'function') == 'function']
+        outcomes = await asyncio.gather(*(self.execute(call) for call in function_calls))
+        return [executed for executed, _ in outcomes], [message for _, message in outcomes]
+
+    def shutdown(self) -> None:
+        """关闭线程池"""
+        self._thread_pool.shutdown(wait=False)
+
+
+# 进程内共享执行器
+_shared_executor: Optional[ToolExecutor] = None
+
+
+def get_tool_executor() -> ToolExecutor:
+    """获取进程内共享的工具执行器"""
+    global _shared_executor
+    if _shared_executor is None:
+        _shared_executor = ToolExecutor()
+    return _shared_executor
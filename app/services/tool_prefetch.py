@@ -0,0 +1,233 @@
+"""
+工具预取
+
+函数调用的第一次模型请求大多只是决定调用哪个工具。这里根据问题预测可能的工具调用
+（意图规则匹配，或相似问题上模型过去的选择），在第一次模型请求的同时预先执行
+廉价、无副作用的工具（注册时speculative=True）。模型选择的工具和参数与预测一致时直接使用预取结果，
+不一致的预取结果丢弃。
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.core.llm_config import (
+    TOOL_PREFETCH_ENABLED,
+    TOOL_PREFETCH_MIN_CONFIDENCE,
+    TOOL_PREFETCH_MAX_TOOLS,
+    TOOL_PREFETCH_HISTORY_SIZE,
+    TOOL_PREFETCH_SIMILARITY
+)
+from app.services.intent_router import get_intent_router, normalize_query
+from app.services.tool_executor import ToolExecutor, tool_message
+from app.utils.tool_registry import ToolRegistry
+from app.utils.tools import tool_registry
+
+# 获取logger
+logger = logging.getLogger("gongdi-api.tool_prefetch")
+
+
+def bigrams(text: str) -> Set[str]:
+    """文本的相邻双字集合，用于问题相似度"""
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class Speculation:
+    """一次请求的预取任务"""
+
+    def __init__(self, prefetcher: "ToolPrefetcher", executor: ToolExecutor, tasks: Dict[str, asyncio.Task]):
+        self.prefetcher = prefetcher
+        self.executor = executor
+        self.tasks = tasks
+
+    async def resolve(self, tool_call: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """使用匹配的预取结果，没有匹配或预取失败时正常执行"""
+        key = self.executor.call_key(tool_call)
+        task = self.tasks.pop(key, None) if key is not None else None
+        if task is not None:
+            executed, _ = await task
+            if executed["success"]:
+                self.prefetcher._count("hits")
+                # 预取时使用的是预测的调用ID，换成模型返回的ID
+                executed = {**executed, "id": tool_call.get('id'), "prefetched": True}
+                return executed, tool_message(tool_call.get('id'), executed["result"])
+            self.prefetcher._count("failed")
+        return await self.executor.execute(tool_call)
+
+    async def execute_all(self, tool_calls: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """与ToolExecutor.execute_all相同，匹配的调用复用预取结果"""
+        function_calls = [call for call in tool_calls if call.get('type', 'function') == 'function']
+        outcomes = await asyncio.gather(*(self.resolve(call) for call in function_calls))
+        return [executed for executed, _ in outcomes], [message for _, message in outcomes]
+
+    def discard(self) -> None:
+        """丢弃未被使用的预取结果"""
+        for task in self.tasks.values():
+            if not task.done():
+                task.cancel()
+            self.prefetcher._count("wasted")
+        self.tasks.clear()
+
+
+class ToolPrefetcher:
+    """工具预取"""
+
+    def __init__(
+        self,
+        registry: Optional[ToolRegistry] = None,
+        min_confidence: float = TOOL_PREFETCH_MIN_CONFIDENCE,
+        max_tools: int = TOOL_PREFETCH_MAX_TOOLS,
+        history_size: int = TOOL_PREFETCH_HISTORY_SIZE,
+        similarity: float = TOOL_PREFETCH_SIMILARITY,
+    ):
+        """初始化工具预取
+
+        Args:
+            registry: 工具注册表，默认使用共享注册表
+            min_confidence: 意图匹配置信度达到该值时预取（可以低于快速通道的阈值）
+            max_tools: 每次请求最多预取的工具调用数
+            history_size: 记录模型选择的问题数
+            similarity: 与历史问题的相似度（双字Jaccard）达到该值时按历史选择预取
+        """
+        self.registry = registry or tool_registry
+        self.min_confidence = min_confidence
+        self.max_tools = max_tools
+        self.history_size = history_size
+        self.similarity = similarity
+
+        # 规范化问题 -> (双字集合, 模型第一步选择的工具调用)
+        self._history: "OrderedDict[str, Tuple[Set[str], List[Tuple[str, str]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.requests = 0
+        self.predicted = 0
+        self.prefetched = 0
+        self.hits = 0
+        self.failed = 0
+        self.wasted = 0
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _from_history(self, text: str) -> List[Tuple[str, str]]:
+        """相似问题上模型过去的选择"""
+        with self._lock:
+            entry = self._history.get(text)
+            if entry is not None:
+                self._history.move_to_end(text)
+                return list(entry[1])
+            grams = bigrams(text)
+            best, best_score = None, self.similarity
+            for past_grams, calls in self._history.values():
+                score = jaccard(grams, past_grams)
+                if score >= best_score:
+                    best, best_score = calls, score
+            return list(best or [])
+
+    def predict(self, query: str, tool_names: List[str]) -> List[Tuple[str, str]]:
+        """预测可能的工具调用
+
+        Returns:
+            [(工具名, 参数JSON)]，只包含本次请求可用且允许预取的工具
+        """
+        candidates: List[Tuple[str, str]] = []
+
+        router = get_intent_router()
+        if router is not None:
+            matched = router.match(query, tool_names)
+            if matched is not None and matched.confidence >= self.min_confidence:
+                candidates.append((matched.rule.tool, json.dumps(matched.arguments, ensure_ascii=False)))
+
+        candidates.extend(self._from_history(normalize_query(query)))
+
+        available = set(tool_names)
+        predicted: List[Tuple[str, str]] = []
+        for name, arguments in candidates:
+            tool = self.registry.get(name)
+            if tool is None or not tool.speculative or name not in available:
+                continue
+            if (name, arguments) not in predicted:
+                predicted.append((name, arguments))
+        return predicted[:self.max_tools]
+
+    def start(self, query: str, tools: List[Dict[str, Any]], executor: ToolExecutor) -> Optional[Speculation]:
+        """预测并开始预取，需在事件循环中调用
+
+        Returns:
+            预取任务，没有可预取的工具时返回None
+        """
+        tool_names = [tool['function'].get('name') for tool in tools if isinstance(tool.get('function'), dict)]
+        predicted = self.predict(query, tool_names)
+        with self._lock:
+            self.requests += 1
+            if predicted:
+                self.predicted += 1
+        if not predicted:
+            return None
+
+        tasks: Dict[str, asyncio.Task] = {}
+        for i, (name, arguments) in enumerate(predicted):
+            tool_call = {"id": f"prefetch_{i}", "type": "function", "function": {"name": name, "arguments": arguments}}
+            key = executor.call_key(tool_call)
+            if key is None or key in tasks:
+                continue
+            tasks[key] = asyncio.ensure_future(executor.execute(tool_call))
+        with self._lock:
+            self.prefetched += len(tasks)
+        logger.debug(f"预取工具: {list(tasks)}")
+        return Speculation(self, executor, tasks) if tasks else None
+
+    def learn(self, query: str, tool_calls: List[Dict[str, Any]]) -> None:
+        """记录模型第一步选择的工具调用"""
+        calls = [
+            (call['function']['name'], call['function'].get('arguments') or "{}")
+            for call in tool_calls if call.get('type', 'function') == 'function'
+        ]
+        if not calls:
+            return
+        text = normalize_query(query)
+        with self._lock:
+            self._history[text] = (bigrams(text), calls)
+            self._history.move_to_end(text)
+            while len(self._history) > self.history_size:
+                self._history.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取预取统计"""
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "predicted": self.predicted,
+                "prefetched": self.prefetched,
+                "hits": self.hits,
+                "failed": self.failed,
+                "wasted": self.wasted,
+                "hit_rate": round(self.hits / self.prefetched, 4) if self.prefetched else 0.0,
+                "history": len(self._history)
+            }
+
+
+# 进程内共享的工具预取
+_shared_prefetcher: Optional[ToolPrefetcher] = None
+
+
+def get_tool_prefetcher() -> Optional[ToolPrefetcher]:
+    """获取进程内共享的工具预取，未启用时返回None"""
+    global _shared_prefetcher
+    if not TOOL_PREFETCH_ENABLED:
+        return None
+    if _shared_prefetcher is None:
+        _shared_prefetcher = ToolPrefetcher()
+    return _shared_prefetcher
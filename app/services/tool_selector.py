@@ -0,0 +1,265 @@
+"""
+工具预选
+
+工具数量增多后，每次函数调用都把全部工具schema发给模型会显著增加提示token和延迟。
+这里在本地为工具名称、描述和参数说明建立索引（英文按单词、中文按单字和双字切分，BM25打分），
+每个问题只把相关度最高的top-k个工具发给模型；最高分低于阈值时认为没有把握，退回全部工具。
+"""
+import hashlib
+import json
+import logging
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.core.llm_config import (
+    TOOL_SELECTION_ENABLED,
+    TOOL_SELECTION_TOP_K,
+    TOOL_SELECTION_MIN_SCORE,
+    TOOL_SELECTION_ALWAYS_INCLUDE
+)
+from app.core.rate_limiter import estimate_text_tokens
+
+# 获取logger
+logger = logging.getLogger("gongdi-api.tool_selector")
+
+# 选择结果
+SELECTION_ALL = "all"  # 工具数不超过top-k，全部发送
+SELECTION_PRUNED = "pruned"  # 只发送相关工具
+SELECTION_FALLBACK = "fallback"  # 相关度不足，退回全部工具
+
+# 词项权重：单个汉字区分度低，权重低于双字和英文单词
+UNIGRAM_WEIGHT = 0.3
+# 工具名称中的词项额外加权
+NAME_BOOST = 2
+
+# BM25参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+INDEX_CACHE_SIZE = 64
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_CJK_RE = re.compile(r"[一-鿿]+")
+
+
+def tokenize(text: str) -> Counter:
+    """切分文本，返回词项到权重的映射
+
+    英文和数字按单词切分（下划线视为分隔符），连续汉字切分为单字和相邻双字
+    """
+    terms: Counter = Counter()
+    text = text.lower()
+    for word in _WORD_RE.findall(text):
+        terms[word] += 1
+    for run in _CJK_RE.findall(text):
+        for ch in run:
+            terms[ch] += UNIGRAM_WEIGHT
+        for i in range(len(run) - 1):
+            terms[run[i:i + 2]] += 1
+    return terms
+
+
+def tool_text(tool: Dict[str, Any]) -> Tuple[str, str]:
+    """提取工具的名称和描述文本（含参数名、参数说明和枚举值）"""
+    function = tool.get("function") or {}
+    name = str(function.get("name", ""))
+    parts = [str(function.get("description", ""))]
+
+    properties = (function.get("parameters") or {}).get("properties") or {}
+    for param_name, schema in properties.items():
+        parts.append(param_name)
+        if isinstance(schema, dict):
+            parts.append(str(schema.get("description", "")))
+            parts.extend(str(value) for value in schema.get("enum", []))
+    return name, " ".join(parts)
+
+
+def tools_key(tools: List[Dict[str, Any]]) -> str:
+    """工具列表的内容哈希"""
+    return hashlib.sha256(
+        json.dumps(tools, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+class ToolIndex:
+    """一组工具的BM25索引"""
+
+    def __init__(self, tools: List[Dict[str, Any]]):
+        self.tools = tools
+        self.names: List[str] = []
+        self.docs: List[Counter] = []
+        self.tokens: List[int] = []  # 每个工具schema的预估token数
+
+        for tool in tools:
+            name, text = tool_text(tool)
+            doc = tokenize(text)
+            for term, weight in tokenize(name).items():
+                doc[term] += weight * NAME_BOOST
+            self.names.append(name)
+            self.docs.append(doc)
+            self.tokens.append(estimate_text_tokens(json.dumps(tool, ensure_ascii=False)))
+
+        self.lengths = [sum(doc.values()) for doc in self.docs]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+        df: Counter = Counter()
+        for doc in self.docs:
+            df.update(doc.keys())
+        count = len(self.docs)
+        self.idf = {
+            term: math.log(1 + (count - freq + 0.5) / (freq + 0.5))
+            for term, freq in df.items()
+        }
+
+    def score(self, query: str) -> List[float]:
+        """计算问题与每个工具的相关度"""
+        terms = tokenize(query)
+        scores = []
+        for doc, length in zip(self.docs, self.lengths):
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * length / self.avg_length) if self.avg_length else BM25_K1
+            score = 0.0
+            for term, query_weight in terms.items():
+                tf = doc.get(term)
+                if not tf:
+                    continue
+                # 查询词权重封顶为1，避免重复字词放大分数
+                score += min(query_weight, 1.0) * self.idf[term] * tf * (BM25_K1 + 1) / (tf + norm)
+            scores.append(score)
+        return scores
+
+
+class ToolSelector:
+    """按问题相关度预选工具"""
+
+    def __init__(
+        self,
+        top_k: int = TOOL_SELECTION_TOP_K,
+        min_score: float = TOOL_SELECTION_MIN_SCORE,
+        always_include: Iterable[str] = TOOL_SELECTION_ALWAYS_INCLUDE,
+    ):
+        """初始化工具预选
+
+        Args:
+            top_k: 最多发送的工具数
+            min_score: 最高相关度低于该值时退回全部工具
+            always_include: 总是发送的工具名称
+        """
+        self.top_k = max(1, top_k)
+        self.min_score = min_score
+        self.always_include = set(always_include)
+
+        self._indexes: "OrderedDict[str, ToolIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.requests = 0
+        self.pruned = 0
+        self.fallbacks = 0
+        self.tools_offered = 0
+        self.tools_sent = 0
+        self.tokens_offered = 0
+        self.tokens_saved = 0
+
+    def _index(self, tools: List[Dict[str, Any]]) -> ToolIndex:
+        """获取工具列表的索引，相同内容的工具列表只建一次索引"""
+        key = tools_key(tools)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None:
+                self._indexes.move_to_end(key)
+                return index
+
+        index = ToolIndex(tools)
+        with self._lock:
+            self._indexes[key] = index
+            while len(self._indexes) > INDEX_CACHE_SIZE:
+                self._indexes.popitem(last=False)
+        return index
+
+    def select(self, query: str, tools: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """为问题预选工具
+
+        Args:
+            query: 用户问题
+            tools: 规范化后的工具列表（不会被修改）
+
+        Returns:
+            (发送给模型的工具列表, 选择信息)
+        """
+        info: Dict[str, Any] = {"strategy": SELECTION_ALL, "offered": len(tools), "sent": len(tools), "tokens_saved": 0}
+        if len(tools) <= self.top_k:
+            self._record(info, tools_tokens=0)
+            return tools, info
+
+        index = self._index(tools)
+        scores = index.score(query)
+        ranked = sorted(range(len(tools)), key=lambda i: scores[i], reverse=True)
+        best = scores[ranked[0]]
+        info["top_score"] = round(best, 3)
+        total_tokens = sum(index.tokens)
+
+        if best < self.min_score:
+            info["strategy"] = SELECTION_FALLBACK
+            self._record(info, tools_tokens=total_tokens)
+            logger.debug(f"工具预选相关度不足（{best:.2f}），发送全部{len(tools)}个工具")
+            return tools, info
+
+        chosen = {i for i in ranked[:self.top_k] if scores[i] > 0}
+        chosen.update(i for i, name in enumerate(index.names) if name in self.always_include)
+        # 保持原有顺序，相同选择得到相同的工具列表（便于命中响应缓存）
+        selected = [tools[i] for i in sorted(chosen)]
+
+        info.update({
+            "strategy": SELECTION_PRUNED,
+            "sent": len(selected),
+            "selected": [index.names[i] for i in sorted(chosen)],
+            "tokens_saved": sum(index.tokens[i] for i in range(len(tools)) if i not in chosen)
+        })
+        self._record(info, tools_tokens=total_tokens)
+        logger.debug(f"工具预选: {info['selected']}，节省约{info['tokens_saved']}个token")
+        return selected, info
+
+    def _record(self, info: Dict[str, Any], tools_tokens: int) -> None:
+        with self._lock:
+            self.requests += 1
+            self.tools_offered += info["offered"]
+            self.tools_sent += info["sent"]
+            self.tokens_offered += tools_tokens
+            self.tokens_saved += info["tokens_saved"]
+            if info["strategy"] == SELECTION_PRUNED:
+                self.pruned += 1
+            elif info["strategy"] == SELECTION_FALLBACK:
+                self.fallbacks += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """获取预选统计"""
+        with self._lock:
+            return {
+                "top_k": self.top_k,
+                "min_score": self.min_score,
+                "requests": self.requests,
+                "pruned": self.pruned,
+                "fallbacks": self.fallbacks,
+                "tools_offered": self.tools_offered,
+                "tools_sent": self.tools_sent,
+                "tokens_saved": self.tokens_saved,
+                "token_saving_rate": round(self.tokens_saved / self.tokens_offered, 4) if self.tokens_offered else 0.0,
+                "indexes": len(self._indexes)
+            }
+
+
+# 进程内共享的工具预选
+_shared_selector: Optional[ToolSelector] = None
+
+
+def get_tool_selector() -> Optional[ToolSelector]:
+    """获取进程内共享的工具预选，未启用时返回None"""
+    global _shared_selector
+    if not TOOL_SELECTION_ENABLED:
+        return None
+    if _shared_selector is None:
+        _shared_selector = ToolSelector()
+    return _shared_selector
@@ -0,0 +1,33 @@
+"""
+Server-Sent Events工具函数
+"""
+import json
+from typing import Any, AsyncIterator, Optional
+
+from fastapi.responses import StreamingResponse
+
+# SSE响应头，禁用缓存和反向代理缓冲，保证增量内容即时送达
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no"
+}
+
+def format_sse(data: Any, event: Optional[str] = None) -> str:
+    """格式化一条SSE事件
+
+    Args:
+        data: 事件数据，会被序列化为JSON
+        event: 事件名称
+
+    Returns:
+        SSE事件文本
+    """
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+def sse_response(events: AsyncIterator[str]) -> StreamingResponse:
+    """将SSE事件迭代器包装为流式响应"""
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
@@ -0,0 +1,229 @@
+"""
+工具结果缓存
+
+工具函数通过cached_tool装饰器声明缓存策略（TTL、最大条数、参数规范化），由工具执行器统一应用。
+过期但仍在stale窗口内的结果会立即返回，同时在后台刷新（stale-while-revalidate），
+慢速的数据源不会出现在请求路径上。
+"""
+import asyncio
+import copy
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from app.core.llm_config import TOOL_CACHE_ENABLED, TOOL_CACHE_MAX_ENTRIES
+
+# 获取logger
+logger = logging.getLogger("gongdi-api.tool_cache")
+
+# 缓存查询结果
+CACHE_MISS = "miss"
+CACHE_FRESH = "fresh"
+CACHE_STALE = "stale"
+
+
+def normalize_city(value: Any) -> Any:
+    """规范化城市名：去掉空白和行政区划后缀，如“北京市”->“北京”"""
+    if not isinstance(value, str):
+        return value
+    value = value.strip()
+    for suffix in ("特别行政区", "自治区", "市", "省"):
+        if value.endswith(suffix) and len(value) > len(suffix):
+            return value[:-len(suffix)]
+    return value
+
+
+class ToolCachePolicy:
+    """工具缓存策略"""
+
+    def __init__(
+        self,
+        ttl: float,
+        stale_ttl: float = 0,
+        max_entries: int = TOOL_CACHE_MAX_ENTRIES,
+        normalizers: Optional[Dict[str, Callable[[Any], Any]]] = None,
+    ):
+        """初始化缓存策略
+
+        Args:
+            ttl: 结果有效时间（秒）
+            stale_ttl: 过期后仍可返回旧结果并后台刷新的时间（秒）
+            max_entries: 最多缓存的结果数
+            normalizers: 参数名到规范化函数的映射
+        """
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.normalizers = normalizers or {}
+
+    def normalize(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """规范化参数，规范化后的参数同时用于缓存键和实际调用"""
+        return {
+            name: self.normalizers[name](value) if name in self.normalizers else value
+            for name, value in arguments.items()
+        }
+
+    def key(self, arguments: Dict[str, Any]) -> str:
+        """根据规范化后的参数计算缓存键"""
+        return json.dumps(arguments, sort_keys=True, ensure_ascii=False, default=str)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "ttl": self.ttl,
+            "stale_ttl": self.stale_ttl,
+            "max_entries": self.max_entries,
+            "normalized_arguments": sorted(self.normalizers)
+        }
+
+
+def cached_tool(
+    ttl: float,
+    stale_ttl: float = 0,
+    max_entries: int = TOOL_CACHE_MAX_ENTRIES,
+    normalizers: Optional[Dict[str, Callable[[Any], Any]]] = None,
+):
+    """声明工具函数的缓存策略
+
+    Args:
+        ttl: 结果有效时间（秒）
+        stale_ttl: 过期后仍可返回旧结果并后台刷新的时间（秒）
+        max_entries: 最多缓存的结果数
+        normalizers: 参数名到规范化函数的映射
+
+    Example:
+        @cached_tool(ttl=600, stale_ttl=1800, normalizers={"location": normalize_city})
+        def get_current_weather(location: str): ...
+    """
+    def decorator(func: Callable) -> Callable:
+        func.cache_policy = ToolCachePolicy(ttl, stale_ttl, max_entries, normalizers)
+        return func
+    return decorator
+
+
+class _ToolStats:
+    """单个工具的缓存统计"""
+
+    def __init__(self):
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        total = self.hits + self.stale_hits + self.misses
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "hit_rate": round((self.hits + self.stale_hits) / total, 4) if total else 0.0
+        }
+
+
+class ToolResultCache:
+    """按工具分区的结果缓存，每个工具独立做LRU淘汰"""
+
+    def __init__(self):
+        # 工具名 -> {缓存键: (过期时间, 结果)}
+        self._entries: Dict[str, "OrderedDict[str, Tuple[float, Any]]"] = {}
+        self._policies: Dict[str, ToolCachePolicy] = {}
+        self._stats: Dict[str, _ToolStats] = {}
+        self._refreshing: Set[Tuple[str, str]] = set()
+        # 后台刷新任务需保留引用，事件循环只持有弱引用
+        self._tasks: Set[asyncio.Task] = set()
+
+    def lookup(self, tool: str, key: str, policy: ToolCachePolicy) -> Tuple[str, Any]:
+        """查询缓存
+
+        Returns:
+            (CACHE_FRESH/CACHE_STALE/CACHE_MISS, 结果)
+        """
+        self._policies[tool] = policy
+        stats = self._stats.setdefault(tool, _ToolStats())
+        entries = self._entries.get(tool)
+        entry = entries.get(key) if entries else None
+        if entry is None:
+            stats.misses += 1
+            return CACHE_MISS, None
+
+        expires_at, value = entry
+        now = time.monotonic()
+        if now <= expires_at:
+            state = CACHE_FRESH
+            stats.hits += 1
+        elif now <= expires_at + policy.stale_ttl:
+            state = CACHE_STALE
+            stats.stale_hits += 1
+        else:
+            del entries[key]
+            stats.misses += 1
+            return CACHE_MISS, None
+
+        entries.move_to_end(key)
+        return state, copy.deepcopy(value)
+
+    def set(self, tool: str, key: str, value: Any, policy: ToolCachePolicy) -> None:
+        """写入结果"""
+        entries = self._entries.setdefault(tool, OrderedDict())
+        entries[key] = (time.monotonic() + policy.ttl, copy.deepcopy(value))
+        entries.move_to_end(key)
+        while len(entries) > policy.max_entries:
+            entries.popitem(last=False)
+
+    def refresh(self, tool: str, key: str, policy: ToolCachePolicy, fetch: Callable[[], Awaitable[Any]]) -> None:
+        """在后台刷新过期结果，同一个键同时只刷新一次"""
+        if (tool, key) in self._refreshing:
+            return
+        self._refreshing.add((tool, key))
+        task = asyncio.ensure_future(self._refresh(tool, key, policy, fetch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh(self, tool: str, key: str, policy: ToolCachePolicy, fetch: Callable[[], Awaitable[Any]]) -> None:
+        stats = self._stats.setdefault(tool, _ToolStats())
+        try:
+            value = await fetch()
+            self.set(tool, key, value, policy)
+            stats.refreshes += 1
+        except Exception as e:
+            # 刷新失败时保留旧结果，直到stale窗口结束
+            stats.refresh_failures += 1
+            logger.warning(f"后台刷新工具结果失败: {tool}({key}): {str(e)}")
+        finally:
+            self._refreshing.discard((tool, key))
+
+    def clear(self, tool: Optional[str] = None) -> None:
+        """清空全部或指定工具的缓存"""
+        if tool is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(tool, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取各工具的缓存统计"""
+        return {
+            tool: {
+                **stats.to_dict(),
+                "entries": len(self._entries.get(tool, {})),
+                "policy": self._policies[tool].to_dict() if tool in self._policies else None
+            }
+            for tool, stats in self._stats.items()
+        }
+
+
+# 进程内共享缓存
+_shared_cache: Optional[ToolResultCache] = None
+
+
+def get_tool_cache() -> Optional[ToolResultCache]:
+    """获取进程内共享的工具结果缓存，未启用时返回None"""
+    global _shared_cache
+    if not TOOL_CACHE_ENABLED:
+        return None
+    if _shared_cache is None:
+        _shared_cache = ToolResultCache()
+    return _shared_cache
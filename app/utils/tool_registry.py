@@ -0,0 +1,427 @@
+"""
+工具注册表
+
+每个工具只编译一次：生成规范化的schema，以及根据处理函数类型注解预编译的参数校验器。
+TOOL_HANDLERS、DEFAULT_TOOLS和LangChainFunctionAgent.add_function共用同一个注册表；
+客户端传入的工具列表按内容哈希缓存规范化结果。
+"""
+import copy
+import hashlib
+import inspect
+import json
+import logging
+import re
+import threading
+import typing
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# 获取logger
+logger = logging.getLogger("gongdi-api.tool_registry")
+
+# 客户端工具列表规范化结果的缓存条数
+NORMALIZED_CACHE_SIZE = 256
+
+_JSON_TYPES = {
+    str: "string",
+    int: "integer",
+    float: "number",
+    bool: "boolean",
+    list: "array",
+    dict: "object"
+}
+
+
+class ToolArgumentError(ValueError):
+    """工具参数校验失败"""
+
+
+Checker = Callable[[Any], Any]
+
+
+def _passthrough(value: Any) -> Any:
+    return value
+
+
+def _check_str(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise ToolArgumentError(f"应为字符串，实际为{type(value).__name__}")
+
+
+def _check_int(value: Any) -> int:
+    if isinstance(value, bool):
+        raise ToolArgumentError("应为整数，实际为布尔值")
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return int(value.strip())
+        except ValueError:
+            pass
+    raise ToolArgumentError(f"应为整数，实际为{value!r}")
+
+
+def _check_float(value: Any) -> float:
+    if isinstance(value, bool):
+        raise ToolArgumentError("应为数字，实际为布尔值")
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.strip())
+        except ValueError:
+            pass
+    raise ToolArgumentError(f"应为数字，实际为{value!r}")
+
+
+def _check_bool(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in ("true", "false"):
+        return value.strip().lower() == "true"
+    raise ToolArgumentError(f"应为布尔值，实际为{value!r}")
+
+
+def _check_dict(value: Any) -> dict:
+    if isinstance(value, dict):
+        return value
+    raise ToolArgumentError(f"应为对象，实际为{type(value).__name__}")
+
+
+_SCALAR_CHECKERS = {
+    str: _check_str,
+    int: _check_int,
+    float: _check_float,
+    bool: _check_bool,
+    dict: _check_dict
+}
+
+
+def compile_type(annotation: Any) -> Tuple[Dict[str, Any], Checker]:
+    """根据类型注解生成JSON Schema和校验函数
+
+    支持str、int、float、bool、list/List[X]、dict/Dict、Optional[X]和Literal，
+    其他类型不做校验
+
+    Returns:
+        (JSON Schema, 校验函数)
+    """
+    if annotation is inspect.Parameter.empty or annotation is Any:
+        return {}, _passthrough
+
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+
+    if origin is typing.Union:
+        members = [arg for arg in args if arg is not type(None)]
+        if len(members) == 1:
+            schema, checker = compile_type(members[0])
+            return schema, lambda value: None if value is None else checker(value)
+        return {}, _passthrough
+
+    if origin is typing.Literal:
+        choices = list(args)
+
+        def check_literal(value: Any) -> Any:
+            if value not in choices:
+                raise ToolArgumentError(f"应为{choices}之一，实际为{value!r}")
+            return value
+        schema = {"enum": choices}
+        if choices and all(isinstance(choice, str) for choice in choices):
+            schema["type"] = "string"
+        return schema, check_literal
+
+    if annotation is list or origin is list:
+        item_schema, item_checker = compile_type(args[0]) if args else ({}, _passthrough)
+
+        def check_list(value: Any) -> list:
+            if not isinstance(value, list):
+                raise ToolArgumentError(f"应为数组，实际为{type(value).__name__}")
+            return [item_checker(item) for item in value]
+        schema = {"type": "array"}
+        if item_schema:
+            schema["items"] = item_schema
+        return schema, check_list
+
+    if origin is dict:
+        annotation = dict
+
+    if annotation in _SCALAR_CHECKERS:
+        return {"type": _JSON_TYPES[annotation]}, _SCALAR_CHECKERS[annotation]
+
+    return {}, _passthrough
+
+
+def parse_docstring(doc: Optional[str]) -> Tuple[str, Dict[str, str]]:
+    """从Google风格文档字符串中提取函数描述和参数描述"""
+    if not doc:
+        return "", {}
+    doc = inspect.cleandoc(doc)
+    description = doc.split("\n\n")[0].strip()
+
+    params: Dict[str, str] = {}
+    match = re.search(r"^Args:\s*\n((?:[ \t]+.*\n?)+)", doc, re.MULTILINE)
+    if match:
+        for line in match.group(1).splitlines():
+            item = re.match(r"\s+(\w+)\s*(?:\([^)]*\))?\s*[:：]\s*(.+)", line)
+            if item:
+                params[item.group(1)] = item.group(2).strip()
+    return description, params
+
+
+class CompiledTool:
+    """编译后的工具"""
+
+    def __init__(
+        self,
+        func: Callable,
+        name: Optional[str] = None,
+        description: Optional[str] = None,
+        parameter_descriptions: Optional[Dict[str, str]] = None,
+        speculative: bool = False,
+    ):
+        """编译工具
+
+        Args:
+            func: 处理函数
+            name: 工具名称，默认使用函数名
+            description: 工具描述，默认使用文档字符串第一段
+            parameter_descriptions: 参数描述，默认从文档字符串的Args部分提取
+            speculative: 是否为廉价、无副作用的工具，可以在模型决定之前预先执行
+        """
+        doc_description, doc_params = parse_docstring(func.__doc__)
+        self.func = func
+        self.name = name or func.__name__
+        self.description = description or doc_description or f"{self.name}函数"
+        self.cache_policy = getattr(func, "cache_policy", None)
+        self.speculative = speculative
+        # 工具背后数据的版本号，数据变化时递增，依赖旧结果的缓存随之失效
+        self.data_version = 0
+
+        param_descriptions = {**doc_params, **(parameter_descriptions or {})}
+        try:
+            hints = typing.get_type_hints(func)
+        except Exception:
+            hints = {}
+
+        properties: Dict[str, Dict[str, Any]] = {}
+        required: List[str] = []
+        self._checkers: Dict[str, Checker] = {}
+        self._required: List[str] = []
+        self._accepts_extra = False
+
+        for param in inspect.signature(func).parameters.values():
+            if param.kind == inspect.Parameter.VAR_KEYWORD:
+                self._accepts_extra = True
+                continue
+            if param.kind == inspect.Parameter.VAR_POSITIONAL:
+                continue
+
+            schema, checker = compile_type(hints.get(param.name, param.annotation))
+            schema = dict(schema)
+            if param.name in param_descriptions:
+                schema["description"] = param_descriptions[param.name]
+            properties[param.name] = schema
+            self._checkers[param.name] = checker
+            if param.default is inspect.Parameter.empty:
+                required.append(param.name)
+                self._required.append(param.name)
+
+        # 无参数的工具使用空parameters，与千问示例保持一致
+        parameters: Dict[str, Any] = {}
+        if properties:
+            parameters = {"type": "object", "properties": properties}
+            if required:
+                parameters["required"] = required
+
+        self.schema = {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": parameters
+            }
+        }
+
+    def validate(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """校验并转换参数
+
+        Raises:
+            ToolArgumentError: 缺少必填参数、出现未知参数或类型不符
+        """
+        if not isinstance(arguments, dict):
+            raise ToolArgumentError("参数应为JSON对象")
+
+        missing = [name for name in self._required if name not in arguments]
+        if missing:
+            raise ToolArgumentError(f"缺少必填参数: {', '.join(missing)}")
+
+        validated: Dict[str, Any] = {}
+        for name, value in arguments.items():
+            checker = self._checkers.get(name)
+            if checker is None:
+                if not self._accepts_extra:
+                    raise ToolArgumentError(f"未知参数: {name}")
+                validated[name] = value
+                continue
+            try:
+                validated[name] = checker(value)
+            except ToolArgumentError as e:
+                raise ToolArgumentError(f"参数{name}{str(e)}") from None
+        return validated
+
+    def validating(self) -> Callable:
+        """返回先校验参数再调用处理函数的包装函数（保留原函数签名）"""
+        func = self.func
+
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(**kwargs):
+                return await func(**self.validate(kwargs))
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(**kwargs):
+            return func(**self.validate(kwargs))
+        return wrapper
+
+
+def normalize_tool_list(tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """规范化客户端传入的工具列表：空对象替换为占位工具，补齐type、function和name字段"""
+    normalized = []
+    for i, tool in enumerate(copy.deepcopy(tools)):
+        # 空对象替换为占位工具
+        if not tool:
+            normalized.append({
+                'type': 'function',
+                'function': {
+                    'name': f'default_tool_{i}',
+                    'description': '默认工具'
+                }
+            })
+            continue
+
+        tool.setdefault('type', 'function')
+
+        if 'function' not in tool:
+            # 没有function字段时，假设整个工具就是function定义
+            function_def = {k: v for k, v in tool.items() if k != 'type'}
+            function_def.setdefault('name', f"tool_{i}")
+            tool = {'type': 'function', 'function': function_def}
+        elif isinstance(tool['function'], dict):
+            tool['function'].setdefault('name', f"tool_{i}")
+
+        normalized.append(tool)
+    return normalized
+
+
+class ToolRegistry:
+    """工具注册表"""
+
+    def __init__(self):
+        self._tools: "OrderedDict[str, CompiledTool]" = OrderedDict()
+        # 以下两个对象随注册更新，对外共享同一个实例
+        self.handlers: Dict[str, Callable] = {}
+        self.schemas: List[Dict[str, Any]] = []
+        self._normalized: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(
+        self,
+        func: Callable,
+        name: Optional[str] = None,
+        description: Optional[str] = None,
+        parameter_descriptions: Optional[Dict[str, str]] = None,
+        speculative: bool = False,
+    ) -> CompiledTool:
+        """编译并注册工具，同名工具会被替换
+
+        Returns:
+            编译后的工具
+        """
+        compiled = CompiledTool(func, name, description, parameter_descriptions, speculative)
+        with self._lock:
+            self._tools[compiled.name] = compiled
+            self.handlers[compiled.name] = func
+            self.schemas[:] = [tool.schema for tool in self._tools.values()]
+        logger.debug(f"注册工具: {compiled.name}")
+        return compiled
+
+    def register(
+        self,
+        name: Optional[str] = None,
+        description: Optional[str] = None,
+        parameter_descriptions: Optional[Dict[str, str]] = None,
+        speculative: bool = False,
+    ):
+        """装饰器：注册函数作为工具
+
+        Example:
+            @tool_registry.register(description="查询天气", speculative=True)
+            def get_current_weather(location: str): ...
+        """
+        def decorator(func: Callable) -> Callable:
+            self.add(func, name, description, parameter_descriptions, speculative)
+            return func
+        return decorator
+
+    def get(self, name: str) -> Optional[CompiledTool]:
+        """按名称获取编译后的工具"""
+        return self._tools.get(name)
+
+    def data_version(self, name: str) -> Optional[int]:
+        """工具的数据版本号，未注册的工具返回None"""
+        tool = self._tools.get(name)
+        return tool.data_version if tool is not None else None
+
+    def bump_data_version(self, name: str) -> int:
+        """工具背后的数据发生变化时调用，返回新的版本号
+
+        Raises:
+            KeyError: 工具未注册
+        """
+        with self._lock:
+            tool = self._tools[name]
+            tool.data_version += 1
+            return tool.data_version
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tools
+
+    def __iter__(self):
+        return iter(list(self._tools.values()))
+
+    def normalize(self, tools: Optional[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """规范化请求中的工具列表
+
+        为空或只包含空对象时返回已注册工具的schema；其他列表按内容哈希缓存规范化结果。
+        返回的列表在多个请求间共享，调用方不应修改。
+        """
+        if not tools or (len(tools) == 1 and not tools[0]):
+            return self.schemas
+
+        key = hashlib.sha256(
+            json.dumps(tools, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+        with self._lock:
+            cached = self._normalized.get(key)
+            if cached is not None:
+                self._normalized.move_to_end(key)
+                return cached
+
+        normalized = normalize_tool_list(tools)
+        with self._lock:
+            self._normalized[key] = normalized
+            while len(self._normalized) > NORMALIZED_CACHE_SIZE:
+                self._normalized.popitem(last=False)
+        return normalized
+
+
+# 进程内共享注册表
+tool_registry = ToolRegistry()
@@ -1,9 +1,21 @@
 """
 工具函数模块
+
+工具函数注册到共享注册表，TOOL_HANDLERS和DEFAULT_TOOLS都由注册表生成
 """
 import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Literal
+from app.services.worker_service import WorkerService
+from app.utils.tool_cache import cached_tool, normalize_city
+from app.utils.tool_registry import tool_registry
+
+# 工人服务实例
+worker_service = WorkerService()
+
+WorkerStatus = Literal["在岗", "请假", "已离场", "全部"]
 
+@tool_registry.register(description="当你想知道现在的时间时非常有用。", speculative=True)
+@cached_tool(ttl=1)
 def get_current_time() -> Dict[str, str]:
     """获取当前时间"""
     current_time = datetime.datetime.now()
@@ -14,6 +26,12 @@ def get_current_time() -> Dict[str, str]:
         "weekday": current_time.strftime("%A")
     }
 
+@tool_registry.register(
+    description="当你想查询指定城市的天气时非常有用。",
+    parameter_descriptions={"location": "城市或县区，比如北京市、杭州市、余杭区等。"},
+    speculative=True
+)
+@cached_tool(ttl=600, stale_ttl=1800, normalizers={"location": normalize_city})
 def get_current_weather(location: str) -> Dict[str, str]:
     """获取指定位置的天气
     
@@ -33,8 +51,27 @@ def get_current_weather(location: str) -> Dict[str, str]:
     
     return weather_data.get(location, default_weather)
 
+@tool_registry.register(description="统计工地上特定状态的工人数量，如在场（在岗）工人数、请假工人数。", speculative=True)
+def count_workers(status: WorkerStatus = "在岗") -> Dict[str, Any]:
+    """统计指定状态的工人数量
+
+    Args:
+        status: 工人状态，可选值：在岗、请假、已离场、全部
+    """
+    return {"status": status, "count": worker_service.count_workers(status)}
+
+@tool_registry.register(description="获取工地上特定状态的工人名单和工种信息。", speculative=True)
+def get_workers(status: WorkerStatus = "在岗") -> Dict[str, Any]:
+    """获取指定状态的工人列表
+
+    Args:
+        status: 工人状态，可选值：在岗、请假、已离场、全部
+    """
+    workers = worker_service.get_workers(status)
+    return {"status": status, "count": len(workers), "workers": workers}
+
 # 工具函数映射表
-TOOL_HANDLERS = {
-    "get_current_time": get_current_time,
-    "get_current_weather": get_current_weather
-} 
\ No newline at end of file
+TOOL_HANDLERS = tool_registry.handlers
+
+# 默认工具配置
+DEFAULT_TOOLS = tool_registry.schemas
@@ -4,12 +4,10 @@ LangChain函数调用示例
 展示如何使用自定义的LangChain函数调用封装类
 """
 
-import os
 from dotenv import load_dotenv
-# 修改导入，使用阿里云千问大模型的 LangChain 集成
-from langchain_dashscope import ChatDashscope
 from langchain_core.messages import HumanMessage, AIMessage
 
+from app.core.chat_qwen import ChatQwen
 from app.core.langchain_agent import LangChainFunctionAgent
 from app.services.worker_service import WorkerService
 
@@ -21,17 +19,14 @@ worker_service = WorkerService()
 
 def setup_agent():
     """设置并返回LangChain代理"""
-    # 创建语言模型（使用阿里云百炼API的Qwen）
-    llm = ChatDashscope(
-        model="qwen-plus",  # 使用千问模型
-        dashscope_api_key=os.getenv("DASHSCOPE_API_KEY"),  # 从环境变量获取API密钥
-        temperature=0,
-    )
+    # 创建语言模型（使用阿里云百炼API的Qwen，模型和API密钥取自app.core.llm_config）
+    llm = ChatQwen(temperature=0)
     
     # 创建LangChain函数调用代理
     agent = LangChainFunctionAgent(
         llm=llm,
-        system_message="你是一个建筑工地智能助手，可以回答关于工地情况的问题。"
+        system_message="你是一个建筑工地智能助手，可以回答关于工地情况的问题。",
+        verbose=True
     )
     
     # 方式一：直接添加函数
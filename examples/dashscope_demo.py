@@ -16,7 +16,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 load_dotenv()
 
 from app.core.dashscope_client import DashscopeClient
-from app.core.llm_config import DEFAULT_TOOLS
+from app.utils.tools import DEFAULT_TOOLS
 
 def chat_demo():
     """普通聊天演示"""
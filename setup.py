@@ -4,4 +4,9 @@ setup(
     name="gongdi",
     version="0.1.0",
     packages=find_packages(),
+    entry_points={
+        "console_scripts": [
+            "gongdi-batch=app.services.batch_runner:main",
+        ],
+    },
 ) 
\ No newline at end of file
@@ -0,0 +1,94 @@
+"""离线批量任务测试"""
+import asyncio
+import json
+
+import pytest
+
+from app.services import batch_runner
+from app.services.batch_runner import BatchRunner, compact_output
+
+
+async def _noop(*args, **kwargs):
+    return None
+
+
+@pytest.fixture(autouse=True)
+def no_pool(monkeypatch):
+    monkeypatch.setattr(batch_runner, "startup_pool", _noop)
+    monkeypatch.setattr(batch_runner, "shutdown_pool", _noop)
+
+
+def write_input(path, count):
+    path.write_text("".join(json.dumps({"id": i, "prompt": f"问题{i}"}) + "\n" for i in range(count)), encoding="utf-8")
+
+
+def read_output(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def run(runner):
+    return asyncio.run(asyncio.wait_for(runner.run(), 5))
+
+
+def test_compact_output_keeps_last_success_per_line(tmp_path):
+    output = tmp_path / "out.jsonl"
+    output.write_text(
+        '{"line": 2, "ok": false, "status": 429}\n'
+        '{"line": 1, "ok": true, "result": 1}\n'
+        '{"line": 2, "ok": true, "result": 2}\n'
+        '{"line": 3, "ok": tr',
+        encoding="utf-8"
+    )
+
+    assert compact_output(str(output)) == {1, 2}
+    assert [record["line"] for record in read_output(output)] == [1, 2]
+
+
+def test_resume_skips_succeeded_lines(tmp_path, monkeypatch):
+    source, output = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    write_input(source, 4)
+    output.write_text('{"line": 1, "id": 0, "ok": true, "result": {}}\n{"line": 2, "id": 1, "ok": false}\n', encoding="utf-8")
+    seen = []
+
+    async def process(item, mode):
+        seen.append(item["id"])
+        return {"answer": item["prompt"]}
+
+    monkeypatch.setattr(batch_runner, "process_item", process)
+    stats = run(BatchRunner(str(source), str(output), workers=2))
+
+    assert sorted(seen) == [1, 2, 3]
+    assert stats["skipped"] == 1 and stats["succeeded"] == 3
+    assert sorted(record["line"] for record in read_output(output)) == [1, 2, 3, 4]
+
+
+def test_unserializable_result_is_recorded_as_failure(tmp_path, monkeypatch):
+    source, output = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    write_input(source, 3)
+
+    async def process(item, mode):
+        return {"answer": object() if item["id"] == 1 else "ok"}
+
+    monkeypatch.setattr(batch_runner, "process_item", process)
+    stats = run(BatchRunner(str(source), str(output), workers=2, resume=False))
+
+    records = {record["line"]: record for record in read_output(output)}
+    assert stats["succeeded"] == 2 and stats["failed"] == 1
+    assert records[2]["ok"] is False and records[2]["status"] == 500
+
+
+def test_write_error_stops_run_instead_of_hanging(tmp_path, monkeypatch):
+    source, output = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    write_input(source, 50)
+
+    async def process(item, mode):
+        return {"answer": "ok"}
+
+    def broken_write(self, out, record):
+        raise OSError("磁盘已满")
+
+    monkeypatch.setattr(batch_runner, "process_item", process)
+    monkeypatch.setattr(BatchRunner, "_write", broken_write)
+
+    with pytest.raises(OSError):
+        run(BatchRunner(str(source), str(output), workers=2, resume=False))
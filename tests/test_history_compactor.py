@@ -0,0 +1,79 @@
+"""多轮对话历史压缩测试"""
+from app.services.history_compactor import HistoryCompactor, split_turns
+
+
+def tool_turn(i):
+    call_id = f"call_{i}"
+    return [
+        {"role": "user", "content": f"第{i}个问题" + "工地" * 40},
+        {"role": "assistant", "content": "", "tool_calls": [
+            {"id": call_id, "type": "function", "function": {"name": "get_worker_count", "arguments": "{}"}}
+        ]},
+        {"role": "tool", "tool_call_id": call_id, "content": "在岗人数" * 40},
+        {"role": "assistant", "content": f"第{i}个回答" + "安全" * 40},
+    ]
+
+
+def build_messages(turns):
+    messages = [{"role": "system", "content": "你是建筑工地助手"}]
+    for i in range(turns):
+        messages.extend(tool_turn(i))
+    messages.append({"role": "user", "content": "本轮问题"})
+    return messages
+
+
+def test_split_turns_keeps_tool_calls_with_results():
+    history = tool_turn(0) + tool_turn(1)
+
+    turns = split_turns(history)
+
+    assert turns == [tool_turn(0), tool_turn(1)]
+
+
+def test_split_turns_leading_non_user_message():
+    history = [{"role": "assistant", "content": "你好"}] + tool_turn(0)
+    assert [len(turn) for turn in split_turns(history)] == [1, 4]
+
+
+def test_compact_under_budget_is_unchanged():
+    messages = build_messages(2)
+    compacted, info = HistoryCompactor(budget=100000, summarize=False).compact(messages)
+    assert compacted is messages
+    assert info["dropped_turns"] == 0
+
+
+def test_compact_drops_whole_turns_and_keeps_system():
+    messages = build_messages(6)
+    compactor = HistoryCompactor(budget=400, chunk_turns=1, summarize=False)
+
+    compacted, info = compactor.compact(messages)
+
+    assert 0 < info["dropped_turns"] < 6
+    assert info["tokens"] < info["original_tokens"]
+    assert compacted[0] == messages[0]
+    assert compacted[-1] == messages[-1]
+    # 保留的历史是完整轮次组成的后缀
+    kept = compacted[1:-1]
+    assert kept == messages[1 + 4 * info["dropped_turns"]:-1]
+    # 每个工具结果之前都有发起该调用的assistant消息
+    call_ids = set()
+    for message in kept:
+        for call in message.get("tool_calls") or []:
+            call_ids.add(call["id"])
+        if message["role"] == "tool":
+            assert message["tool_call_id"] in call_ids
+
+
+def test_compact_keeps_pending_tool_calls_of_current_turn():
+    messages = build_messages(6)
+    current = tool_turn(99)[:3]
+    compacted, info = HistoryCompactor(budget=400, chunk_turns=1, summarize=False).compact(messages[:-1] + current)
+
+    assert info["dropped_turns"] > 0
+    assert compacted[-3:] == current
+
+
+def test_compact_rounds_dropped_turns_to_chunk():
+    messages = build_messages(6)
+    _, info = HistoryCompactor(budget=400, chunk_turns=4, summarize=False).compact(messages)
+    assert info["dropped_turns"] % 4 == 0 or info["dropped_turns"] == 6
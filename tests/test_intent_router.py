@@ -0,0 +1,62 @@
+"""意图快速通道测试"""
+import pytest
+
+from app.core.llm_config import INTENT_MIN_CONFIDENCE
+from app.services.intent_router import IntentRouter
+
+
+@pytest.fixture
+def router():
+    return IntentRouter()
+
+
+def fast_path(router, query):
+    """返回快速通道会采用的匹配，交给模型时返回None"""
+    matched = router.match(query)
+    if matched is None or matched.confidence < INTENT_MIN_CONFIDENCE:
+        return None
+    return matched
+
+
+@pytest.mark.parametrize("query, intent, arguments", [
+    ("工地上多少工人在场？", "worker_count", {"status": "在岗"}),
+    ("请假的工人有多少", "worker_count", {"status": "请假"}),
+    ("一共有多少工人", "worker_count", {"status": "全部"}),
+    ("请假的工人有哪些", "worker_list", {"status": "请假"}),
+    ("现在几点了", "current_time", {}),
+    ("北京天气怎么样", "weather", {"location": "北京"}),
+    ("北京市的天气", "weather", {"location": "北京"}),
+    ("无锡的天气如何", "weather", {"location": "无锡"}),
+])
+def test_fast_path_matches(router, query, intent, arguments):
+    matched = fast_path(router, query)
+    assert matched is not None
+    assert matched.rule.name == intent
+    assert matched.arguments == arguments
+
+
+@pytest.mark.parametrize("query", [
+    "不在岗的工人有多少",
+    "没请假的工人有多少",
+    "未离场的工人有哪些",
+    "在岗和请假的工人有多少",
+    "北京和上海的天气",
+    "北京跟上海天气怎么样",
+    "下雨天气怎么样",
+    "明天北京天气怎么样",
+])
+def test_escape_to_model(router, query):
+    assert router.match(query) is None
+
+
+@pytest.mark.parametrize("query", ["我想知道北京的天气", "告诉我杭州天气"])
+def test_unmatched_prefix_lowers_confidence(router, query):
+    matched = router.match(query)
+    assert matched.rule.name == "weather"
+    assert matched.arguments["location"] in query
+    assert len(matched.arguments["location"]) == 2
+    assert matched.confidence < INTENT_MIN_CONFIDENCE
+
+
+def test_tool_names_limit_rules(router):
+    assert router.match("现在几点了", tool_names=["count_workers"]) is None
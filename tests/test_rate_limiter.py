@@ -0,0 +1,85 @@
+"""上游调度器测试"""
+import asyncio
+
+from app.core.rate_limiter import (
+    PRIORITY_BATCH,
+    PRIORITY_INTERACTIVE,
+    SchedulerQueueTimeout,
+    TokenBucket,
+    UpstreamScheduler,
+)
+
+
+def test_token_bucket_wait_and_refund():
+    bucket = TokenBucket(rate=10, capacity=5)
+    assert bucket.wait_time(5) == 0
+
+    bucket.consume(5)
+    assert 0.45 < bucket.wait_time(5) <= 0.5
+
+    bucket.refund(100)
+    assert bucket.tokens == 5
+
+
+def test_token_bucket_allows_overdraft():
+    bucket = TokenBucket(rate=10, capacity=5)
+    bucket.consume(8)
+    assert bucket.tokens < 0
+    assert bucket.wait_time(1) > 0.3
+
+
+def test_scheduler_grants_by_priority():
+    async def run():
+        scheduler = UpstreamScheduler(qps=10, tpm=10 ** 6, max_queue_wait=5)
+        # 用完请求额度，后续请求进入队列
+        for _ in range(10):
+            await scheduler.acquire(1)
+        order = []
+
+        async def request(name, priority):
+            await scheduler.acquire(1, priority)
+            order.append(name)
+
+        tasks = [asyncio.create_task(request("batch-1", PRIORITY_BATCH))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(request("batch-2", PRIORITY_BATCH)))
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(request("interactive", PRIORITY_INTERACTIVE)))
+        await asyncio.gather(*tasks)
+        return scheduler, order
+
+    scheduler, order = asyncio.run(run())
+
+    assert order == ["interactive", "batch-1", "batch-2"]
+    assert scheduler.queued_granted == 3
+    assert scheduler.stats()["queue_depth"] == 0
+
+
+def test_scheduler_queue_timeout():
+    async def run():
+        scheduler = UpstreamScheduler(qps=1, tpm=10 ** 6, max_queue_wait=0.05)
+        await scheduler.acquire(1)
+        try:
+            await scheduler.acquire(1, PRIORITY_BATCH)
+        except SchedulerQueueTimeout:
+            return scheduler
+        raise AssertionError("排队没有超时")
+
+    scheduler = asyncio.run(run())
+    assert scheduler.timeouts == 1
+
+
+def test_reconcile_corrects_estimate_once():
+    async def run():
+        scheduler = UpstreamScheduler(qps=100, tpm=6000, max_queue_wait=1)
+        over = await scheduler.acquire(1000)
+        scheduler.reconcile(over, 200)
+        scheduler.reconcile(over, 0)
+        after_refund = scheduler.stats()["available_tokens"]
+        under = await scheduler.acquire(100)
+        scheduler.reconcile(under, 500)
+        return after_refund, scheduler.stats()["available_tokens"]
+
+    after_refund, after_overrun = asyncio.run(run())
+    assert after_refund == 5800
+    assert after_overrun == 5300
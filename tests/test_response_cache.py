@@ -0,0 +1,95 @@
+"""响应缓存测试"""
+import time
+
+import pytest
+
+from app.core.response_cache import (
+    MemoryResponseCache,
+    ResponseCache,
+    SQLiteResponseCache,
+    TieredResponseCache,
+    make_cache_key,
+)
+
+MESSAGES = [{"role": "user", "content": "工地上多少工人在场"}]
+
+
+def expire(disk, key, seconds_ago):
+    disk._conn.execute("UPDATE response_cache SET expires_at = ? WHERE key = ?", (time.time() - seconds_ago, key))
+    disk._conn.commit()
+
+
+def row_count(disk):
+    return disk._conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+
+
+def test_response_cache_is_abstract():
+    with pytest.raises(TypeError):
+        ResponseCache()
+
+
+def test_cache_key_ignores_whitespace_and_unset_stop():
+    key = make_cache_key("qwen-turbo", MESSAGES, temperature=0, max_tokens=100)
+    padded = [{"role": "user", "content": " 工地上多少工人在场 \n"}]
+    assert make_cache_key("qwen-turbo", padded, temperature=0, max_tokens=100) == key
+    assert make_cache_key("qwen-turbo", MESSAGES, temperature=0, max_tokens=100, stop=None) == key
+    assert make_cache_key("qwen-turbo", MESSAGES, temperature=0, max_tokens=100, stop=["。"]) != key
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryResponseCache(max_entries=2, max_bytes=10 ** 6, ttl=60, stale_ttl=0)
+    cache.set("a", {"v": 1})
+    cache.set("b", {"v": 2})
+    cache.get("a")
+    cache.set("c", {"v": 3})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"v": 1}
+    assert cache.evictions == 1
+
+
+def test_sqlite_prunes_unread_expired_rows(tmp_path):
+    disk = SQLiteResponseCache(str(tmp_path / "cache.db"), ttl=60, stale_ttl=10)
+    disk.set("old", {"v": 1})
+    disk.set("stale", {"v": 2})
+    expire(disk, "old", 11)
+    expire(disk, "stale", 5)
+
+    disk._last_prune = 0
+    disk.set("new", {"v": 3})
+
+    assert row_count(disk) == 2
+    assert disk.pruned == 1
+    assert disk.get("stale", allow_stale=True) == {"v": 2}
+
+
+def test_sqlite_prune_is_rate_limited(tmp_path):
+    disk = SQLiteResponseCache(str(tmp_path / "cache.db"), ttl=60, stale_ttl=0)
+    disk.set("old", {"v": 1})
+    expire(disk, "old", 1)
+    disk.set("new", {"v": 2})
+    assert row_count(disk) == 2
+
+
+def test_tiered_backfill_keeps_remaining_ttl(tmp_path):
+    memory = MemoryResponseCache(max_entries=10, max_bytes=10 ** 6, ttl=3600, stale_ttl=0)
+    disk = SQLiteResponseCache(str(tmp_path / "cache.db"), ttl=3600, stale_ttl=0)
+    cache = TieredResponseCache(memory, disk)
+    disk.set("k", {"v": 1})
+    expire(disk, "k", -5)
+
+    assert cache.get("k") == {"v": 1}
+
+    expires_at = memory._entries["k"][0]
+    assert 0 < expires_at - time.monotonic() <= 5
+
+
+def test_tiered_does_not_backfill_stale_entries(tmp_path):
+    memory = MemoryResponseCache(max_entries=10, max_bytes=10 ** 6, ttl=3600, stale_ttl=0)
+    disk = SQLiteResponseCache(str(tmp_path / "cache.db"), ttl=3600, stale_ttl=60)
+    cache = TieredResponseCache(memory, disk)
+    disk.set("k", {"v": 1})
+    expire(disk, "k", 5)
+
+    assert cache.get("k") is None
+    assert cache.get("k", allow_stale=True) == {"v": 1}
+    assert "k" not in memory._entries
@@ -0,0 +1,85 @@
+"""会话存储测试"""
+import pytest
+
+from app.services.session_store import SessionNotFoundError, SessionStore, SQLiteSessionLog
+
+
+def test_evicts_least_recently_used_session():
+    store = SessionStore(ttl=3600, max_sessions=2, max_bytes=10 ** 6)
+    first = store.create()
+    second = store.create()
+    assert store.get(first.session_id) is first
+
+    third = store.create()
+
+    assert store.get(second.session_id) is None
+    assert store.get(first.session_id) is first
+    assert store.get(third.session_id) is third
+    assert store.evictions == 1
+
+
+def test_evicts_by_bytes():
+    store = SessionStore(ttl=3600, max_sessions=100, max_bytes=100)
+    first = store.create()
+    store.append(first.session_id, [{"role": "user", "content": "a" * 80}])
+    second = store.create()
+
+    store.append(second.session_id, [{"role": "user", "content": "b" * 80}])
+
+    assert store.get(first.session_id) is None
+    assert store.get(second.session_id) is second
+    assert store.current_bytes == second.size
+
+
+def test_expired_session_is_dropped():
+    store = SessionStore(ttl=60, max_sessions=10, max_bytes=10 ** 6)
+    session = store.create("系统消息")
+    session.updated_at -= 61
+
+    assert store.get(session.session_id) is None
+    assert store.expired == 1
+    assert store.current_bytes == 0
+    with pytest.raises(SessionNotFoundError):
+        store.append(session.session_id, [{"role": "user", "content": "你好"}])
+
+
+def test_append_refreshes_ttl():
+    store = SessionStore(ttl=60, max_sessions=10, max_bytes=10 ** 6)
+    session = store.create()
+    session.updated_at -= 50
+
+    store.append(session.session_id, [{"role": "user", "content": "你好"}])
+    session.updated_at -= 50
+
+    assert store.get(session.session_id) is session
+    assert session.build_messages("下一个问题")[-2:] == [
+        {"role": "user", "content": "你好"},
+        {"role": "user", "content": "下一个问题"},
+    ]
+
+
+def test_create_purges_expired_sessions():
+    store = SessionStore(ttl=60, max_sessions=10, max_bytes=10 ** 6)
+    old = store.create()
+    old.updated_at -= 61
+
+    store.create()
+
+    assert store.stats()["expired"] == 1
+    assert store.stats()["sessions"] == 1
+    assert store.get(old.session_id) is None
+
+
+def test_evicted_session_is_restored_from_sqlite(tmp_path):
+    store = SessionStore(ttl=3600, max_sessions=1, max_bytes=10 ** 6,
+                         log=SQLiteSessionLog(str(tmp_path / "sessions.db")))
+    first = store.create("系统消息")
+    store.append(first.session_id, [{"role": "user", "content": "你好"}])
+    store.create()
+
+    restored = store.get(first.session_id)
+
+    assert restored is not None and restored is not first
+    assert restored.system_message == "系统消息"
+    assert restored.messages == [{"role": "user", "content": "你好"}]
+    assert store.restored == 1
@@ -0,0 +1,85 @@
+"""函数调用阶段缓存测试"""
+from app.services.stage_cache import StageCache, strip_call_ids
+from app.utils.tool_registry import ToolRegistry
+
+
+def get_worker_count(site: str) -> int:
+    """查询在岗人数
+
+    Args:
+        site: 工地名称
+    """
+    return 42
+
+
+def stage_messages(call_id):
+    return [
+        {"role": "user", "content": "一号工地有多少人"},
+        {"role": "assistant", "content": "", "tool_calls": [
+            {"id": call_id, "type": "function",
+             "function": {"name": "get_worker_count", "arguments": '{"site": "一号工地"}'}}
+        ]},
+        {"role": "tool", "tool_call_id": call_id, "name": "get_worker_count", "content": "42"},
+    ]
+
+
+EXECUTED = [{"function_name": "get_worker_count", "success": True}]
+
+
+def make_cache():
+    registry = ToolRegistry()
+    registry.add(get_worker_count)
+    return StageCache(registry=registry), registry
+
+
+def key(cache, messages, executed=EXECUTED, temperature=0):
+    return cache.key("qwen-turbo", temperature, 2048, messages, None, executed)
+
+
+def test_strip_call_ids():
+    stripped = [strip_call_ids(m) for m in stage_messages("call_abc")]
+    assert "tool_call_id" not in stripped[2]
+    assert "id" not in stripped[1]["tool_calls"][0]
+    assert stripped == [strip_call_ids(m) for m in stage_messages("call_xyz")]
+
+
+def test_key_stable_across_call_ids():
+    cache, _ = make_cache()
+    first = key(cache, stage_messages("call_abc"))
+    assert first is not None
+    assert key(cache, stage_messages("call_xyz")) == first
+
+
+def test_key_changes_with_content_and_data_version():
+    cache, registry = make_cache()
+    first = key(cache, stage_messages("call_abc"))
+
+    changed = stage_messages("call_abc")
+    changed[2]["content"] = "43"
+    assert key(cache, changed) != first
+
+    registry.bump_data_version("get_worker_count")
+    assert key(cache, stage_messages("call_abc")) != first
+
+
+def test_uncacheable_requests():
+    cache, _ = make_cache()
+    messages = stage_messages("call_abc")
+    assert key(cache, messages, temperature=0.7) is None
+    assert key(cache, messages, executed=[]) is None
+    assert key(cache, messages, executed=[{"function_name": "get_worker_count", "success": False}]) is None
+    assert key(cache, messages, executed=[{"function_name": "unknown", "success": True}]) is None
+    assert cache.skipped == 2
+
+
+def test_get_set_roundtrip():
+    cache, _ = make_cache()
+    cache_key = key(cache, stage_messages("call_abc"))
+    message = {"role": "assistant", "content": "一号工地有42人"}
+
+    cache.set(cache_key, "req-1", message, {"total_tokens": 10})
+    cache.set(cache_key, "req-2", {"role": "assistant", "content": "", "tool_calls": [{}]}, {})
+
+    assert cache.get(cache_key)["message"] == message
+    assert cache.get(key(cache, stage_messages("call_xyz")))["request_id"] == "req-1"
+    assert cache.get(None) is None
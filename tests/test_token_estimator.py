@@ -0,0 +1,36 @@
+"""本地token估算测试"""
+from app.core.token_estimator import TokenEstimator
+
+
+def test_memo_hits_repeated_messages_without_storing_content():
+    estimator = TokenEstimator(scale=1.0, cache_size=8)
+    message = {"role": "user", "content": "工地上多少工人在场？" * 20}
+
+    first = estimator.message_tokens(message)
+    assert estimator.message_tokens(dict(message)) == first
+
+    assert (estimator.memo_hits, estimator.memo_misses) == (1, 1)
+    assert all(isinstance(key, bytes) and len(key) == 16 for key in estimator._memo)
+
+
+def test_memo_key_includes_role_and_tool_calls():
+    estimator = TokenEstimator(scale=1.0, cache_size=8)
+    estimator.message_tokens({"role": "user", "content": "你好"})
+    estimator.message_tokens({"role": "assistant", "content": "你好"})
+    estimator.message_tokens({"role": "assistant", "content": "你好", "tool_calls": [
+        {"id": "call_0", "type": "function", "function": {"name": "count_workers", "arguments": "{}"}}
+    ]})
+    assert estimator.memo_misses == 3
+
+
+def test_memo_is_bounded():
+    estimator = TokenEstimator(scale=1.0, cache_size=4)
+    for i in range(10):
+        estimator.message_tokens({"role": "user", "content": f"问题{i}"})
+    assert len(estimator._memo) == 4
+
+
+def test_mixed_text_estimate_grows_with_length():
+    estimator = TokenEstimator(scale=1.0)
+    short = estimator.text_tokens("北京天气 sunny 22")
+    assert 0 < short < estimator.text_tokens("北京天气 sunny 22" * 10)
@@ -0,0 +1,65 @@
+"""流式工具调用解析测试"""
+import json
+
+from app.core.tool_call_parser import ToolCallAccumulator
+
+
+def fragment(index, name=None, arguments=None, call_id=None):
+    delta = {"index": index, "function": {}}
+    if call_id:
+        delta["id"] = call_id
+    if name:
+        delta["function"]["name"] = name
+    if arguments:
+        delta["function"]["arguments"] = arguments
+    return delta
+
+
+def test_split_arguments_complete_when_json_closes():
+    accumulator = ToolCallAccumulator()
+    assert accumulator.feed([fragment(0, "get_current_weather", '{"loca', call_id="call_a")]) == []
+    assert accumulator.feed([fragment(0, arguments='tion": "北')]) == []
+
+    completed = accumulator.feed([fragment(0, arguments='京"}')])
+
+    assert len(completed) == 1
+    assert completed[0]["id"] == "call_a"
+    assert completed[0]["function"]["name"] == "get_current_weather"
+    assert json.loads(completed[0]["function"]["arguments"]) == {"location": "北京"}
+    assert accumulator.feed([]) == []
+    assert accumulator.finish() == []
+
+
+def test_interleaved_indices_are_merged_separately():
+    accumulator = ToolCallAccumulator()
+    assert accumulator.feed([fragment(0, "a", '{"x": ', "call_0"), fragment(1, "b", '{"y": ', "call_1")]) == []
+
+    first = accumulator.feed([fragment(1, arguments="2}")])
+    second = accumulator.feed([fragment(0, arguments="1}")])
+
+    assert [call["id"] for call in first] == ["call_1"]
+    assert [call["id"] for call in second] == ["call_0"]
+    assert [json.loads(call["function"]["arguments"]) for call in accumulator.tool_calls] == [{"x": 1}, {"y": 2}]
+    assert accumulator.finish() == []
+
+
+def test_finish_returns_incomplete_calls():
+    accumulator = ToolCallAccumulator()
+    accumulator.feed([fragment(0, "a", '{"x": 1}'), fragment(1, "b", '{"y": ')])
+
+    remaining = accumulator.finish()
+
+    assert len(remaining) == 1
+    assert remaining[0]["id"] == "call_1"
+    assert remaining[0]["function"]["arguments"] == '{"y": '
+    assert accumulator.finish() == []
+
+
+def test_missing_index_uses_position():
+    accumulator = ToolCallAccumulator()
+    completed = accumulator.feed([
+        {"function": {"name": "a", "arguments": "{}"}},
+        {"function": {"name": "b", "arguments": "{}"}},
+    ])
+    assert [call["function"]["name"] for call in completed] == ["a", "b"]
+    assert [call["id"] for call in completed] == ["call_0", "call_1"]
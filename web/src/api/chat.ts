@@ -14,6 +14,8 @@ export interface ChatRequest {
   prompt: string
   system_message?: string
   history?: ChatMessage[]
+  // 服务端会话ID，指定后只需发送新问题，历史由服务端保存
+  session_id?: string
 }
 
 export interface FunctionCallRequest {
@@ -26,6 +28,122 @@ export interface FunctionCallRequest {
       parameters?: Record<string, any>
     }
   }>
+  fast_path?: boolean
+}
+
+// 流式函数调用的SSE事件
+export interface ToolCallEvent {
+  step: number
+  id: string
+  name: string
+  arguments?: string
+}
+
+export interface ToolStartEvent {
+  step: number
+  id: string
+  name: string
+  at_ms: number
+}
+
+export interface ToolResultEvent {
+  step: number
+  id: string
+  name: string
+  success: boolean
+  result?: any
+  error?: string
+  elapsed_ms?: number
+  at_ms: number
+}
+
+export interface FunctionCallStreamHandlers {
+  onStep?: (step: number) => void
+  onToolCall?: (event: ToolCallEvent) => void
+  onToolStart?: (event: ToolStartEvent) => void
+  onToolResult?: (event: ToolResultEvent) => void
+  onDelta?: (content: string) => void
+  onDone?: (data: Record<string, any>) => void
+  onError?: (detail: string, status?: number) => void
+}
+
+// 解析一条SSE事件文本
+const parseSseEvent = (block: string): { event: string, data: any } | null => {
+  let event = 'message'
+  const dataLines: string[] = []
+  for (const line of block.split('\n')) {
+    if (line.startsWith('event:')) {
+      event = line.slice(6).trim()
+    } else if (line.startsWith('data:')) {
+      dataLines.push(line.slice(5).trimStart())
+    }
+  }
+  if (!dataLines.length) {
+    return null
+  }
+  return { event, data: JSON.parse(dataLines.join('\n')) }
+}
+
+// 以POST请求读取SSE流（EventSource不支持请求体），按事件类型分发
+const postEventStream = async (
+  url: string,
+  data: FunctionCallRequest,
+  handlers: FunctionCallStreamHandlers,
+  signal?: AbortSignal
+) => {
+  const response = await fetch(`/api${url}`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+    body: JSON.stringify(data),
+    signal,
+  })
+  if (!response.ok || !response.body) {
+    handlers.onError?.(`请求失败: ${response.status}`, response.status)
+    return
+  }
+
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  while (true) {
+    const { done, value } = await reader.read()
+    if (done) {
+      break
+    }
+    buffer += decoder.decode(value, { stream: true })
+    let boundary = buffer.indexOf('\n\n')
+    while (boundary !== -1) {
+      const parsed = parseSseEvent(buffer.slice(0, boundary))
+      buffer = buffer.slice(boundary + 2)
+      boundary = buffer.indexOf('\n\n')
+      if (!parsed) {
+        continue
+      }
+      switch (parsed.event) {
+        case 'step':
+          handlers.onStep?.(parsed.data.step)
+          break
+        case 'tool_call':
+          handlers.onToolCall?.(parsed.data)
+          break
+        case 'tool_start':
+          handlers.onToolStart?.(parsed.data)
+          break
+        case 'tool_result':
+          handlers.onToolResult?.(parsed.data)
+          break
+        case 'delta':
+          handlers.onDelta?.(parsed.data.content)
+          break
+        case 'done':
+          handlers.onDone?.(parsed.data)
+          break
+        case 'error':
+          handlers.onError?.(parsed.data.detail, parsed.data.status)
+          break
+      }
+    }
+  }
 }
 
 export const chatApi = {
@@ -40,8 +158,24 @@ export const chatApi = {
   completeFunctionCall: (query: string) => {
     return api.post('/complete_function_call', { query })
   },
+
+  functionCallStream: (data: FunctionCallRequest, handlers: FunctionCallStreamHandlers, signal?: AbortSignal) => {
+    return postEventStream('/function_call/stream', data, handlers, signal)
+  },
+
+  completeFunctionCallStream: (query: string, handlers: FunctionCallStreamHandlers, signal?: AbortSignal) => {
+    return postEventStream('/complete_function_call/stream', { query }, handlers, signal)
+  },
   
   multiTurnChat: (data: ChatRequest) => {
     return api.post('/multi_turn_chat', data)
+  },
+
+  createSession: (system_message?: string) => {
+    return api.post<{ session_id: string }>('/sessions', system_message ? { system_message } : {})
+  },
+
+  deleteSession: (session_id: string) => {
+    return api.delete(`/sessions/${session_id}`)
   }
 } 
\ No newline at end of file